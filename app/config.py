@@ -9,6 +9,91 @@ class Settings:
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_KEY: str = os.getenv("SUPABASE_KEY", "")
     SUPABASE_JWT_SECRET: str = os.getenv("SUPABASE_JWT_SECRET", "")
+    # "local" verifies access tokens in-process, "remote" asks GoTrue on every request
+    SUPABASE_JWT_VERIFY_MODE: str = os.getenv("SUPABASE_JWT_VERIFY_MODE", "local")
+    SUPABASE_JWT_AUDIENCE: str = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+    # Tokens expiring within this window are re-checked against GoTrue
+    SUPABASE_JWT_REMOTE_CHECK_WINDOW: int = int(os.getenv("SUPABASE_JWT_REMOTE_CHECK_WINDOW", 60))
+    SUPABASE_JWKS_CACHE_SECONDS: int = int(os.getenv("SUPABASE_JWKS_CACHE_SECONDS", 3600))
+    # Minimum time between JWKS fetches (tokens with unknown kids cannot force more)
+    SUPABASE_JWKS_MIN_REFRESH_SECONDS: int = int(os.getenv("SUPABASE_JWKS_MIN_REFRESH_SECONDS", 60))
+
+    # Shared HTTP connection pool for the async Supabase clients (per worker)
+    SUPABASE_HTTP2: bool = os.getenv("SUPABASE_HTTP2", "true").lower() == "true"
+    SUPABASE_POOL_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", 100))
+    SUPABASE_POOL_MAX_KEEPALIVE: int = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", 20))
+    SUPABASE_POOL_KEEPALIVE_EXPIRY: float = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", 30.0))
+    SUPABASE_HTTP_TIMEOUT: float = float(os.getenv("SUPABASE_HTTP_TIMEOUT", 30.0))
+    SUPABASE_HTTP_CONNECT_TIMEOUT: float = float(os.getenv("SUPABASE_HTTP_CONNECT_TIMEOUT", 5.0))
+
+    # Auth profile cache (per worker)
+    AUTH_PROFILE_CACHE_TTL: int = int(os.getenv("AUTH_PROFILE_CACHE_TTL", 60))
+    AUTH_PROFILE_CACHE_SIZE: int = int(os.getenv("AUTH_PROFILE_CACHE_SIZE", 5000))
+    VENDOR_ID_CACHE_TTL: int = int(os.getenv("VENDOR_ID_CACHE_TTL", 3600))
+    VENDOR_ID_CACHE_SIZE: int = int(os.getenv("VENDOR_ID_CACHE_SIZE", 10000))
+    # Background refresh interval for admin dashboard / chat counters
+    STAFF_STATS_REFRESH_SECONDS: float = float(os.getenv("STAFF_STATS_REFRESH_SECONDS", 15))
+    # Public featured-vendors snapshot and its HTTP cache headers
+    FEATURED_VENDORS_REFRESH_SECONDS: float = float(os.getenv("FEATURED_VENDORS_REFRESH_SECONDS", 60))
+    FEATURED_VENDORS_MAX_AGE: int = int(os.getenv("FEATURED_VENDORS_MAX_AGE", 60))
+    FEATURED_VENDORS_STALE_WHILE_REVALIDATE: int = int(os.getenv("FEATURED_VENDORS_STALE_WHILE_REVALIDATE", 300))
+    # Full rebuild interval of the in-memory service catalog (changes are also patched in incrementally)
+    SERVICE_CATALOG_REBUILD_SECONDS: float = float(os.getenv("SERVICE_CATALOG_REBUILD_SECONDS", 300))
+
+    # Availability: compiled service schedules (dropped early when a schedule changes)
+    SCHEDULE_CACHE_TTL: int = int(os.getenv("SCHEDULE_CACHE_TTL", 3600))
+    SCHEDULE_CACHE_SIZE: int = int(os.getenv("SCHEDULE_CACHE_SIZE", 10000))
+    BUSINESS_TIMEZONE: str = os.getenv("BUSINESS_TIMEZONE", "Asia/Colombo")
+    # Movable public holidays (Poya days, etc.) as comma-separated ISO dates
+    PUBLIC_HOLIDAYS: list = [d.strip() for d in os.getenv("PUBLIC_HOLIDAYS", "").split(",") if d.strip()]
+
+    # Rows per write-back batch of the bulk commission engine
+    COMMISSION_BATCH_SIZE: int = int(os.getenv("COMMISSION_BATCH_SIZE", 500))
+
+    # Bulk vendor import: rows per database batch, auth accounts created at once
+    VENDOR_IMPORT_BATCH_SIZE: int = int(os.getenv("VENDOR_IMPORT_BATCH_SIZE", 100))
+    VENDOR_IMPORT_CONCURRENCY: int = int(os.getenv("VENDOR_IMPORT_CONCURRENCY", 5))
+
+    # Uploads: chunk size of resumable uploads (Supabase Storage requires 6 MB),
+    # chunk buffers per worker (caps upload memory), retries per chunk, session lifetime
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", 6 * 1024 * 1024))
+    UPLOAD_MAX_BUFFERS: int = int(os.getenv("UPLOAD_MAX_BUFFERS", 4))
+    UPLOAD_CHUNK_RETRIES: int = int(os.getenv("UPLOAD_CHUNK_RETRIES", 3))
+    UPLOAD_SESSION_HOURS: int = int(os.getenv("UPLOAD_SESSION_HOURS", 24))
+    # Window to confirm a direct (signed URL) upload; Storage's signed upload URLs last 2 hours
+    DIRECT_UPLOAD_MINUTES: int = int(os.getenv("DIRECT_UPLOAD_MINUTES", 120))
+    # Largest direct upload accepted on confirm (promo videos / everything else)
+    DIRECT_UPLOAD_MAX_VIDEO_BYTES: int = int(os.getenv("DIRECT_UPLOAD_MAX_VIDEO_BYTES", 200 * 1024 * 1024))
+    DIRECT_UPLOAD_MAX_BYTES: int = int(os.getenv("DIRECT_UPLOAD_MAX_BYTES", 20 * 1024 * 1024))
+
+    # Image derivatives (thumbnail / medium / WebP), rendered in a process pool; needs Pillow
+    IMAGE_VARIANTS_ENABLED: bool = os.getenv("IMAGE_VARIANTS_ENABLED", "true").lower() == "true"
+    IMAGE_PROCESS_WORKERS: int = int(os.getenv("IMAGE_PROCESS_WORKERS", 2))
+    IMAGE_MAX_BYTES: int = int(os.getenv("IMAGE_MAX_BYTES", 15 * 1024 * 1024))
+    IMAGE_THUMB_SIZE: int = int(os.getenv("IMAGE_THUMB_SIZE", 320))
+    IMAGE_MEDIUM_SIZE: int = int(os.getenv("IMAGE_MEDIUM_SIZE", 1024))
+    IMAGE_WEBP_QUALITY: int = int(os.getenv("IMAGE_WEBP_QUALITY", 80))
+
+    # Idempotency-Key replay store ("memory" per worker, or "mongo" shared)
+    IDEMPOTENCY_BACKEND: str = os.getenv("IDEMPOTENCY_BACKEND", "memory").lower()
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+    IDEMPOTENCY_CACHE_SIZE: int = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
+    IDEMPOTENCY_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 30))
+    # Lease on a running request's lock in the mongo store; renewed while the request runs
+    IDEMPOTENCY_LOCK_SECONDS: float = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 60))
+    IDEMPOTENCY_FINGERPRINT_BYTES: int = int(os.getenv("IDEMPOTENCY_FINGERPRINT_BYTES", 1024 * 1024))
+    IDEMPOTENCY_MAX_RESPONSE_BYTES: int = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE_BYTES", 256 * 1024))
+
+    # Auth tracing (off by default in production)
+    AUTH_TRACE_ENABLED: bool = os.getenv(
+        "AUTH_TRACE_ENABLED",
+        "false" if os.getenv("ENVIRONMENT", "development") == "production" else "true"
+    ).lower() == "true"
+    AUTH_TRACE_LEVEL: str = os.getenv("AUTH_TRACE_LEVEL", "INFO")
+    AUTH_TRACE_SAMPLE_RATE: float = float(os.getenv("AUTH_TRACE_SAMPLE_RATE", 1.0))
+    AUTH_TRACE_FILE: str = os.getenv("AUTH_TRACE_FILE", "auth_debug.log")
+    AUTH_TRACE_BATCH_SIZE: int = int(os.getenv("AUTH_TRACE_BATCH_SIZE", 100))
+    AUTH_TRACE_FLUSH_INTERVAL: float = float(os.getenv("AUTH_TRACE_FLUSH_INTERVAL", 2.0))
     
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
@@ -113,6 +113,22 @@ async def get_update_requests_collection():
     return None
 
 
+async def get_idempotency_collection():
+    """Get the idempotency_keys collection (stored responses for Idempotency-Key retries)"""
+    db = await get_database()
+    if db is not None:
+        return db.get_collection("idempotency_keys")
+    return None
+
+
+async def get_upload_index_collection():
+    """Get the upload_index collection (content hash -> stored vendor file)"""
+    db = await get_database()
+    if db is not None:
+        return db.get_collection("upload_index")
+    return None
+
+
 async def close_mongo_connection():
     """Close MongoDB connection on shutdown"""
     global _mongo_client, _database
@@ -143,6 +159,11 @@ async def ensure_indexes():
             # Index for fetching vendor's requests
             await requests_col.create_index([("vendor_id", 1), ("status", 1)])
             await requests_col.create_index("created_at")
+
+        idempotency_col = await get_idempotency_collection()
+        if idempotency_col is not None:
+            # Records (and stale in-progress locks) are removed once expires_at passes
+            await idempotency_col.create_index("expires_at", expireAfterSeconds=0)
         logger.info("MongoDB indexes created successfully")
     except Exception as e:
         logger.error(f"Failed to create MongoDB indexes: {str(e)}")
@@ -1,15 +1,18 @@
 import os
 from typing import Optional, Dict, Any
-from supabase import create_client, Client
+from supabase import create_client, Client, AsyncClient, AsyncClientOptions
 from app.config import settings
+import httpx
 import logging
-import asyncio
 
 logger = logging.getLogger(__name__)
 
 class SupabaseManager:
     _instance: Optional[Client] = None
     _admin_instance: Optional[Client] = None
+    _async_instance: Optional[AsyncClient] = None
+    _async_admin_instance: Optional[AsyncClient] = None
+    _http_client: Optional[httpx.AsyncClient] = None
     
     @classmethod
     def get_client(cls) -> Client:
@@ -43,43 +46,153 @@ class SupabaseManager:
                 raise
         return cls._admin_instance
     
+    @classmethod
+    def get_http_client(cls) -> httpx.AsyncClient:
+        """Keep-alive HTTP/2 connection pool shared by PostgREST, GoTrue and Storage
+        for every async client in this worker"""
+        if cls._http_client is None:
+            cls._http_client = httpx.AsyncClient(
+                http2=settings.SUPABASE_HTTP2,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=settings.SUPABASE_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.SUPABASE_POOL_MAX_KEEPALIVE,
+                    keepalive_expiry=settings.SUPABASE_POOL_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(
+                    settings.SUPABASE_HTTP_TIMEOUT,
+                    connect=settings.SUPABASE_HTTP_CONNECT_TIMEOUT
+                )
+            )
+        return cls._http_client
+
+    @classmethod
+    def _create_async_client(cls) -> AsyncClient:
+        options = AsyncClientOptions(
+            auto_refresh_token=False,
+            persist_session=False,
+            httpx_client=cls.get_http_client()
+        )
+        return AsyncClient(settings.SUPABASE_URL, settings.SUPABASE_KEY, options)
+
+    @classmethod
+    def get_async_client(cls) -> AsyncClient:
+        """Async client for auth flows (sign in, sign up, refresh, get_user)"""
+        if cls._async_instance is None:
+            try:
+                cls._async_instance = cls._create_async_client()
+                logger.info("✅ Supabase async client initialized successfully")
+            except Exception as e:
+                logger.error(f"❌ Failed to initialize Supabase async client: {e}")
+                raise
+        return cls._async_instance
+
+    @classmethod
+    def get_async_admin_client(cls) -> AsyncClient:
+        """Async client for data access and admin operations.
+        Like get_admin_client, it must NEVER be used for sign-in operations.
+        """
+        if cls._async_admin_instance is None:
+            try:
+                cls._async_admin_instance = cls._create_async_client()
+                logger.info("✅ Supabase async ADMIN client initialized successfully")
+            except Exception as e:
+                logger.error(f"❌ Failed to initialize Supabase async admin client: {e}")
+                raise
+        return cls._async_admin_instance
+
+    @classmethod
+    async def close(cls):
+        """Close the shared connection pool (call on shutdown)"""
+        if cls._http_client is not None:
+            await cls._http_client.aclose()
+            cls._http_client = None
+            cls._async_instance = None
+            cls._async_admin_instance = None
+
+    # Operators accepted in `conditions`, mapped to the PostgREST builder method
+    FILTER_OPERATORS = {
+        "eq": "eq",
+        "neq": "neq",
+        "gt": "gt",
+        "gte": "gte",
+        "lt": "lt",
+        "lte": "lte",
+        "like": "like",
+        "ilike": "ilike",
+        "in": "in_",
+        "is": "is_",
+        "contains": "contains",
+        "overlaps": "overlaps"
+    }
+
+    @classmethod
+    def _apply_filters(cls, query, kwargs: Dict[str, Any]):
+        """Apply equality `filters` and (column, operator, value) `conditions`"""
+        for filter_key, filter_value in kwargs.get("filters", {}).items():
+            query = query.eq(filter_key, filter_value)
+
+        for column, operator, value in kwargs.get("conditions", []):
+            if operator not in cls.FILTER_OPERATORS:
+                raise ValueError(f"Unknown filter operator: {operator}")
+            query = getattr(query, cls.FILTER_OPERATORS[operator])(column, value)
+
+        return query
+
     @classmethod
     async def execute_query(cls, table: str, operation: str, **kwargs) -> Dict[str, Any]:
-        """Execute a query on Supabase"""
-        client = cls.get_client()
+        """Execute a query on Supabase
+
+        Select options:
+            columns: projection, e.g. "id, status" (default "*")
+            filters: {column: value} equality filters
+            conditions: [(column, operator, value)], operators from FILTER_OPERATORS,
+                e.g. ("status", "in", ["approved", "active"]) or ("created_at", "gte", ts)
+            order: [(column, desc)] applied in sequence
+            range: (start, end) inclusive row window, for pagination
+            limit: maximum number of rows
+            count: "exact" | "planned" | "estimated" to return the total in "count"
+            head: with count, skip the rows and return only the count
+            single: expect exactly one row
+        """
+        client = cls.get_async_admin_client()
         
         try:
             table_ref = client.table(table)
             
             if operation == "select":
-                query = table_ref.select("*")
-                if "filters" in kwargs:
-                    for filter_key, filter_value in kwargs["filters"].items():
-                        query = query.eq(filter_key, filter_value)
+                query = table_ref.select(
+                    kwargs.get("columns", "*"),
+                    count=kwargs.get("count"),
+                    head=kwargs.get("head", False)
+                )
+                query = cls._apply_filters(query, kwargs)
+
+                for column, desc in kwargs.get("order", []):
+                    query = query.order(column, desc=desc)
+                if "range" in kwargs:
+                    start, end = kwargs["range"]
+                    query = query.range(start, end)
+                if "limit" in kwargs:
+                    query = query.limit(kwargs["limit"])
                 
                 if "single" in kwargs and kwargs["single"]:
-                    response = await asyncio.to_thread(query.single().execute)
+                    response = await query.single().execute()
                 else:
-                    response = await asyncio.to_thread(query.execute)
+                    response = await query.execute()
             
             elif operation == "insert":
                 data = kwargs.get("data", {})
-                response = await asyncio.to_thread(table_ref.insert(data).execute)
+                response = await table_ref.insert(data).execute()
             
             elif operation == "update":
                 data = kwargs.get("data", {})
-                filters = kwargs.get("filters", {})
-                query = table_ref.update(data)
-                for filter_key, filter_value in filters.items():
-                    query = query.eq(filter_key, filter_value)
-                response = await asyncio.to_thread(query.execute)
+                query = cls._apply_filters(table_ref.update(data), kwargs)
+                response = await query.execute()
             
             elif operation == "delete":
-                filters = kwargs.get("filters", {})
-                query = table_ref.delete()
-                for filter_key, filter_value in filters.items():
-                    query = query.eq(filter_key, filter_value)
-                response = await asyncio.to_thread(query.execute)
+                query = cls._apply_filters(table_ref.delete(), kwargs)
+                response = await query.execute()
             
             else:
                 raise ValueError(f"Unknown operation: {operation}")
@@ -87,6 +200,7 @@ class SupabaseManager:
             return {
                 "success": True,
                 "data": response.data if hasattr(response, 'data') else None,
+                "count": getattr(response, "count", None),
                 "error": None
             }
             
@@ -95,13 +209,34 @@ class SupabaseManager:
             return {
                 "success": False,
                 "data": None,
+                "count": None,
                 "error": str(e)
             }
     
+    @classmethod
+    async def execute_rpc(cls, function: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Call a Postgres function through PostgREST"""
+        client = cls.get_async_admin_client()
+
+        try:
+            response = await client.rpc(function, params or {}).execute()
+            return {
+                "success": True,
+                "data": response.data,
+                "error": None
+            }
+        except Exception as e:
+            logger.error(f"Supabase RPC error ({function}): {e}")
+            return {
+                "success": False,
+                "data": None,
+                "error": str(e)
+            }
+
     @classmethod
     async def auth(cls):
         """Get auth client"""
-        return cls.get_client().auth
+        return cls.get_async_client().auth
 
 # Initialize supabase client
 supabase = SupabaseManager.get_client()
\ No newline at end of file
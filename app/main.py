@@ -1,16 +1,16 @@
 ﻿# main.py
 from __future__ import annotations
 import fastapi
-from fastapi import FastAPI, HTTPException, UploadFile, Form, File, Depends, Request, status
+from fastapi import FastAPI, HTTPException, UploadFile, Form, File, Depends, Request, Query, BackgroundTasks, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import uuid
-import os
-import io
 import csv
-import asyncio
+import json
+import hashlib
 import secrets
 import string
 import random
@@ -18,31 +18,61 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from supabase import create_client, Client
+from supabase import AsyncClient
 import logging
 from app.services.sms_service import SmsService
 from app.services.email_service import EmailService
 from app.services.chat_service import chat_service
+from app.services.admin_service import AdminService
+from app.services.catalog_service import service_catalog
+from app.services.commission_service import CommissionService
+from app.services.export_service import (
+    ExportService, EXPORT_FORMATS,
+    VENDOR_EXPORT_COLUMNS, SERVICE_EXPORT_COLUMNS, VENDOR_EXPORT_FIELDS, SERVICE_EXPORT_FIELDS
+)
+from app.schemas.commission import BulkCommissionRequest
+from app.services.availability_service import AvailabilityService, business_today
+from app.services.vendor_service import VendorService, VENDOR_SUMMARY_COLUMNS
+from app.services.image_service import ImageService
+from app.services.storage_service import (
+    StorageService, UploadExpiredError, UploadOffsetError, VENDOR_FILE_TYPES, DIRECT_UPLOAD_TOKEN_TYPE,
+    DIRECT_UPLOAD_CONTENT_TYPES
+)
+from app.services.upload_index_service import UploadIndex
+from app.services.vendor_import_service import VendorImportService, detect_format as detect_import_format
 from app.database.mongo_config import ensure_indexes, close_mongo_connection
+from app.database.supabase_client import SupabaseManager
+from app.config import settings
+from app.utils.security import verify_supabase_token, token_expires_soon
+from app.utils.cache import TTLCache, RefreshingCache
+from app.utils.idempotency import IdempotencyMiddleware, create_store as create_idempotency_store
+from app.utils.auth_trace import AuthTrace, start_auth_trace, stop_auth_trace
+from jose import JWTError
 
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Supabase
-supabase_url = os.getenv("SUPABASE_URL", "").strip()
-supabase_key = os.getenv("SUPABASE_KEY", "").strip()
-if not supabase_url or not supabase_key:
-    logger.error("CRITICAL: SUPABASE_URL or SUPABASE_KEY not set!")
-
-supabase: Client = create_client(supabase_url, supabase_key)
+# Initialize Supabase (async clients sharing one pooled HTTP/2 connection per worker)
+supabase: AsyncClient = SupabaseManager.get_async_client()
 # DEDICATED ADMIN CLIENT to avoid session pollution from auth.sign_in calls
-supabase_admin: Client = create_client(supabase_url, supabase_key)
+supabase_admin: AsyncClient = SupabaseManager.get_async_admin_client()
+
+# Admin vendor list page sizes
+ADMIN_VENDORS_PAGE_SIZE = 50
+ADMIN_VENDORS_MAX_PAGE_SIZE = 200
+AVAILABILITY_CALENDAR_MAX_SERVICES = 200
+VENDOR_DETAIL_MAX_SERVICES = 200
 
 # Initialize FastAPI
 app = FastAPI(title="Lanka Pass Travel API", version="1.0.0")
 
+# Replays responses of retried POSTs carrying an Idempotency-Key
+# (added before CORS so replayed responses still get CORS headers)
+idempotency_store = create_idempotency_store()
+app.add_middleware(IdempotencyMiddleware, store=idempotency_store)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -60,105 +90,213 @@ async def startup_event():
     import asyncio
     asyncio.create_task(ensure_indexes())
     logger.info("MongoDB index creation started in background")
+    start_auth_trace()
+    for cache in staff_stats_caches:
+        cache.start()
+    featured_vendors_cache.start()
+    service_catalog.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Close MongoDB connection on shutdown"""
     await close_mongo_connection()
     logger.info("MongoDB connection closed on shutdown")
+    for cache in staff_stats_caches:
+        await cache.stop()
+    await featured_vendors_cache.stop()
+    await service_catalog.stop()
+    ImageService.shutdown()
+    await SupabaseManager.close()
+    stop_auth_trace()
+
+# Staff-wide aggregates polled by the admin UI, refreshed in the background
+dashboard_stats_cache = RefreshingCache(
+    "admin_dashboard", AdminService.get_dashboard_stats, settings.STAFF_STATS_REFRESH_SECONDS
+)
+admin_unread_cache = RefreshingCache(
+    "admin_chat_unread", chat_service.get_unread_count_for_admin, settings.STAFF_STATS_REFRESH_SECONDS
+)
+admin_chat_summary_cache = RefreshingCache(
+    "admin_chat_summary", chat_service.get_admin_chat_summary, settings.STAFF_STATS_REFRESH_SECONDS
+)
+staff_stats_caches = [dashboard_stats_cache, admin_unread_cache, admin_chat_summary_cache]
+
+def invalidate_chat_stats():
+    admin_unread_cache.invalidate()
+    admin_chat_summary_cache.invalidate()
+
+async def read_staff_stats(cache: RefreshingCache, response: fastapi.Response):
+    """Read a staff aggregate and report its age in the X-Data-Age header"""
+    value, age = await cache.get()
+    response.headers["X-Data-Age"] = f"{age:.1f}"
+    return value
+
+async def load_featured_snapshot() -> Dict[str, Any]:
+    """Render the featured-vendors response once per refresh, with its strong ETag"""
+    vendors = await VendorService.get_featured_vendors()
+    body = json.dumps({"success": True, "vendors": vendors}, separators=(",", ":"), default=str).encode()
+    return {"body": body, "etag": f'"{hashlib.sha256(body).hexdigest()[:32]}"'}
+
+# Public landing-page data: served from memory, refreshed on a schedule
+featured_vendors_cache = RefreshingCache(
+    "featured_vendors", load_featured_snapshot, settings.FEATURED_VENDORS_REFRESH_SECONDS
+)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header value matches the given ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison is what RFC 9110 prescribes for If-None-Match
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
 
 # Health check endpoint used by Nginx and Docker healthchecks
 @app.get("/api/v1/health")
 async def health_check() -> dict[str, str]:
     return {"status": "ok"}
 
+# user_id -> resolved profile (users row + vendor status) for the auth dependency
+user_profile_cache = TTLCache(
+    "user_profile",
+    maxsize=settings.AUTH_PROFILE_CACHE_SIZE,
+    ttl=settings.AUTH_PROFILE_CACHE_TTL
+)
+
+def invalidate_user_profile(user_id: Optional[str]):
+    if user_id:
+        user_profile_cache.invalidate(user_id)
+
 # Dependencies
 async def get_current_user(request: Request):
-    # Verbose logging for debugging the logout issue
-    with open("auth_debug.log", "a") as f:
-        f.write(f"\n--- Auth Check: {datetime.now()} ---\n")
-        f.write(f"Path: {request.url.path}\n")
-        
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            f.write("Error: Missing or invalid Authorization header\n")
-            raise HTTPException(status_code=401, detail="Missing or invalid token")
-        
-        token = auth_header.split(" ")[1]
-        try:
-            # Use to_thread for get_user as it might be synchronous or slow in some client versions
-            user_res = await asyncio.to_thread(supabase.auth.get_user, token)
+    return await authenticate_request(request)
+
+async def get_current_user_verified(request: Request):
+    """Like get_current_user, but always confirms the session with GoTrue.
+    Use for sensitive operations where a revoked token must not pass."""
+    return await authenticate_request(request, force_remote=True)
+
+async def authenticate_request(request: Request, force_remote: bool = False):
+    # Auth tracing goes through a queue to a background writer (see app/utils/auth_trace.py)
+    trace = AuthTrace(request.url.path)
+    trace.debug("auth_check")
+    
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        trace.warning("missing_token")
+        raise HTTPException(status_code=401, detail="Missing or invalid token")
+    
+    token = auth_header.split(" ")[1]
+    try:
+        # Verify the JWT locally when possible; GoTrue is only asked when the
+        # token is about to expire, no key is available, or a revocation check is forced
+        claims = None
+        if settings.SUPABASE_JWT_VERIFY_MODE == "local" and not force_remote:
+            try:
+                claims = await verify_supabase_token(token)
+            except JWTError as jwt_err:
+                trace.warning("local_verification_failed", error=str(jwt_err))
+                raise HTTPException(status_code=401, detail="Invalid token")
+            if claims and token_expires_soon(claims):
+                claims = None
+
+        if claims:
+            user_id = claims["sub"]
+            user_email = claims.get("email")
+            user_metadata = claims.get("user_metadata") or {}
+        else:
+            user_res = await supabase.auth.get_user(token)
             if not user_res.user:
-                f.write("Error: Supabase get_user returned no user\n")
+                trace.warning("gotrue_no_user")
                 raise HTTPException(status_code=401, detail="Invalid token")
             
             user_id = user_res.user.id
             user_email = user_res.user.email
             user_metadata = user_res.user.user_metadata or {}
-            user_role_meta = user_metadata.get("role", "user")
-            user_name_meta = user_metadata.get("name", "")
-            
-            f.write(f"User ID: {user_id}\n")
-            f.write(f"Email: {user_email}\n")
-            f.write(f"Metadata Role: {user_role_meta}\n")
+        user_role_meta = user_metadata.get("role", "user")
+        user_name_meta = user_metadata.get("name", "")
+        
+        trace.debug("token_valid", user_id=user_id, verified="local" if claims else "gotrue", metadata_role=user_role_meta)
 
-            # Use supabase_admin for role/is_active check to ensure we bypass any RLS issues
-            try:
-                user_data = await asyncio.to_thread(
-                    supabase_admin.table("users").select("*").eq("id", user_id).execute
-                )
-                if user_data.data:
-                    p = user_data.data[0]
-                    f.write(f"DB Profile Found. Role: {p.get('role')}\n")
-                else:
-                    f.write("Warning: No profile found in 'users' table\n")
-                    p = {
-                        "id": user_id,
-                        "email": user_email,
-                        "role": user_role_meta,
-                        "name": user_name_meta,
-                        "is_active": True
-                    }
-            except Exception as db_err:
-                f.write(f"DB Error: {str(db_err)}\n")
-                p = {
-                    "id": user_id,
-                    "email": user_email,
-                    "role": user_role_meta,
-                    "name": user_name_meta,
-                    "is_active": True
-                }
+        # Resolved profiles (including vendor status) are cached per user and
+        # invalidated by the endpoints that change them
+        cached = user_profile_cache.get(user_id)
+        if cached is not None:
+            p = dict(cached)
+        else:
+            # An invalidation during the load (e.g. the vendor was just frozen) discards the result
+            generation = user_profile_cache.generation()
+            p, cacheable = await load_user_profile(
+                user_id, user_email, user_role_meta, user_name_meta, trace
+            )
+            if cacheable:
+                user_profile_cache.set(user_id, dict(p), generation=generation)
 
-            # Apply vendor-only rule for password reset and status check
-            is_vendor = p.get("role") == "vendor"
-            p["requires_password_reset"] = p.get("requires_password_reset", False) if is_vendor else False
-            
-            # Auto-logout if vendor is not approved/active
-            if is_vendor:
-                # Need to fetch vendor status from vendors table
-                try:
-                    v_res = await asyncio.to_thread(
-                        supabase_admin.table("vendors").select("status").eq("user_id", user_id).execute
-                    )
-                    if v_res.data:
-                        v_status = v_res.data[0].get("status")
-                        p["status"] = v_status
-                        if v_status in ["freeze", "terminated", "suspended"]:
-                            f.write(f"Access Denied: Vendor status is {v_status}\n")
-                            raise HTTPException(
-                                status_code=403, 
-                                detail=f"Your account status is '{v_status}'. Access restricted."
-                            )
-                except HTTPException: raise
-                except Exception as ve:
-                    f.write(f"Vendor status check error: {str(ve)}\n")
-
-            f.write(f"Returning Profile: {p}\n")
-            return p
-        except Exception as e:
-            f.write(f"Critical Auth Error: {str(e)}\n")
-            logger.error(f"Auth critical error: {str(e)}")
-            raise HTTPException(status_code=401, detail="Could not validate credentials")
+        # Auto-logout if vendor is not approved/active
+        v_status = p.get("status") if p.get("role") == "vendor" else None
+        if v_status in ["freeze", "terminated", "suspended"]:
+            trace.warning("vendor_access_denied", user_id=user_id, vendor_status=v_status)
+            raise HTTPException(
+                status_code=403, 
+                detail=f"Your account status is '{v_status}'. Access restricted."
+            )
+
+        trace.info(
+            "authenticated",
+            user_id=user_id,
+            role=p.get("role"),
+            vendor_status=v_status,
+            profile_cache="hit" if cached is not None else "miss"
+        )
+        return p
+    except Exception as e:
+        trace.error("auth_failed", error=str(e))
+        logger.error(f"Auth critical error: {str(e)}")
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+async def load_user_profile(user_id: str, user_email: str, user_role_meta: str, user_name_meta: str, trace: AuthTrace):
+    """Fetch the users row and, for vendors, the vendor status.
+    Returns (profile, cacheable); fallbacks after DB errors are not cacheable."""
+    cacheable = True
+    # Use supabase_admin for role/is_active check to ensure we bypass any RLS issues
+    try:
+        user_data = await supabase_admin.table("users").select("*").eq("id", user_id).execute()
+        if user_data.data:
+            p = user_data.data[0]
+        else:
+            trace.warning("profile_missing", user_id=user_id)
+            p = {
+                "id": user_id,
+                "email": user_email,
+                "role": user_role_meta,
+                "name": user_name_meta,
+                "is_active": True
+            }
+    except Exception as db_err:
+        trace.error("profile_db_error", user_id=user_id, error=str(db_err))
+        cacheable = False
+        p = {
+            "id": user_id,
+            "email": user_email,
+            "role": user_role_meta,
+            "name": user_name_meta,
+            "is_active": True
+        }
+
+    # Apply vendor-only rule for password reset and status check
+    is_vendor = p.get("role") == "vendor"
+    p["requires_password_reset"] = p.get("requires_password_reset", False) if is_vendor else False
+
+    if is_vendor:
+        # Need to fetch vendor status from vendors table
+        try:
+            v_res = await supabase_admin.table("vendors").select("status").eq("user_id", user_id).execute()
+            if v_res.data:
+                p["status"] = v_res.data[0].get("status")
+        except Exception as ve:
+            trace.error("vendor_status_error", user_id=user_id, error=str(ve))
+            cacheable = False
+
+    return p, cacheable
 
 async def require_admin(user: Dict[str, Any] = Depends(get_current_user)):
     if user.get("role") != "admin":
@@ -170,38 +308,69 @@ async def require_vendor(user: Dict[str, Any] = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Vendor access required")
     return user
 
-async def upload_file_to_storage(file: UploadFile, vendor_id: str, file_type: str, service_id: Optional[str] = None):
-    """Upload file to Supabase Storage"""
+# user_id -> vendor_id; the mapping is fixed at registration so entries live long
+vendor_id_cache = TTLCache(
+    "vendor_id",
+    maxsize=settings.VENDOR_ID_CACHE_SIZE,
+    ttl=settings.VENDOR_ID_CACHE_TTL
+)
+
+async def resolve_vendor_id(user_id: str) -> Optional[str]:
+    """Look up the vendor id owned by a user, memoized across requests"""
+    vendor_id = vendor_id_cache.get(user_id)
+    if vendor_id is None:
+        vendor_res = await supabase_admin.table("vendors").select("id").eq("user_id", user_id).limit(1).execute()
+        if not vendor_res.data:
+            return None
+        vendor_id = vendor_res.data[0]["id"]
+        vendor_id_cache.set(user_id, vendor_id)
+    return vendor_id
+
+async def get_current_vendor_id(user: Dict[str, Any] = Depends(require_vendor)) -> str:
+    """Vendor id of the authenticated vendor (resolved once per request)"""
+    vendor_id = await resolve_vendor_id(user["id"])
+    if not vendor_id:
+        raise HTTPException(status_code=404, detail="Vendor profile not found")
+    return vendor_id
+
+async def require_vendor_access(vendor_id: str, user: Dict[str, Any] = Depends(get_current_user)):
+    """Staff may access any vendor; a vendor only its own `vendor_id`"""
+    role = user.get("role")
+    if role in ["admin", "manager"]:
+        return user
+    if role == "vendor" and await resolve_vendor_id(user["id"]) == vendor_id:
+        return user
+    raise HTTPException(status_code=403, detail="Access denied")
+
+def storage_file_path(vendor_id: str, file_type: str, filename: Optional[str], service_id: Optional[str] = None) -> str:
+    """Unique object path of a new vendor file"""
+    filename = filename or ""
+    file_ext = filename.split('.')[-1].lower() if '.' in filename else 'bin'
+    if not file_ext.isalnum() or len(file_ext) > 10:
+        file_ext = 'bin'
+    unique_filename = f"{uuid.uuid4()}.{file_ext}"
+    if service_id:
+        return f"vendors/{vendor_id}/services/{service_id}/{unique_filename}"
+    return f"vendors/{vendor_id}/{file_type}/{unique_filename}"
+
+async def upload_file_to_storage(file: UploadFile, vendor_id: str, file_type: str, service_id: Optional[str] = None) -> Dict[str, Any]:
+    """Upload file to Supabase Storage (streamed in chunks, resumable above one chunk).
+
+    Content the vendor already uploaded is not stored again: the stored copy's
+    URL is returned with deduplicated=True.
+    """
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Generate unique filename
-        file_ext = file.filename.split('.')[-1] if '.' in file.filename else 'bin'
-        unique_filename = f"{uuid.uuid4()}.{file_ext}"
-        
-        # Determine file path
-        if service_id:
-            file_path = f"vendors/{vendor_id}/services/{service_id}/{unique_filename}"
-        else:
-            file_path = f"vendors/{vendor_id}/{file_type}/{unique_filename}"
-        
-        # Upload to storage - wrapped in to_thread to avoid blocking
-        import asyncio
-        result = await asyncio.to_thread(
-            supabase_admin.storage.from_("vendor-files").upload,
-            file_path,
-            content,
-            {"content-type": file.content_type}
-        )
-        
-        # Get public URL
-        public_url = await asyncio.to_thread(
-            supabase_admin.storage.from_("vendor-files").get_public_url,
-            file_path
-        )
-        
-        return public_url
+        content_hash, size = await StorageService.hash_file(file)
+        existing = await UploadIndex.lookup(vendor_id, content_hash)
+        if existing:
+            logger.info(f"Upload deduplicated for vendor {vendor_id}: {existing['path']}")
+            return {"url": existing["url"], "sha256": content_hash, "deduplicated": True}
+
+        file_path = storage_file_path(vendor_id, file_type, file.filename, service_id)
+        await StorageService.upload(file, file_path)
+        public_url = await StorageService.public_url(file_path)
+        await UploadIndex.record(vendor_id, content_hash, file_path, public_url, size, file.content_type)
+        return {"url": public_url, "sha256": content_hash, "deduplicated": False}
         
     except Exception as e:
         logger.error(f"File upload error: {str(e)}")
@@ -289,10 +458,31 @@ class ServiceStatusRequest(BaseModel):
 
 class DeleteFileSchema(BaseModel):
     vendor_id: str
-    file_url: str
+    file_url: Optional[str] = None
+    # Several files of the same list (gallery / one service) in one call
+    file_urls: Optional[List[str]] = None
+    file_type: str
+    service_id: Optional[str] = None
+
+class UploadSessionRequest(BaseModel):
+    file_type: str
+    filename: str
+    size: int = Field(..., gt=0)
+    content_type: Optional[str] = None
+    service_id: Optional[str] = None
+    # SHA-256 of the file (hex); an already stored copy is reused without uploading
+    sha256: Optional[str] = Field(None, pattern=r"^[0-9a-fA-F]{64}$")
+
+class DirectUploadRequest(BaseModel):
     file_type: str
+    filename: str
+    # Type the file will be PUT with; must suit file_type (checked again on confirm)
+    content_type: str
     service_id: Optional[str] = None
 
+class DirectUploadConfirmRequest(BaseModel):
+    upload_id: str
+
 class ServiceSchema(BaseModel):
     serviceName: str
     serviceCategory: str
@@ -401,6 +591,22 @@ class UpdateRequestApprovalSchema(BaseModel):
 class UpdateRequestRejectionSchema(BaseModel):
     reason: str
 
+class ServiceSearchFilter(BaseModel):
+    q: Optional[str] = None
+    category: Optional[str] = None
+    locations: Optional[List[str]] = None
+    languages: Optional[List[str]] = None
+    duration_unit: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    currency: Optional[str] = None
+
+class AvailabilityCalendarRequest(BaseModel):
+    service_ids: Optional[List[str]] = None
+    search: Optional[ServiceSearchFilter] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+
 
 @app.post("/api/auth/send-otp")
 async def send_otp(data: SendOtpRequest):
@@ -454,10 +660,10 @@ async def verify_email_otp(data: VerifyEmailOtpRequest):
 @app.post("/api/auth/refresh")
 async def refresh_token(data: RefreshRequest):
     try:
-        res = supabase.auth.refresh_session(data.refresh_token)
+        res = await supabase.auth.refresh_session(data.refresh_token)
         # Fetch extended user profile for consistency
         user_id = res.user.id
-        user_data = supabase_admin.table("users").select("*").eq("id", user_id).execute()
+        user_data = await supabase_admin.table("users").select("*").eq("id", user_id).execute()
         
         if user_data.data:
             user_profile = user_data.data[0]
@@ -488,14 +694,14 @@ async def refresh_token(data: RefreshRequest):
         raise HTTPException(status_code=401, detail=f"Refresh failed: {str(e)}")
 
 @app.post("/api/auth/change-password")
-async def change_password(data: PasswordResetRequest, current_user: dict = Depends(get_current_user)):
+async def change_password(data: PasswordResetRequest, current_user: dict = Depends(get_current_user_verified)):
     try:
         user_id = current_user["id"]
         user_email = current_user["email"]
         
         # Verify current password by attempting a sign-in
         try:
-            auth_verify = supabase.auth.sign_in_with_password({
+            auth_verify = await supabase.auth.sign_in_with_password({
                 "email": user_email,
                 "password": data.current_password
             })
@@ -505,10 +711,11 @@ async def change_password(data: PasswordResetRequest, current_user: dict = Depen
             raise HTTPException(status_code=401, detail="Invalid current password")
 
         # Update Supabase Auth
-        supabase_admin.auth.admin.update_user_by_id(user_id, {"password": data.password})
+        await supabase_admin.auth.admin.update_user_by_id(user_id, {"password": data.password})
         
         # Clear reset flag in database
-        supabase_admin.table("users").update({"requires_password_reset": False}).eq("id", user_id).execute()
+        await supabase_admin.table("users").update({"requires_password_reset": False}).eq("id", user_id).execute()
+        invalidate_user_profile(user_id)
         
         return {"success": True, "message": "Password changed successfully"}
     except HTTPException: raise
@@ -528,7 +735,7 @@ async def forgot_password(data: ForgotPasswordRequest):
         # Check if user exists and get their role
         try:
             # Using find instead of single to handle "not found" gracefully
-            user_data = supabase_admin.table("users").select("*").ilike("email", email).execute()
+            user_data = await supabase_admin.table("users").select("*").ilike("email", email).execute()
             
             if not user_data.data or len(user_data.data) == 0:
                 logger.warning(f"Forgot password: User '{email}' not found in 'users' table.")
@@ -544,10 +751,11 @@ async def forgot_password(data: ForgotPasswordRequest):
             temp_password = "".join(secrets.choice(chars) for _ in range(10))
             
             # 2. Update Supabase Auth via Admin API
-            supabase_admin.auth.admin.update_user_by_id(user_id, {"password": temp_password})
+            await supabase_admin.auth.admin.update_user_by_id(user_id, {"password": temp_password})
             
             # 3. Set requires_password_reset = True in users table
-            supabase_admin.table("users").update({"requires_password_reset": True}).eq("id", user_id).execute()
+            await supabase_admin.table("users").update({"requires_password_reset": True}).eq("id", user_id).execute()
+            invalidate_user_profile(user_id)
             
             # 4. Send email
             from app.services.email_service import EmailService
@@ -576,7 +784,7 @@ async def login(data: LoginRequest):
         if not email or not data.password:
              raise HTTPException(status_code=400, detail="Credentials required")
 
-        auth_res = supabase.auth.sign_in_with_password({
+        auth_res = await supabase.auth.sign_in_with_password({
             "email": str(email),
             "password": data.password
         })
@@ -588,7 +796,7 @@ async def login(data: LoginRequest):
         user_name = user_metadata.get("name", "")
 
         try:
-            user_data = supabase.table("users").select("*").eq("id", user_id).execute()
+            user_data = await supabase.table("users").select("*").eq("id", user_id).execute()
             user_profile = user_data.data[0] if user_data.data else {
                 "id": user_id,
                 "email": user_email,
@@ -608,7 +816,7 @@ async def login(data: LoginRequest):
         
         # Check Vendor Status if role is vendor
         if user_profile.get("role") == "vendor":
-            vendor_data = supabase_admin.table("vendors").select("status").eq("user_id", user_id).execute()
+            vendor_data = await supabase_admin.table("vendors").select("status").eq("user_id", user_id).execute()
             if vendor_data.data:
                 vendor_status = vendor_data.data[0].get("status")
                 if vendor_status in ["freeze", "terminated", "suspended"]:
@@ -639,7 +847,7 @@ async def register(data: RegisterRequest):
         
         if role in ["user", "vendor"]:
             # Use the standard client for public registration
-            auth_res = supabase.auth.sign_up({
+            auth_res = await supabase.auth.sign_up({
                 "email": str(data.email),
                 "password": data.password,
                 "options": {
@@ -656,9 +864,9 @@ async def register(data: RegisterRequest):
                 "is_active": True
             }
             # Use admin client to insert to ensure no RLS issues during initial creation
-            supabase_admin.table("users").insert(user_profile).execute()
+            await supabase_admin.table("users").insert(user_profile).execute()
             
-            login_res = supabase.auth.sign_in_with_password({"email": str(data.email), "password": data.password})
+            login_res = await supabase.auth.sign_in_with_password({"email": str(data.email), "password": data.password})
             
             return {
                 "access_token": login_res.session.access_token,
@@ -668,7 +876,7 @@ async def register(data: RegisterRequest):
             }
         else:
             # For staff roles, use admin client
-            auth_res = supabase_admin.auth.admin.create_user({
+            auth_res = await supabase_admin.auth.admin.create_user({
                 "email": str(data.email),
                 "password": data.password,
                 "email_confirm": True,
@@ -683,10 +891,10 @@ async def register(data: RegisterRequest):
                 "role": role,
                 "is_active": True
             }
-            supabase_admin.table("users").insert(user_profile).execute()
+            await supabase_admin.table("users").insert(user_profile).execute()
             
             # Use standard client for login
-            login_res = supabase.auth.sign_in_with_password({"email": str(data.email), "password": data.password})
+            login_res = await supabase.auth.sign_in_with_password({"email": str(data.email), "password": data.password})
             
             return {
                 "access_token": login_res.session.access_token,
@@ -712,86 +920,202 @@ async def get_me(current_user: Dict[str, Any] = Depends(get_current_user)):
     return current_user
 
 @app.get("/api/public/vendors/featured")
-async def get_featured_vendors():
+async def get_featured_vendors(request: Request):
     try:
-        # Fetch status=approved or active AND is_public=true
-        res = supabase_admin.table("vendors")\
-            .select("id, business_name, logo_url, vendor_type, cover_image_url, operating_areas")\
-            .eq("is_public", True)\
-            .in_("status", ["approved", "active"])\
-            .execute()
-            
-        return {"success": True, "vendors": res.data or []}
+        snapshot, age = await featured_vendors_cache.get()
     except Exception as e:
         logger.error(f"Fetch featured vendors error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    headers = {
+        "ETag": snapshot["etag"],
+        "Cache-Control": (
+            f"public, max-age={settings.FEATURED_VENDORS_MAX_AGE}, "
+            f"stale-while-revalidate={settings.FEATURED_VENDORS_STALE_WHILE_REVALIDATE}"
+        ),
+        "X-Data-Age": f"{age:.1f}"
+    }
+    if etag_matches(request.headers.get("if-none-match"), snapshot["etag"]):
+        return fastapi.Response(status_code=304, headers=headers)
+    return fastapi.Response(content=snapshot["body"], media_type="application/json", headers=headers)
+
+@app.get("/api/public/services/search")
+async def search_services(
+    q: Optional[str] = Query(None, max_length=200),
+    category: Optional[str] = None,
+    location: Optional[List[str]] = Query(None),
+    language: Optional[List[str]] = Query(None),
+    duration_unit: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    currency: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """Search approved services of public vendors (served from the in-memory catalog index)"""
+    try:
+        result = await service_catalog.search(
+            limit=limit,
+            offset=offset,
+            q=q,
+            category=category,
+            locations=location,
+            languages=language,
+            duration_unit=duration_unit,
+            min_price=min_price,
+            max_price=max_price,
+            currency=currency
+        )
+        return {"success": True, **result}
+    except Exception as e:
+        logger.error(f"Service search error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/public/services/{service_id}/availability")
+async def get_service_availability(
+    service_id: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+):
+    """Open dates between start and end (inclusive; defaults to the next 30 days)"""
+    start = start or business_today()
+    end = end or start + timedelta(days=29)
+    try:
+        availability = await AvailabilityService.get_availability(service_id, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Service availability error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if availability is None:
+        raise HTTPException(status_code=404, detail="Service not found")
+    return {"success": True, **availability}
+
+@app.post("/api/public/services/availability")
+async def get_services_availability_calendar(data: AvailabilityCalendarRequest):
+    """
+    Availability matrix for many services (by id, or the results of a catalog search)
+    over one window (defaults to the next 60 days)
+    """
+    if not data.service_ids and data.search is None:
+        raise HTTPException(status_code=400, detail="Provide service_ids or a search filter")
+
+    service_ids = list(dict.fromkeys(data.service_ids or []))
+    if len(service_ids) > AVAILABILITY_CALENDAR_MAX_SERVICES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {AVAILABILITY_CALENDAR_MAX_SERVICES} services per request"
+        )
+    if data.search is not None:
+        # Search results fill the room the explicit ids leave
+        found = await service_catalog.search(
+            limit=AVAILABILITY_CALENDAR_MAX_SERVICES, **data.search.dict(exclude_none=True)
+        )
+        service_ids = list(dict.fromkeys(service_ids + [s["id"] for s in found["services"]]))
+        service_ids = service_ids[:AVAILABILITY_CALENDAR_MAX_SERVICES]
+
+    start = data.start or business_today()
+    end = data.end or start + timedelta(days=59)
+    try:
+        calendar = await AvailabilityService.get_calendar(service_ids, start, end)
+        return {"success": True, **calendar}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Availability calendar error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Admin API
 @app.get("/api/admin/dashboard", dependencies=[Depends(require_staff)])
-async def get_admin_dashboard():
+async def get_admin_dashboard(response: fastapi.Response):
     try:
-        import asyncio
-        # Use .count() instead of fetching all data to reduce memory and transfer time
-        # We run these in parallel using asyncio.gather/threads for maximum speed
-        
-        async def fetch_counts():
-            # Supabase doesn't have a simple COUNT(*) without fetching some data in this client version,
-            # but we can request just the count property to minimize payload.
-            # Using head=True is the most efficient way to get counts.
-            vendors_count_res = await asyncio.to_thread(
-                supabase_admin.table("vendors").select("*", count="exact").execute
-            )
-            users_count_res = await asyncio.to_thread(
-                supabase_admin.table("users").select("*", count="exact").execute
-            )
-            
-            # Count statuses separately
-            pending_count_res = await asyncio.to_thread(
-                supabase_admin.table("vendors").select("*", count="exact").eq("status", "pending").execute
-            )
-            approved_count_res = await asyncio.to_thread(
-                supabase_admin.table("vendors").select("*", count="exact").eq("status", "approved").execute
-            )
-            rejected_count_res = await asyncio.to_thread(
-                supabase_admin.table("vendors").select("*", count="exact").eq("status", "rejected").execute
-            )
-            
-            return {
-                "total_vendors": vendors_count_res.count or 0,
-                "pending": pending_count_res.count or 0,
-                "approved": approved_count_res.count or 0,
-                "rejected": rejected_count_res.count or 0,
-                "total_users": users_count_res.count or 0
-            }
-
-        stats = await fetch_counts()
+        # One grouped aggregate (RPC) returns every vendor status and user role bucket;
+        # served from the background-refreshed cache
+        stats = await read_staff_stats(dashboard_stats_cache, response)
         return {"stats": stats}
     except Exception as e:
         logger.error(f"Dashboard stats error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/admin/vendors", dependencies=[Depends(require_staff)])
-async def get_vendors_admin(vendor_status: Optional[str] = None):
+async def get_vendors_admin(
+    vendor_status: Optional[str] = None,
+    vendor_type: Optional[str] = None,
+    operating_area: Optional[List[str]] = Query(None),
+    is_public: Optional[bool] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    view: str = "full",
+    limit: int = Query(ADMIN_VENDORS_PAGE_SIZE, ge=1, le=ADMIN_VENDORS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_total: bool = False
+):
+    """
+    Keyset-paginated vendor list (newest first). Pass `next_cursor` from the
+    previous page as `cursor` to continue. `view=summary` returns list columns only.
+    """
+    if view not in ["full", "summary"]:
+        raise HTTPException(status_code=400, detail="view must be 'full' or 'summary'")
     try:
-        query = supabase_admin.table("vendors").select("*")
-        if vendor_status:
-            query = query.eq("status", vendor_status)
-        res = query.order("created_at", desc=True).execute()
-        return {"success": True, "vendors": res.data or []}
+        page = await VendorService.list_vendors_page(
+            filters={
+                "status": vendor_status,
+                "vendor_type": vendor_type,
+                "operating_areas": operating_area,
+                "is_public": is_public,
+                "created_from": created_from.isoformat() if created_from else None,
+                "created_to": created_to.isoformat() if created_to else None
+            },
+            limit=limit,
+            cursor=cursor,
+            columns=VENDOR_SUMMARY_COLUMNS if view == "summary" else "*",
+            include_total=include_total
+        )
+        return {"success": True, **page}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Fetch vendors admin error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def read_vendor_detail(
+    vendor_id: str,
+    fields: Optional[str],
+    service_fields: Optional[str],
+    services_limit: Optional[int],
+    services_offset: int
+) -> Dict[str, Any]:
+    """Shared read path of the admin and vendor profile endpoints"""
+    try:
+        vendor_columns = VendorService.parse_fields(fields)
+        service_columns = VendorService.parse_fields(service_fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    detail = await VendorService.get_vendor_detail(
+        vendor_id,
+        fields=vendor_columns,
+        service_fields=service_columns,
+        services_limit=services_limit,
+        services_offset=services_offset
+    )
+    if detail is None:
+        raise HTTPException(status_code=404, detail="Vendor profile not found")
+    return {"success": True, **detail}
+
 @app.get("/api/admin/vendors/{vendor_id}", dependencies=[Depends(require_staff)])
-async def get_vendor_detail(vendor_id: str):
+async def get_vendor_detail(
+    vendor_id: str,
+    fields: Optional[str] = None,
+    service_fields: Optional[str] = None,
+    services_limit: Optional[int] = Query(None, ge=1, le=VENDOR_DETAIL_MAX_SERVICES),
+    services_offset: int = Query(0, ge=0)
+):
     try:
-        vendor_res = supabase_admin.table("vendors").select("*").eq("id", vendor_id).single().execute()
-        services_res = supabase_admin.table("vendor_services").select("*").eq("vendor_id", vendor_id).execute()
-        return {
-            "success": True,
-            "vendor": vendor_res.data,
-            "services": services_res.data or []
-        }
+        return await read_vendor_detail(vendor_id, fields, service_fields, services_limit, services_offset)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -809,14 +1133,21 @@ async def update_vendor_status(vendor_id: str, data: VendorStatusRequest):
         update_data["is_public"] = data.is_public
 
     # Get current vendor data to check old status and get user_id
-    vendor_res = supabase_admin.table("vendors").select("status, user_id").eq("id", vendor_id).single().execute()
+    vendor_res = await supabase_admin.table("vendors").select("status, user_id").eq("id", vendor_id).single().execute()
     old_status = vendor_res.data.get("status") if vendor_res.data else None
     user_id = vendor_res.data.get("user_id") if vendor_res.data else None
 
     if not update_data:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    res = supabase_admin.table("vendors").update(update_data).eq("id", vendor_id).execute()
+    res = await supabase_admin.table("vendors").update(update_data).eq("id", vendor_id).execute()
+    # Status changes must reach the auth dependency immediately (freeze/suspend lockout)
+    invalidate_user_profile(user_id)
+    dashboard_stats_cache.invalidate()
+    if "status" in update_data or "is_public" in update_data:
+        # Visibility may have changed: rebuild the public snapshot now
+        featured_vendors_cache.invalidate(reload=True)
+        await service_catalog.refresh_vendor(vendor_id)
     
     # Handle Approval Credentials Email - Trigger whenever status is set to approved, 
     # even if it was previously another status (as requested)
@@ -829,7 +1160,7 @@ async def update_vendor_status(vendor_id: str, data: VendorStatusRequest):
         else:
             try:
                 # Get user email
-                user_res = supabase_admin.table("users").select("email").eq("id", user_id).single().execute()
+                user_res = await supabase_admin.table("users").select("email").eq("id", user_id).single().execute()
                 user_email = user_res.data.get("email") if user_res.data else None
                 print(f">>> DEBUG: Found user_email: {user_email}")
                 
@@ -844,7 +1175,7 @@ async def update_vendor_status(vendor_id: str, data: VendorStatusRequest):
                     
                     # Update Supabase Auth Password
                     try:
-                        supabase_admin.auth.admin.update_user_by_id(
+                        await supabase_admin.auth.admin.update_user_by_id(
                             user_id,
                             attributes={"password": temp_password}
                         )
@@ -856,7 +1187,7 @@ async def update_vendor_status(vendor_id: str, data: VendorStatusRequest):
                     # Set reset flag in database
                     # NOTE: This will fail until the user runs the migration
                     try:
-                        flag_res = supabase_admin.table("users").update({"requires_password_reset": True}).eq("id", user_id).execute()
+                        flag_res = await supabase_admin.table("users").update({"requires_password_reset": True}).eq("id", user_id).execute()
                         print(f">>> DEBUG: Successfully set requires_password_reset flag for {user_id}")
                     except Exception as db_err:
                          logger.error(f"DATABASE ERROR: Failed to set requires_password_reset flag for user {user_id}. Migration missing?")
@@ -876,6 +1207,9 @@ async def update_vendor_status(vendor_id: str, data: VendorStatusRequest):
                 print(f">>> DEBUG: CRITICAL ERROR - {str(e)}")
                 # We don't raise here to avoid blocking the status update
 
+        # requires_password_reset changed during the approval flow
+        invalidate_user_profile(user_id)
+
     return {"success": True, "vendor": res.data[0]}
 
 @app.patch("/api/admin/vendors/{vendor_id}/profile", dependencies=[Depends(require_staff)])
@@ -888,22 +1222,22 @@ async def update_vendor_profile(vendor_id: str, data: VendorProfileUpdate):
     if "email" in update_data:
         new_email = update_data["email"]
         # Duplicate check across all vendors
-        dup_check = supabase_admin.table("vendors").select("id").eq("email", new_email).neq("id", vendor_id).execute()
+        dup_check = await supabase_admin.table("vendors").select("id").eq("email", new_email).neq("id", vendor_id).execute()
         if dup_check.data and len(dup_check.data) > 0:
             raise HTTPException(status_code=400, detail="Use another email ID")
 
         try:
             # 1. Get user_id for this vendor
-            vendor_data_res = supabase_admin.table("vendors").select("user_id").eq("id", vendor_id).single().execute()
+            vendor_data_res = await supabase_admin.table("vendors").select("user_id").eq("id", vendor_id).single().execute()
             if not vendor_data_res.data:
                 raise HTTPException(status_code=404, detail="Vendor not found")
             user_id = vendor_data_res.data["user_id"]
 
             # 2. Update Supabase Auth email
-            supabase_admin.auth.admin.update_user_by_id(user_id, {"email": new_email})
+            await supabase_admin.auth.admin.update_user_by_id(user_id, {"email": new_email})
             
             # 3. Update public.users table email
-            supabase_admin.table("users").update({"email": new_email}).eq("id", user_id).execute()
+            await supabase_admin.table("users").update({"email": new_email}).eq("id", user_id).execute()
             
             # 4. Update public.vendors table email (will be handled by the final update below if we don't pop it, but let's be explicit)
             # Actually, the update_data already contains "email", so line 647 will update the vendors table.
@@ -913,7 +1247,9 @@ async def update_vendor_profile(vendor_id: str, data: VendorProfileUpdate):
             raise HTTPException(status_code=500, detail=f"Email update failed: {str(auth_err)}")
 
     try:
-        res = supabase_admin.table("vendors").update(update_data).eq("id", vendor_id).execute()
+        res = await supabase_admin.table("vendors").update(update_data).eq("id", vendor_id).execute()
+        invalidate_user_profile(res.data[0].get("user_id") if res.data else None)
+        await service_catalog.refresh_vendor(vendor_id)
         return {"success": True, "vendor": res.data[0]}
     except Exception as e:
         logger.error(f"Update vendor profile error: {str(e)}")
@@ -922,10 +1258,12 @@ async def update_vendor_profile(vendor_id: str, data: VendorProfileUpdate):
 @app.patch("/api/vendor/services/{service_id}/status")
 async def update_service_status(
     service_id: str,
-    status_data: ServiceStatusRequest
+    status_data: ServiceStatusRequest,
+    user: Dict[str, Any] = Depends(get_current_user)
 ):
     """
-    Update service status (Admin or Vendor)
+    Update service status (Admin or Vendor).
+    Staff may set any status; vendors only pause (freeze) or resubmit (pending) their own services.
     """
     try:
         status_val = status_data.status
@@ -937,10 +1275,22 @@ async def update_service_status(
             )
         
         update_data = {"status": status_val}
-        result = supabase_admin.table("vendor_services").update(update_data).eq("id", service_id).execute()
+        query = supabase_admin.table("vendor_services").update(update_data).eq("id", service_id)
+        if user.get("role") == "vendor":
+            if status_val not in ["pending", "freeze"]:
+                raise HTTPException(status_code=403, detail="Only staff can approve, activate or reject services")
+            vendor_id = await resolve_vendor_id(user["id"])
+            if not vendor_id:
+                raise HTTPException(status_code=404, detail="Vendor profile not found")
+            query = query.eq("vendor_id", vendor_id)
+        elif user.get("role") not in ["admin", "manager"]:
+            raise HTTPException(status_code=403, detail="Access denied")
+        result = await query.execute()
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Service not found")
+        await service_catalog.upsert_service(result.data[0])
+        AvailabilityService.invalidate(service_id)
             
         return {
             "success": True,
@@ -961,15 +1311,13 @@ async def update_service_commission(service_id: str, data: CommissionUpdateReque
              raise HTTPException(status_code=400, detail="Commission must be a percentage between 0 and 100")
 
         # Get current service details
-        service_res = supabase_admin.table("vendor_services").select("retail_price").eq("id", service_id).single().execute()
+        service_res = await supabase_admin.table("vendor_services").select("retail_price").eq("id", service_id).single().execute()
         if not service_res.data:
             raise HTTPException(status_code=404, detail="Service not found")
             
-        retail_price = float(service_res.data["retail_price"] or 0)
-        
-        # Calculate
-        commission_amount = retail_price * (commission_percent / 100.0)
-        net_price = retail_price - commission_amount
+        # Calculate (same cent rounding as the bulk commission engine)
+        price, commission, net = CommissionService.split_price(service_res.data["retail_price"], commission_percent)
+        retail_price, commission_amount, net_price = float(price), float(commission), float(net)
         
         # Update
         update_data = {
@@ -977,7 +1325,7 @@ async def update_service_commission(service_id: str, data: CommissionUpdateReque
             "net_price": net_price
         }
         
-        res = supabase_admin.table("vendor_services").update(update_data).eq("id", service_id).execute()
+        res = await supabase_admin.table("vendor_services").update(update_data).eq("id", service_id).execute()
         
         return {
             "success": True, 
@@ -995,11 +1343,37 @@ async def update_service_commission(service_id: str, data: CommissionUpdateReque
         logger.error(f"Commission update error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/admin/services/commission/bulk", dependencies=[Depends(require_admin)])
+async def bulk_update_service_commission(data: BulkCommissionRequest):
+    """
+    Recalculate commission and net price for every service matched by the rules.
+    dry_run (the default) only returns the diff summary.
+    """
+    try:
+        result = await CommissionService.recalculate(data)
+        return {"success": True, **result}
+    except Exception as e:
+        logger.error(f"Bulk commission error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/admin/cache/stats", dependencies=[Depends(require_admin)])
+async def get_cache_stats():
+    """Hit/miss counters for the in-process caches of this worker"""
+    return {
+        "success": True,
+        "caches": [
+                      user_profile_cache.stats(), vendor_id_cache.stats(),
+                      featured_vendors_cache.stats(), service_catalog.stats(),
+                      AvailabilityService.stats(), idempotency_store.stats()
+                  ] +
+                  [c.stats() for c in staff_stats_caches]
+    }
+
 # Manager Management (Admin Only)
 @app.get("/api/admin/managers", dependencies=[Depends(require_admin)])
 async def get_managers():
     try:
-        users = supabase_admin.table("users").select("*").eq("role", "manager").execute()
+        users = await supabase_admin.table("users").select("*").eq("role", "manager").execute()
         return {"success": True, "managers": users.data or []}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1008,7 +1382,7 @@ async def get_managers():
 async def create_manager(data: ManagerCreateRequest):
     try:
         # Create auth user using ADMIN client
-        auth_res = supabase_admin.auth.admin.create_user({
+        auth_res = await supabase_admin.auth.admin.create_user({
             "email": str(data.email),
             "password": data.password,
             "email_confirm": True,
@@ -1024,7 +1398,7 @@ async def create_manager(data: ManagerCreateRequest):
             "role": "manager",
             "is_active": True
         }
-        supabase_admin.table("users").insert(user_profile).execute()
+        await supabase_admin.table("users").insert(user_profile).execute()
         
         return {"success": True, "manager": user_profile}
     except Exception as e:
@@ -1039,8 +1413,9 @@ async def create_manager(data: ManagerCreateRequest):
 @app.delete("/api/admin/managers/{user_id}", dependencies=[Depends(require_admin)])
 async def delete_manager(user_id: str):
     try:
-        supabase_admin.auth.admin.delete_user(user_id)
-        supabase_admin.table("users").delete().eq("id", user_id).execute()
+        await supabase_admin.auth.admin.delete_user(user_id)
+        await supabase_admin.table("users").delete().eq("id", user_id).execute()
+        invalidate_user_profile(user_id)
         return {"success": True, "message": "Manager deleted"}
     except Exception as e:
         logger.error(f"Delete manager error: {str(e)}")
@@ -1051,19 +1426,20 @@ async def reset_user_password(user_id: str, data: PasswordResetRequest):
     """Reset any user's password (Admin only)"""
     try:
         # Update supabase auth password
-        supabase_admin.auth.admin.update_user_by_id(
+        await supabase_admin.auth.admin.update_user_by_id(
             user_id, 
             {"password": data.password}
         )
         
         # For admin manual reset, only force reset if the user is a vendor
-        user_res = supabase_admin.table("users").select("role").eq("id", user_id).single().execute()
+        user_res = await supabase_admin.table("users").select("role").eq("id", user_id).single().execute()
         user_role = user_res.data.get("role") if user_res.data else "user"
         
         if user_role == "vendor":
-            supabase_admin.table("users").update({"requires_password_reset": True}).eq("id", user_id).execute()
+            await supabase_admin.table("users").update({"requires_password_reset": True}).eq("id", user_id).execute()
         else:
-            supabase_admin.table("users").update({"requires_password_reset": False}).eq("id", user_id).execute()
+            await supabase_admin.table("users").update({"requires_password_reset": False}).eq("id", user_id).execute()
+        invalidate_user_profile(user_id)
 
         # Log the action (security best practice)
         logger.info(f"Admin reset password for user: {user_id}")
@@ -1077,30 +1453,30 @@ async def reset_user_password(user_id: str, data: PasswordResetRequest):
 
 # Export Data (Staff Only)
 @app.get("/api/admin/export/vendors", dependencies=[Depends(require_staff)])
-async def export_vendors():
+async def export_vendors(format: str = Query("csv", pattern="^(csv|ndjson|parquet|arrow)$")):
+    return await export_table(
+        "vendors", format, VENDOR_EXPORT_COLUMNS, VENDOR_EXPORT_FIELDS, "vendors_export"
+    )
+
+@app.get("/api/admin/export/services", dependencies=[Depends(require_staff)])
+async def export_services(format: str = Query("csv", pattern="^(csv|ndjson|parquet|arrow)$")):
+    return await export_table(
+        "vendor_services", format, SERVICE_EXPORT_COLUMNS, SERVICE_EXPORT_FIELDS, "services_export"
+    )
+
+async def export_table(table: str, fmt: str, csv_columns: List[str], fields: list, filename_prefix: str):
+    """Stream a table page by page as CSV, NDJSON, Parquet or Arrow"""
+    if not ExportService.is_available(fmt):
+        raise HTTPException(status_code=501, detail=f"Export format '{fmt}' requires pyarrow on the server")
+
+    media_type, extension = EXPORT_FORMATS[fmt]
     try:
-        vendors = supabase.table("vendors").select("*").execute()
-        
-        output = io.StringIO()
-        fieldnames = [
-            "id", "user_id", "business_name", "vendor_type", "status", 
-            "contact_person", "email", "phone_number", "created_at"
-        ]
-        
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        for v in (vendors.data or []):
-            row = {k: v.get(k, "") for k in fieldnames}
-            writer.writerow(row)
-            
-        output.seek(0)
-        
-        return fastapi.Response(
-            content=output.getvalue(),
-            media_type="text/csv",
+        stream = await ExportService.primed(ExportService.stream(table, fmt, csv_columns, fields))
+        return StreamingResponse(
+            stream,
+            media_type=media_type,
             headers={
-                "Content-Disposition": f"attachment; filename=vendors_export_{datetime.now().strftime('%Y%m%d')}.csv"
+                "Content-Disposition": f"attachment; filename={filename_prefix}_{datetime.now().strftime('%Y%m%d')}.{extension}"
             }
         )
     except Exception as e:
@@ -1112,10 +1488,85 @@ async def export_vendors():
 
 
 # Vendor API
+def build_vendor_record(data: VendorRegisterRequest) -> Dict[str, Any]:
+    """vendors row (without user_id) for a registration payload"""
+    return {
+        "vendor_type": data.vendorType,
+        "vendor_type_other": data.vendorTypeOther,
+        "business_name": data.businessName,
+        "legal_name": data.legalName,
+        "contact_person": data.contactPerson,
+        "email": str(data.email),
+        "phone_number": data.phoneNumber,
+        "phone_verified": data.phoneVerified,
+        "operating_areas": data.operatingAreas,
+        "operating_areas_other": data.operatingAreas_other,
+        "business_reg_number": data.businessRegNumber,
+        "business_address": data.businessAddress,
+        "tax_id": data.taxId,
+        "bank_name": data.bankName,
+        "bank_name_other": data.bankNameOther,
+        "account_holder_name": data.accountHolderName,
+        "account_number": data.accountNumber,
+        "bank_branch": data.bankBranch,
+        # URLs
+        "reg_certificate_url": data.regCertificateUrl,
+        "nic_passport_url": data.nicPassportUrl,
+        "tourism_license_url": data.tourismLicenseUrl,
+        "logo_url": data.logoUrl,
+        "cover_image_url": data.coverImageUrl,
+        "gallery_urls": data.galleryUrls,
+        # Payout
+        # Agreements
+        "accept_terms": data.acceptTerms,
+        "accept_commission": data.acceptCommission,
+        "accept_cancellation": data.acceptCancellation,
+        "grant_rights": data.grantRights,
+        "confirm_accuracy": data.confirmAccuracy,
+        "status": "pending"
+    }
+
+def build_service_record(s: ServiceSchema) -> Dict[str, Any]:
+    """vendor_services row (without vendor_id) for a submitted service"""
+    return {
+        "service_name": s.serviceName,
+        "service_category": s.serviceCategory,
+        "service_category_other": s.serviceCategoryOther,
+        "service_description": s.serviceDescription or s.description,
+        "short_description": s.shortDescription,
+        "whats_included": s.whatsIncluded,
+        "whats_not_included": s.whatsNotIncluded,
+        "duration_value": s.durationValue,
+        "duration_unit": s.durationUnit,
+        "languages_offered": s.languagesOffered,
+        "languages_other": s.languagesOther,
+        "group_size_min": s.groupSizeMin,
+        "group_size_max": s.groupSizeMax,
+        "daily_capacity": s.dailyCapacity,
+        "operating_days": s.operatingDays,
+        "locations_covered": s.locationsCovered,
+        "currency": s.currency,
+        "retail_price": s.retailPrice,
+        "commission": 0,
+        "net_price": s.retailPrice,
+        "operating_hours_from": s.operatingHoursFrom,
+        "operating_hours_from_period": s.operatingHoursFromPeriod,
+        "operating_hours_to": s.operatingHoursTo,
+        "operating_hours_to_period": s.operatingHoursToPeriod,
+        "blackout_dates": s.blackoutDates,
+        "blackout_holidays": s.blackoutHolidays,
+        "blackout_weekends": s.blackoutWeekends,
+        "advance_booking": s.advanceBooking,
+        "advance_booking_other": s.advanceBookingOther,
+        "not_suitable_for": s.notSuitableFor,
+        "important_info": s.importantInfo,
+        "cancellation_policy": s.cancellationPolicy,
+        "accessibility_info": s.accessibilityInfo,
+        "image_urls": s.imageUrls
+    }
+
 @app.post("/api/vendor/register", status_code=201)
 async def register_vendor(data: VendorRegisterRequest):
-    user_id = None
-    vendor_id = None
     try:
         logger.info(f"Vendor registration: {data.email}")
         
@@ -1131,7 +1582,7 @@ async def register_vendor(data: VendorRegisterRequest):
         password = data.password if data.password else "123456"
         
         try:
-            auth_res = supabase_admin.auth.admin.create_user({
+            auth_res = await supabase_admin.auth.admin.create_user({
                 "email": str(data.email),
                 "password": password,
                 "email_confirm": True,
@@ -1143,184 +1594,87 @@ async def register_vendor(data: VendorRegisterRequest):
             logger.error(f"Auth creation failed: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Auth creation failed: {str(e)}")
         
-        # 2. Public User
-        try:
-            supabase_admin.table("users").insert({
-                "id": user_id,
-                "email": str(data.email),
-                "name": data.contactPerson,
-                "role": "vendor"
-            }).execute()
-            logger.info(f"User profile created: {user_id}")
-        except Exception as e:
-            logger.error(f"Profile creation failed: {str(e)}")
-            # Rollback: Delete auth user
-            try:
-                supabase_admin.auth.admin.delete_user(user_id)
-                logger.info(f"Rolled back auth user: {user_id}")
-            except Exception as rollback_err:
-                logger.error(f"Rollback failed for auth user: {rollback_err}")
-            raise HTTPException(status_code=500, detail=f"User profile failed: {str(e)}")
-        
-        # 3. Vendor Profile
+        # 2. Public user, vendor profile and services in one transaction (register_vendor RPC)
         try:
-            db_vendor = {
-                "user_id": user_id,
-                "vendor_type": data.vendorType,
-                "vendor_type_other": data.vendorTypeOther,
-                "business_name": data.businessName,
-                "legal_name": data.legalName,
-                "contact_person": data.contactPerson,
-                "email": str(data.email),
-                "phone_number": data.phoneNumber,
-                "phone_verified": data.phoneVerified,
-                "operating_areas": data.operatingAreas,
-                "operating_areas_other": data.operatingAreas_other,
-                "business_reg_number": data.businessRegNumber,
-                "business_address": data.businessAddress,
-                "tax_id": data.taxId,
-                "bank_name": data.bankName,
-                "bank_name_other": data.bankNameOther,
-                "account_holder_name": data.accountHolderName,
-                "account_number": data.accountNumber,
-                "bank_branch": data.bankBranch,
-                # URLs
-                "reg_certificate_url": data.regCertificateUrl,
-                "nic_passport_url": data.nicPassportUrl,
-                "tourism_license_url": data.tourismLicenseUrl,
-                "logo_url": data.logoUrl,
-                "cover_image_url": data.coverImageUrl,
-                "gallery_urls": data.galleryUrls,
-                # Payout
-                # Payout
-                # Agreements
-                "accept_terms": data.acceptTerms,
-                "accept_commission": data.acceptCommission,
-                "accept_cancellation": data.acceptCancellation,
-                "grant_rights": data.grantRights,
-                "confirm_accuracy": data.confirmAccuracy,
-                "status": "pending"
-            }
-            res = supabase_admin.table("vendors").insert(db_vendor).execute()
-            vendor_id = res.data[0]["id"]
-            logger.info(f"Vendor profile created: {vendor_id}")
+            vendor_id = await VendorService.create_vendor_records(
+                user={"id": user_id, "email": str(data.email), "name": data.contactPerson, "role": "vendor"},
+                vendor=build_vendor_record(data),
+                services=[build_service_record(s) for s in data.services]
+            )
         except Exception as e:
-            logger.error(f"Vendor profile error: {str(e)}")
-            # Rollback: Delete user and auth
-            try:
-                supabase_admin.table("users").delete().eq("id", user_id).execute()
-                logger.info(f"Rolled back user profile: {user_id}")
-            except Exception as rollback_err:
-                logger.error(f"Rollback failed for user profile: {rollback_err}")
+            logger.error(f"Vendor registration failed: {str(e)}")
+            # Rollback: deleting the auth user cascades to users -> vendors -> vendor_services
             try:
-                supabase_admin.auth.admin.delete_user(user_id)
+                await supabase_admin.auth.admin.delete_user(user_id)
                 logger.info(f"Rolled back auth user: {user_id}")
             except Exception as rollback_err:
                 logger.error(f"Rollback failed for auth user: {rollback_err}")
-            raise HTTPException(status_code=500, detail=f"Vendor profile failed: {str(e)}")
-        
-        # 4. Services - Bulk Insert for Performance
-        if data.services:
-            try:
-                import asyncio
-                service_records = []
-                for s in data.services:
-                    service_records.append({
-                        "vendor_id": vendor_id,
-                        "service_name": s.serviceName,
-                        "service_category": s.serviceCategory,
-                        "service_category_other": s.serviceCategoryOther,
-                        "service_description": s.serviceDescription or s.description,
-                        "short_description": s.shortDescription,
-                        "whats_included": s.whatsIncluded,
-                        "whats_not_included": s.whatsNotIncluded,
-                        "duration_value": s.durationValue,
-                        "duration_unit": s.durationUnit,
-                        "languages_offered": s.languagesOffered,
-                        "languages_other": s.languagesOther,
-                        "group_size_min": s.groupSizeMin,
-                        "group_size_max": s.groupSizeMax,
-                        "daily_capacity": s.dailyCapacity,
-                        "operating_days": s.operatingDays,
-                        "locations_covered": s.locationsCovered,
-                        "currency": s.currency,
-                        "retail_price": s.retailPrice,
-                        "commission": 0,
-                        "net_price": s.retailPrice,
-                        "operating_hours_from": s.operatingHoursFrom,
-                        "operating_hours_from_period": s.operatingHoursFromPeriod,
-                        "operating_hours_to": s.operatingHoursTo,
-                        "operating_hours_to_period": s.operatingHoursToPeriod,
-                        "blackout_dates": s.blackoutDates,
-                        "blackout_holidays": s.blackoutHolidays,
-                        "blackout_weekends": s.blackoutWeekends,
-                        "advance_booking": s.advanceBooking,
-                        "advance_booking_other": s.advanceBookingOther,
-                        "not_suitable_for": s.notSuitableFor,
-                        "important_info": s.importantInfo,
-                        "cancellation_policy": s.cancellationPolicy,
-                        "accessibility_info": s.accessibilityInfo,
-                        "image_urls": s.imageUrls
-                    })
+            raise HTTPException(status_code=500, detail=f"Vendor registration failed: {str(e)}")
                 
-                # Perform bulk insert
-                await asyncio.to_thread(
-                    supabase_admin.table("vendor_services").insert(service_records).execute
-                )
-                logger.info(f"Successfully bulk inserted {len(service_records)} services for vendor {vendor_id}")
-            except Exception as se:
-                logger.error(f"Bulk service insert error: {str(se)}")
-                # Rollback: Delete vendor, user, and auth
-                try:
-                    await asyncio.to_thread(supabase_admin.table("vendors").delete().eq("id", vendor_id).execute)
-                    logger.info(f"Rolled back vendor profile: {vendor_id}")
-                except Exception as rollback_err:
-                    logger.error(f"Rollback failed for vendor: {rollback_err}")
-                try:
-                    await asyncio.to_thread(supabase_admin.table("users").delete().eq("id", user_id).execute)
-                    logger.info(f"Rolled back user profile: {user_id}")
-                except Exception as rollback_err:
-                    logger.error(f"Rollback failed for user: {rollback_err}")
-                try:
-                    await asyncio.to_thread(supabase_admin.auth.admin.delete_user, user_id)
-                    logger.info(f"Rolled back auth user: {user_id}")
-                except Exception as rollback_err:
-                    logger.error(f"Rollback failed for auth: {rollback_err}")
-                raise HTTPException(status_code=500, detail=f"Service registration failed: {str(se)}")
-                
-        logger.info(f"Vendor registration completed successfully: {vendor_id}")
+        logger.info(f"Vendor registration completed successfully: {vendor_id} ({len(data.services)} services)")
+        dashboard_stats_cache.invalidate()
         return {"success": True, "vendor_id": vendor_id}
     except HTTPException: raise
     except Exception as e:
         logger.exception("Vendor registration exception")
-        # Final catch-all rollback if we have IDs
-        if vendor_id:
-            try:
-                supabase_admin.table("vendors").delete().eq("id", vendor_id).execute()
-                logger.info(f"Final rollback - vendor: {vendor_id}")
-            except: pass
-        if user_id:
-            try:
-                supabase_admin.table("users").delete().eq("id", user_id).execute()
-                logger.info(f"Final rollback - user: {user_id}")
-            except: pass
-            try:
-                supabase_admin.auth.admin.delete_user(user_id)
-                logger.info(f"Final rollback - auth: {user_id}")
-            except: pass
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/admin/vendors/import", dependencies=[Depends(require_admin)])
+async def import_vendors(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    start_row: int = Form(1, ge=1),
+    dry_run: bool = Form(False)
+):
+    """Bulk onboarding from a CSV or NDJSON file of VendorRegisterRequest rows.
+
+    CSV: one vendor per row with the request's field names as headers,
+    operatingAreas / galleryUrls separated by ";" and services as a JSON array.
+    Phone verification is not enforced for imported vendors. Re-uploading the
+    same file resumes a partially failed import (existing vendors are skipped).
+    """
+    fmt = detect_import_format(file.filename, file.content_type, format)
+    if fmt is None:
+        raise HTTPException(status_code=400, detail="Unsupported import format. Use csv or ndjson")
+
+    def build_entry(payload: Dict[str, Any]) -> Dict[str, Any]:
+        data = VendorRegisterRequest(**payload)
+        return {
+            "email": str(data.email),
+            "password": data.password or "123456",
+            "name": data.contactPerson,
+            "vendor": build_vendor_record(data),
+            "services": [build_service_record(s) for s in data.services]
+        }
+
+    try:
+        report = await VendorImportService.run(file.file, fmt, build_entry, start_row=start_row, dry_run=dry_run)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable import file: {str(e)}")
+    except Exception as e:
+        logger.exception("Vendor import exception")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if report["summary"].get("created"):
+        dashboard_stats_cache.invalidate()
+    return {"success": True, **report}
+
 @app.get("/api/vendor/profile")
-async def get_vendor_profile(current_user: dict = Depends(get_current_user)):
+async def get_vendor_profile(
+    fields: Optional[str] = None,
+    service_fields: Optional[str] = None,
+    services_limit: Optional[int] = Query(None, ge=1, le=VENDOR_DETAIL_MAX_SERVICES),
+    services_offset: int = Query(0, ge=0),
+    current_user: dict = Depends(get_current_user)
+):
     if current_user.get("role") != "vendor":
         raise HTTPException(status_code=403, detail="Vendor access required")
     try:
-        # Use ADMIN client to bypass RLS issues for the authorized user
-        vendor_res = supabase_admin.table("vendors").select("*").eq("user_id", current_user["id"]).single().execute()
-        if not vendor_res.data: raise HTTPException(status_code=404, detail="Vendor profile not found")
-        v_id = vendor_res.data["id"]
-        s_res = supabase_admin.table("vendor_services").select("*").eq("vendor_id", v_id).execute()
-        return {"success": True, "vendor": vendor_res.data, "services": s_res.data or []}
+        # The detail read uses the ADMIN client to bypass RLS issues for the authorized user
+        vendor_id = await resolve_vendor_id(current_user["id"])
+        if not vendor_id: raise HTTPException(status_code=404, detail="Vendor profile not found")
+        return await read_vendor_detail(vendor_id, fields, service_fields, services_limit, services_offset)
+    except HTTPException: raise
     except Exception as e:
         logger.error(f"Get vendor profile error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1340,7 +1694,7 @@ async def update_vendor_profile(data: VendorUpdateSchema, current_user: dict = D
     
     try:
         # Get current vendor data
-        vendor_res = supabase_admin.table("vendors").select("*").eq("user_id", current_user["id"]).single().execute()
+        vendor_res = await supabase_admin.table("vendors").select("*").eq("user_id", current_user["id"]).single().execute()
         if not vendor_res.data:
             raise HTTPException(status_code=404, detail="Vendor profile not found")
         
@@ -1423,18 +1777,12 @@ async def update_vendor_profile(data: VendorUpdateSchema, current_user: dict = D
 # ==================== SERVICE MANAGEMENT ENDPOINTS ====================
 
 @app.post("/api/vendor/services", status_code=201)
-async def create_vendor_service(s: ServiceSchema, current_user: dict = Depends(get_current_user)):
-    if current_user.get("role") != "vendor":
-        raise HTTPException(status_code=403, detail="Vendor access required")
-    
+async def create_vendor_service(
+    s: ServiceSchema,
+    current_user: dict = Depends(require_vendor),
+    vendor_id: str = Depends(get_current_vendor_id)
+):
     try:
-        # Get vendor ID first
-        vendor_res = supabase_admin.table("vendors").select("id").eq("user_id", current_user["id"]).single().execute()
-        if not vendor_res.data:
-            raise HTTPException(status_code=404, detail="Vendor profile not found")
-        
-        vendor_id = vendor_res.data["id"]
-        
         db_service = {
             "vendor_id": vendor_id,
             "service_name": s.serviceName,
@@ -1503,24 +1851,19 @@ async def create_vendor_service(s: ServiceSchema, current_user: dict = Depends(g
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/api/vendor/services/{service_id}")
-async def update_vendor_service(service_id: str, s: ServiceSchema, current_user: dict = Depends(get_current_user)):
+async def update_vendor_service(
+    service_id: str,
+    s: ServiceSchema,
+    current_user: dict = Depends(require_vendor),
+    vendor_id: str = Depends(get_current_vendor_id)
+):
     """
     Update vendor service - Creates an approval request for non-media changes.
     Media field updates (imageUrls) apply directly without approval.
     """
-    if current_user.get("role") != "vendor":
-        raise HTTPException(status_code=403, detail="Vendor access required")
-    
     try:
-        # Verify ownership
-        vendor_res = supabase_admin.table("vendors").select("id").eq("user_id", current_user["id"]).single().execute()
-        if not vendor_res.data:
-            raise HTTPException(status_code=404, detail="Vendor profile not found")
-        
-        vendor_id = vendor_res.data["id"]
-        
-        # Get current service data
-        service_res = supabase_admin.table("vendor_services").select("*").eq("id", service_id).eq("vendor_id", vendor_id).single().execute()
+        # Get current service data (scoped to the vendor for ownership)
+        service_res = await supabase_admin.table("vendor_services").select("*").eq("id", service_id).eq("vendor_id", vendor_id).single().execute()
         if not service_res.data:
             raise HTTPException(status_code=404, detail="Service not found or access denied")
         
@@ -1585,7 +1928,8 @@ async def update_vendor_service(service_id: str, s: ServiceSchema, current_user:
         
         # Apply media changes directly
         if media_data:
-            supabase_admin.table("vendor_services").update(media_data).eq("id", service_id).execute()
+            await supabase_admin.table("vendor_services").update(media_data).eq("id", service_id).execute()
+            await service_catalog.refresh_service(service_id)
         
         # If no non-media changes, return success
         if not requested_data:
@@ -1624,22 +1968,14 @@ async def update_vendor_service(service_id: str, s: ServiceSchema, current_user:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/api/vendor/services/{service_id}")
-async def delete_vendor_service(service_id: str, current_user: dict = Depends(get_current_user)):
-    if current_user.get("role") != "vendor":
-        raise HTTPException(status_code=403, detail="Vendor access required")
-    
+async def delete_vendor_service(service_id: str, vendor_id: str = Depends(get_current_vendor_id)):
     try:
-        # Verify ownership
-        vendor_res = supabase_admin.table("vendors").select("id").eq("user_id", current_user["id"]).single().execute()
-        if not vendor_res.data:
-            raise HTTPException(status_code=404, detail="Vendor profile not found")
-        
-        vendor_id = vendor_res.data["id"]
-        
         # Delete if belongs to vendor
-        res = supabase_admin.table("vendor_services").delete().eq("id", service_id).eq("vendor_id", vendor_id).execute()
+        res = await supabase_admin.table("vendor_services").delete().eq("id", service_id).eq("vendor_id", vendor_id).execute()
         if not res.data:
             raise HTTPException(status_code=404, detail="Service not found or access denied")
+        await service_catalog.remove_service(service_id)
+        AvailabilityService.invalidate(service_id)
             
         return {"success": True, "message": "Service deleted successfully"}
         
@@ -1648,61 +1984,86 @@ async def delete_vendor_service(service_id: str, current_user: dict = Depends(ge
         logger.error(f"Delete service error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def index_stored_upload(
+    vendor_id: str,
+    file_type: str,
+    service_id: Optional[str],
+    path: str,
+    public_url: str,
+    size: int,
+    content_type: Optional[str],
+    content_hash: Optional[str] = None
+):
+    """Background stage of a completed upload session: dedup index, then image variants.
+
+    Only hashes the server computed are indexed; without one (an upload
+    resumed across requests) the stored object is hashed.
+    """
+    try:
+        if content_hash is None:
+            content_hash, size = await StorageService.hash_object(path)
+        await UploadIndex.record(vendor_id, content_hash, path, public_url, size, content_type)
+    except Exception as e:
+        logger.error(f"Indexing upload {path} failed: {str(e)}")
+        content_hash = None
+    await ImageService.process(file_type, vendor_id, service_id, public_url, None, size, content_hash)
+
+async def record_uploaded_file(vendor_id: str, file_type: str, service_id: Optional[str], public_url: str):
+    """Point the vendor / service at a stored file (safe to repeat for the same URL)"""
+    # Update vendor record with file URL ONLY for Media Tab items (direct updates)
+    # Documents (certificates, licenses) MUST go through profile update approval flow
+    if file_type in ['logo', 'cover_image', 'promo_video', 'reg_certificate', 'nic_passport', 'tourism_license']:
+        column_map = {
+            'logo': 'logo_url',
+            'cover_image': 'cover_image_url',
+            'promo_video': 'promo_video_url',
+            'reg_certificate': 'reg_certificate_url',
+            'nic_passport': 'nic_passport_url',
+            'tourism_license': 'tourism_license_url'
+        }
+        if file_type in column_map:
+            await supabase_admin.table("vendors").update({column_map[file_type]: public_url}).eq("id", vendor_id).execute()
+
+    elif file_type == 'gallery':
+        await VendorService.append_media_urls("vendors", vendor_id, [public_url])
+
+    elif file_type == 'service_image' and service_id:
+        images = await VendorService.append_media_urls("vendor_services", service_id, [public_url], vendor_id=vendor_id)
+        if images is not None:
+            await service_catalog.refresh_service(service_id)
+
+
 @app.post("/api/vendor/upload-file")
 async def upload_vendor_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     file_type: str = Form(...),
     service_id: Optional[str] = Form(None),
-    current_user: dict = Depends(require_vendor)
+    vendor_id: str = Depends(get_current_vendor_id)
 ):
     """
     Upload vendor files (documents, images, etc.)
     """
     try:
-        # Get vendor id
-        vendor_res = supabase_admin.table("vendors").select("id").eq("user_id", current_user["id"]).single().execute()
-        if not vendor_res.data:
-            raise HTTPException(status_code=404, detail="Vendor not found")
-        
-        vendor_id = vendor_res.data["id"]
         logger.info(f"Uploading file for vendor {vendor_id}, type: {file_type}")
         
         # Upload file to storage
-        public_url = await upload_file_to_storage(file, vendor_id, file_type, service_id)
-        
-        # Update vendor record with file URL ONLY for Media Tab items (direct updates)
-        # Documents (certificates, licenses) MUST go through profile update approval flow
-        if file_type in ['logo', 'cover_image', 'promo_video', 'reg_certificate', 'nic_passport', 'tourism_license']:
-            column_map = {
-                'logo': 'logo_url',
-                'cover_image': 'cover_image_url',
-                'promo_video': 'promo_video_url',
-                'reg_certificate': 'reg_certificate_url',
-                'nic_passport': 'nic_passport_url',
-                'tourism_license': 'tourism_license_url'
-            }
-            if file_type in column_map:
-                supabase_admin.table("vendors").update({column_map[file_type]: public_url}).eq("id", vendor_id).execute()
-        
-        elif file_type == 'gallery':
-            vendor_data = supabase_admin.table("vendors").select("gallery_urls").eq("id", vendor_id).single().execute()
-            current_gallery = vendor_data.data.get("gallery_urls", []) if vendor_data.data else []
-            # Safety check: ensure current_gallery is a list
-            if not isinstance(current_gallery, list):
-                current_gallery = []
-            updated_gallery = current_gallery + [public_url]
-            supabase_admin.table("vendors").update({"gallery_urls": updated_gallery}).eq("id", vendor_id).execute()
-            
-        elif file_type == 'service_image' and service_id:
-            service_data = supabase_admin.table("vendor_services").select("image_urls").eq("id", service_id).single().execute()
-            if service_data.data:
-                current_images = service_data.data.get("image_urls", [])
-                updated_images = current_images + [public_url]
-                supabase_admin.table("vendor_services").update({"image_urls": updated_images}).eq("id", service_id).execute()
+        stored = await upload_file_to_storage(file, vendor_id, file_type, service_id)
+        public_url = stored["url"]
+        
+        await record_uploaded_file(vendor_id, file_type, service_id, public_url)
+        
+        # Thumbnail / WebP variants after the response, rendered from the stored copy
+        if ImageService.is_enabled(file_type):
+            background_tasks.add_task(
+                ImageService.process, file_type, vendor_id, service_id, public_url,
+                None, file.size, stored["sha256"]
+            )
         
         return {
             "success": True,
             "url": public_url,
+            "deduplicated": stored["deduplicated"],
             "message": f"File uploaded successfully: {file.filename}"
         }
         
@@ -1711,40 +2072,220 @@ async def upload_vendor_file(
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
 
 
+# Resumable uploads: create a session, PUT the bytes (in one or more requests), resume from GET's offset
+async def check_upload_target(vendor_id: str, file_type: str, service_id: Optional[str]) -> None:
+    """Reject unknown file types and services the vendor does not own"""
+    if file_type not in VENDOR_FILE_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported file_type: {file_type}")
+    if service_id:
+        try:
+            uuid.UUID(service_id)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Service not found")
+        owner = await supabase_admin.table("vendor_services").select("id").eq("id", service_id).eq("vendor_id", vendor_id).execute()
+        if not owner.data:
+            raise HTTPException(status_code=404, detail="Service not found")
+
+def read_upload_session(upload_id: str, vendor_id: str) -> Dict[str, Any]:
+    try:
+        session = StorageService.read_session(upload_id)
+    except UploadExpiredError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    if session.get("vendor_id") != vendor_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return session
+
+@app.post("/api/vendor/uploads", status_code=201)
+async def create_upload_session(
+    data: UploadSessionRequest,
+    background_tasks: BackgroundTasks,
+    vendor_id: str = Depends(get_current_vendor_id)
+):
+    """Start a resumable upload; the file is then sent with PUT /api/vendor/uploads/{upload_id}.
+
+    With a sha256 of content this vendor already stored, nothing needs to be
+    sent: the response is already complete and carries the existing URL.
+    """
+    await check_upload_target(vendor_id, data.file_type, data.service_id)
+    try:
+        content_hash = data.sha256.lower() if data.sha256 else None
+        existing = await UploadIndex.lookup(vendor_id, content_hash) if content_hash else None
+        if existing:
+            await record_uploaded_file(vendor_id, data.file_type, data.service_id, existing["url"])
+            background_tasks.add_task(
+                ImageService.process, data.file_type, vendor_id, data.service_id, existing["url"],
+                None, existing.get("size"), content_hash
+            )
+            logger.info(f"Upload session deduplicated for vendor {vendor_id}: {existing['path']}")
+            return {"success": True, "upload_id": None, "offset": data.size, "complete": True,
+                    "url": existing["url"], "deduplicated": True}
+
+        file_path = storage_file_path(vendor_id, data.file_type, data.filename, data.service_id)
+        upload_url = await StorageService.create_resumable(file_path, data.size, data.content_type)
+        session = StorageService.create_session({
+            "vendor_id": vendor_id,
+            "upload_url": upload_url,
+            "path": file_path,
+            "file_type": data.file_type,
+            "service_id": data.service_id,
+            "size": data.size,
+            "content_type": data.content_type,
+            "sha256": content_hash
+        })
+        logger.info(f"Upload session created for vendor {vendor_id}: {file_path} ({data.size} bytes)")
+        return {"success": True, **session, "offset": 0, "chunk_size": settings.UPLOAD_CHUNK_SIZE, "deduplicated": False}
+    except Exception as e:
+        logger.error(f"Create upload session error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Upload session failed: {str(e)}")
+
+@app.get("/api/vendor/uploads/{upload_id}")
+async def get_upload_session(upload_id: str, vendor_id: str = Depends(get_current_vendor_id)):
+    """Offset to resume from"""
+    session = read_upload_session(upload_id, vendor_id)
+    try:
+        offset = await StorageService.get_offset(session["upload_url"])
+    except UploadExpiredError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except Exception as e:
+        logger.error(f"Get upload session error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"success": True, "offset": offset, "size": session["size"], "complete": offset >= session["size"]}
+
+@app.put("/api/vendor/uploads/{upload_id}")
+async def upload_session_chunk(
+    upload_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    offset: int = Query(..., ge=0),
+    vendor_id: str = Depends(get_current_vendor_id)
+):
+    """Append the request body at `offset`.
+
+    The body is forwarded in chunk_size pieces; send whole multiples of
+    chunk_size except for the end of the file. Returns the new offset, plus
+    the file URL once the upload is complete.
+    """
+    session = read_upload_session(upload_id, vendor_id)
+    try:
+        # A body carrying the whole file is hashed on the way through
+        digest = hashlib.sha256() if offset == 0 else None
+        new_offset = await StorageService.stream_to(
+            session["upload_url"], offset, session["size"], request.stream(), digest
+        )
+        if new_offset < session["size"]:
+            return {"success": True, "offset": new_offset, "complete": False}
+
+        public_url = await StorageService.public_url(session["path"])
+        await record_uploaded_file(vendor_id, session["file_type"], session.get("service_id"), public_url)
+        content_hash = digest.hexdigest() if digest is not None else None
+        if content_hash and session.get("sha256") and content_hash != session["sha256"]:
+            logger.warning(f"Upload {session['path']} does not match its declared sha256")
+        background_tasks.add_task(
+            index_stored_upload, vendor_id, session["file_type"], session.get("service_id"), session["path"],
+            public_url, session["size"], session.get("content_type"), content_hash
+        )
+        return {"success": True, "offset": new_offset, "complete": True, "url": public_url}
+    except UploadOffsetError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "offset": e.offset})
+    except UploadExpiredError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Upload chunk error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
+
+# Direct uploads: the client PUTs the file to a signed Storage URL, then confirms it here
+@app.post("/api/vendor/uploads/direct", status_code=201)
+async def create_direct_upload(data: DirectUploadRequest, vendor_id: str = Depends(get_current_vendor_id)):
+    """Signed upload URL for one new file under vendors/{vendor_id}/ (valid for 2 hours)"""
+    await check_upload_target(vendor_id, data.file_type, data.service_id)
+    if data.content_type.lower() not in DIRECT_UPLOAD_CONTENT_TYPES[data.file_type]:
+        raise HTTPException(status_code=415, detail=f"Content type {data.content_type} is not accepted for {data.file_type}")
+    try:
+        file_path = storage_file_path(vendor_id, data.file_type, data.filename, data.service_id)
+        signed = await StorageService.create_signed_upload(file_path)
+        ticket = StorageService.create_session(
+            {"vendor_id": vendor_id, "path": file_path, "file_type": data.file_type, "service_id": data.service_id},
+            token_type=DIRECT_UPLOAD_TOKEN_TYPE,
+            lifetime=timedelta(minutes=settings.DIRECT_UPLOAD_MINUTES)
+        )
+        return {"success": True, **ticket, **signed}
+    except Exception as e:
+        logger.error(f"Create direct upload error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Direct upload failed: {str(e)}")
+
+@app.post("/api/vendor/uploads/direct/confirm")
+async def confirm_direct_upload(
+    data: DirectUploadConfirmRequest,
+    background_tasks: BackgroundTasks,
+    vendor_id: str = Depends(get_current_vendor_id)
+):
+    """Record a file uploaded through a signed URL on the vendor / service"""
+    try:
+        ticket = StorageService.read_session(data.upload_id, DIRECT_UPLOAD_TOKEN_TYPE)
+    except UploadExpiredError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    if ticket.get("vendor_id") != vendor_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    try:
+        info = await StorageService.object_info(ticket["path"])
+        if info is None:
+            raise HTTPException(status_code=404, detail="File has not been uploaded yet")
+
+        # Direct uploads bypass the API (and nginx's body limit): check what actually arrived
+        file_type = ticket["file_type"]
+        size, content_type = info["size"], (info["content_type"] or "").split(";")[0].strip().lower()
+        problem = None
+        if size is None or int(size) > StorageService.direct_upload_limit(file_type):
+            problem = (413, f"File exceeds {StorageService.direct_upload_limit(file_type)} bytes or its size is unknown")
+        elif content_type not in DIRECT_UPLOAD_CONTENT_TYPES[file_type]:
+            problem = (415, f"Content type {content_type or 'unknown'} is not accepted for {file_type}")
+        if problem:
+            await StorageService.remove(ticket["path"])
+            raise HTTPException(status_code=problem[0], detail=problem[1])
+
+        public_url = await StorageService.public_url(ticket["path"])
+        await record_uploaded_file(vendor_id, file_type, ticket.get("service_id"), public_url)
+        background_tasks.add_task(
+            ImageService.process, file_type, vendor_id, ticket.get("service_id"), public_url, None, int(size)
+        )
+        return {"success": True, "url": public_url}
+    except HTTPException: raise
+    except Exception as e:
+        logger.error(f"Confirm direct upload error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Direct upload confirmation failed: {str(e)}")
+
 @app.delete("/api/vendor/delete-file")
 async def delete_vendor_file(
     data: DeleteFileSchema,
-    current_user: dict = Depends(require_vendor)
+    own_vendor_id: str = Depends(get_current_vendor_id)
 ):
     """
     Delete a vendor file (gallery image or service image)
     """
     try:
         vendor_id = data.vendor_id
-        file_url = data.file_url
+        file_urls = list(dict.fromkeys((data.file_urls or []) + ([data.file_url] if data.file_url else [])))
         file_type = data.file_type
         service_id = data.service_id
         
         # Verify ownership
-        vendor_res = supabase_admin.table("vendors").select("id").eq("user_id", current_user["id"]).single().execute()
-        if not vendor_res.data or vendor_res.data["id"] != vendor_id:
+        if own_vendor_id != vendor_id:
             raise HTTPException(status_code=403, detail="Access denied")
+        if not file_urls:
+            raise HTTPException(status_code=400, detail="file_url or file_urls is required")
 
         if file_type == 'gallery':
-            vendor_data = supabase_admin.table("vendors").select("gallery_urls").eq("id", vendor_id).single().execute()
-            if vendor_data.data:
-                gallery = vendor_data.data.get("gallery_urls", [])
-                if file_url in gallery:
-                    gallery.remove(file_url)
-                    supabase_admin.table("vendors").update({"gallery_urls": gallery}).eq("id", vendor_id).execute()
+            if await VendorService.remove_media_urls("vendors", vendor_id, file_urls) is not None:
+                for file_url in file_urls:
+                    await ImageService.forget("vendors", vendor_id, file_url)
         
         elif file_type == 'service_image' and service_id:
-            service_data = supabase_admin.table("vendor_services").select("image_urls").eq("id", service_id).single().execute()
-            if service_data.data:
-                images = service_data.data.get("image_urls", [])
-                if file_url in images:
-                    images.remove(file_url)
-                    supabase_admin.table("vendor_services").update({"image_urls": images}).eq("id", service_id).execute()
+            if await VendorService.remove_media_urls("vendor_services", service_id, file_urls, vendor_id=vendor_id) is not None:
+                for file_url in file_urls:
+                    await ImageService.forget("vendor_services", service_id, file_url)
+                await service_catalog.refresh_service(service_id)
         
         # We don't delete from storage yet to keep it simple, just remove from DB list
         return {"success": True, "message": "File removed successfully"}
@@ -1762,20 +2303,13 @@ async def delete_vendor_file(
 async def send_chat_message(
     vendor_id: str,
     data: ChatMessageSchema,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(require_vendor_access)
 ):
     """Send a chat message (vendor to admin or admin to vendor)"""
     try:
-
         user_role = current_user.get("role")
         sender = "vendor" if user_role == "vendor" else "admin"
         
-        # Verify vendor access for vendor role
-        if user_role == "vendor":
-            vendor_res = supabase_admin.table("vendors").select("id").eq("user_id", current_user["id"]).single().execute()
-            if not vendor_res.data or vendor_res.data["id"] != vendor_id:
-                raise HTTPException(status_code=403, detail="Access denied")
-        
         message = await chat_service.create_message(
             vendor_id=vendor_id,
             sender=sender,
@@ -1787,6 +2321,7 @@ async def send_chat_message(
         )
         
         if message:
+            invalidate_chat_stats()
             return {"success": True, "message": message}
         else:
             raise HTTPException(status_code=500, detail="Failed to send message - chat service unavailable")
@@ -1801,28 +2336,20 @@ async def send_chat_message(
 @app.get("/api/chat/messages/{vendor_id}")
 async def get_chat_messages(
     vendor_id: str,
-    current_user: dict = Depends(get_current_user),
+    current_user: dict = Depends(require_vendor_access),
     limit: int = 100,
     skip: int = 0
 ):
     """Get chat messages for a specific vendor"""
     try:
-
         user_role = current_user.get("role")
         
-        # Verify access
-        if user_role == "vendor":
-            vendor_res = supabase_admin.table("vendors").select("id").eq("user_id", current_user["id"]).single().execute()
-            if not vendor_res.data or vendor_res.data["id"] != vendor_id:
-                raise HTTPException(status_code=403, detail="Access denied")
-        elif user_role not in ["admin", "manager"]:
-            raise HTTPException(status_code=403, detail="Access denied")
-        
         messages = await chat_service.get_messages_by_vendor(vendor_id, limit, skip)
         
         # Mark messages as read
         reader = "vendor" if user_role == "vendor" else "admin"
         await chat_service.mark_messages_read(vendor_id, reader)
+        invalidate_chat_stats()
         
         return {"success": True, "messages": messages}
         
@@ -1834,10 +2361,10 @@ async def get_chat_messages(
 
 
 @app.get("/api/admin/chat/unread-count", dependencies=[Depends(require_staff)])
-async def get_unread_count():
+async def get_unread_count(response: fastapi.Response):
     """Get count of unread messages from vendors"""
     try:
-        count = await chat_service.get_unread_count_for_admin()
+        count = await read_staff_stats(admin_unread_cache, response)
         return {"success": True, "unread_count": count}
     except Exception as e:
         logger.error(f"Get unread count error: {str(e)}")
@@ -1845,10 +2372,10 @@ async def get_unread_count():
 
 
 @app.get("/api/admin/chat/summary", dependencies=[Depends(require_staff)])
-async def get_chat_summary():
+async def get_chat_summary(response: fastapi.Response):
     """Get summary of all vendor chats for admin"""
     try:
-        summary = await chat_service.get_admin_chat_summary()
+        summary = await read_staff_stats(admin_chat_summary_cache, response)
         return {"success": True, "summary": summary}
     except Exception as e:
         logger.error(f"Get chat summary error: {str(e)}")
@@ -1857,16 +2384,10 @@ async def get_chat_summary():
 
 @app.get("/api/vendor/chat/unread-count")
 async def get_vendor_unread_count(
-    current_user: dict = Depends(require_vendor)
+    vendor_id: str = Depends(get_current_vendor_id)
 ):
     """Get count of unread messages for current vendor from admin"""
     try:
-        # Get vendor id
-        vendor_res = supabase_admin.table("vendors").select("id").eq("user_id", current_user["id"]).single().execute()
-        if not vendor_res.data:
-            raise HTTPException(status_code=404, detail="Vendor not found")
-        
-        vendor_id = vendor_res.data["id"]
         count = await chat_service.get_unread_count_for_vendor(vendor_id)
         return {"success": True, "unread_count": count}
     except HTTPException:
@@ -1940,6 +2461,13 @@ async def approve_update_request(
         
         if not approved_request:
             raise HTTPException(status_code=500, detail="Failed to approve request")
+
+        # Keep the public catalog in step with the applied changes
+        if request.get("request_type") == "service_update" and request.get("service_id"):
+            await service_catalog.refresh_service(request["service_id"])
+            AvailabilityService.invalidate(request["service_id"])
+        else:
+            await service_catalog.refresh_vendor(request["vendor_id"])
         
         return {
             "success": True,
@@ -1997,23 +2525,13 @@ async def reject_update_request(
 
 @app.get("/api/vendor/update-requests")
 async def get_vendor_update_requests(
-    current_user: dict = Depends(get_current_user),
+    vendor_id: str = Depends(get_current_vendor_id),
     status: Optional[str] = None,
     limit: int = 20,
     skip: int = 0
 ):
     """Get update requests for the current vendor"""
-    if current_user.get("role") != "vendor":
-        raise HTTPException(status_code=403, detail="Vendor access required")
-    
     try:
-        # Get vendor ID
-        vendor_res = supabase_admin.table("vendors").select("id").eq("user_id", current_user["id"]).single().execute()
-        if not vendor_res.data:
-            raise HTTPException(status_code=404, detail="Vendor profile not found")
-        
-        vendor_id = vendor_res.data["id"]
-        
         if status == "pending":
             requests = await chat_service.get_pending_update_requests(vendor_id, limit, skip)
         else:
@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+class CommissionRule(BaseModel):
+    """Commission for services matching every criterion that is set.
+
+    When several rules match a service the most specific one wins
+    (vendor > category > price band); ties go to the rule listed first.
+    """
+    commission_percent: float = Field(..., ge=0, le=100)
+    vendor_id: Optional[str] = None
+    category: Optional[str] = None
+    min_price: Optional[float] = Field(None, ge=0)
+    max_price: Optional[float] = Field(None, ge=0)
+
+class BulkCommissionRequest(BaseModel):
+    rules: List[CommissionRule] = Field(..., min_length=1)
+    dry_run: bool = True
+    # Restrict the run to these vendors / categories (default: every service a rule can match)
+    vendor_ids: Optional[List[str]] = None
+    categories: Optional[List[str]] = None
+    # Changes listed in the response (the summary always covers all of them)
+    max_changes_listed: int = Field(100, ge=0, le=5000)
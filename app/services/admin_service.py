@@ -0,0 +1,64 @@
+from typing import Dict, Any
+from app.database.supabase_client import SupabaseManager
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Buckets counted individually when the get_dashboard_stats RPC is not installed
+VENDOR_STATUSES = ["pending", "approved", "active", "freeze", "rejected", "suspended", "terminated"]
+USER_ROLES = ["user", "vendor", "admin", "manager"]
+
+class AdminService:
+
+    @staticmethod
+    async def get_dashboard_stats() -> Dict[str, Any]:
+        """Vendor totals per status and user totals per role.
+
+        Uses the get_dashboard_stats RPC (database/migration_v8_dashboard_stats.sql)
+        so all aggregates come back in one round trip.
+        """
+        result = await SupabaseManager.execute_rpc("get_dashboard_stats")
+
+        if result["success"] and result["data"]:
+            vendors_by_status = result["data"].get("vendors_by_status") or {}
+            users_by_role = result["data"].get("users_by_role") or {}
+        else:
+            logger.warning("get_dashboard_stats RPC unavailable - falling back to per-bucket counts. Migration missing?")
+            vendors_by_status, users_by_role = await AdminService._count_buckets()
+
+        stats = {
+            "total_vendors": sum(vendors_by_status.values()),
+            "total_users": sum(users_by_role.values()),
+            "vendors_by_status": vendors_by_status,
+            "users_by_role": users_by_role
+        }
+        # Keep the flat per-status keys the admin UI already reads
+        for vendor_status in ["pending", "approved", "rejected"]:
+            stats[vendor_status] = vendors_by_status.get(vendor_status, 0)
+        for vendor_status, total in vendors_by_status.items():
+            stats.setdefault(vendor_status, total)
+
+        return stats
+
+    @staticmethod
+    async def _count_buckets():
+        """Head-only counts for each known status and role, run concurrently"""
+        async def count(table: str, column: str, value: str) -> int:
+            res = await SupabaseManager.execute_query(
+                table=table,
+                operation="select",
+                columns="id",
+                filters={column: value},
+                count="exact",
+                head=True
+            )
+            return res["count"] or 0
+
+        vendor_counts, user_counts = await asyncio.gather(
+            asyncio.gather(*[count("vendors", "status", s) for s in VENDOR_STATUSES]),
+            asyncio.gather(*[count("users", "role", r) for r in USER_ROLES])
+        )
+        vendors_by_status = {s: n for s, n in zip(VENDOR_STATUSES, vendor_counts) if n}
+        users_by_role = {r: n for r, n in zip(USER_ROLES, user_counts) if n}
+        return vendors_by_status, users_by_role
@@ -57,10 +57,13 @@ class AuthService:
             existing_user = await SupabaseManager.execute_query(
                 table="users",
                 operation="select",
-                filters={"email": user_data.email}
+                columns="id",
+                filters={"email": user_data.email},
+                count="exact",
+                head=True
             )
             
-            if existing_user["success"] and existing_user["data"]:
+            if existing_user["success"] and existing_user["count"]:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="Email already registered"
@@ -0,0 +1,321 @@
+"""
+Service Availability
+Compiles the schedule fields of vendor_services (operating days, blackouts,
+advance booking, time slots, capacity) into per-day bitmaps.
+
+A window of N days is an N-bit integer where bit i is day start + i, so a
+whole window is evaluated with a handful of big-integer operations instead
+of a Python loop per day.
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Dict, Any, Iterable
+from zoneinfo import ZoneInfo
+import hashlib
+import json
+import math
+import re
+import time
+import uuid
+import logging
+
+from app.config import settings
+from app.database.supabase_client import SupabaseManager
+from app.services.catalog_service import service_catalog
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_COLUMNS = (
+    "id, status, operating_days, operating_hours_from, operating_hours_from_period, "
+    "operating_hours_to, operating_hours_to_period, blackout_dates, blackout_weekends, "
+    "blackout_holidays, service_time_slots, daily_capacity, advance_booking, advance_booking_other"
+)
+SCHEDULE_FIELDS = [c.strip() for c in SCHEDULE_COLUMNS.split(",") if c.strip() != "id"]
+
+BOOKABLE_STATUSES = ["approved", "active"]
+MAX_WINDOW_DAYS = 366
+
+# Weekday bits, Monday = bit 0 (date.weekday())
+ALL_DAYS = 0b1111111
+WEEKEND_DAYS = 0b1100000
+WEEKDAY_ALIASES = {
+    "daily": ALL_DAYS, "everyday": ALL_DAYS, "every day": ALL_DAYS, "all": ALL_DAYS, "all days": ALL_DAYS,
+    "weekdays": ALL_DAYS & ~WEEKEND_DAYS, "weekends": WEEKEND_DAYS
+}
+_DAY_PREFIXES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+# Fixed-date public holidays (month, day); movable ones come from PUBLIC_HOLIDAYS
+FIXED_HOLIDAYS = [(2, 4), (5, 1), (12, 25)]
+
+_LEAD_RE = re.compile(r"(\d+)\s*(hour|hr|day|week|month)", re.IGNORECASE)
+_LEAD_UNIT_DAYS = {"hour": 1 / 24, "hr": 1 / 24, "day": 1, "week": 7, "month": 30}
+
+
+def _repeat_week(pattern: int, days: int) -> int:
+    """Tile a 7-bit pattern over `days` bits (one multiplication by a repunit)"""
+    weeks = -(-days // 7)
+    repunit = ((1 << (7 * weeks)) - 1) // ((1 << 7) - 1)
+    return (pattern * repunit) & ((1 << days) - 1)
+
+
+def _rotate_week(mask: int, first_weekday: int) -> int:
+    """Align a Monday-based weekday mask so bit 0 is `first_weekday`"""
+    return ((mask >> first_weekday) | (mask << (7 - first_weekday))) & ALL_DAYS
+
+
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+        return True
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+def _parse_date(value: Any) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+class DateBitmap:
+    """A set of dates stored as one integer, relative to a base ordinal"""
+
+    def __init__(self, dates: Iterable[date]):
+        ordinals = sorted({d.toordinal() for d in dates})
+        self.base = ordinals[0] if ordinals else 0
+        bits = 0
+        for ordinal in ordinals:
+            bits |= 1 << (ordinal - self.base)
+        self.bits = bits
+
+    def window(self, start: date, days: int) -> int:
+        """Bits for [start, start + days)"""
+        if not self.bits:
+            return 0
+        shift = start.toordinal() - self.base
+        bits = self.bits >> shift if shift >= 0 else self.bits << -shift
+        return bits & ((1 << days) - 1)
+
+
+def _holiday_dates(first_year: int, last_year: int) -> List[date]:
+    holidays = [date(year, month, day) for year in range(first_year, last_year + 1) for month, day in FIXED_HOLIDAYS]
+    for value in settings.PUBLIC_HOLIDAYS:
+        parsed = _parse_date(value)
+        if parsed:
+            holidays.append(parsed)
+    return holidays
+
+
+_holiday_bitmap: Optional[DateBitmap] = None
+
+
+def holiday_bitmap() -> DateBitmap:
+    global _holiday_bitmap
+    if _holiday_bitmap is None:
+        this_year = date.today().year
+        _holiday_bitmap = DateBitmap(_holiday_dates(this_year - 1, this_year + 3))
+    return _holiday_bitmap
+
+
+def schedule_fingerprint(row: Dict[str, Any]) -> str:
+    """Stable hash of the schedule fields; changes whenever the schedule does"""
+    payload = json.dumps({field: row.get(field) for field in SCHEDULE_FIELDS}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class CompiledSchedule:
+    """Schedule rules of one service, pre-reduced to bit masks"""
+
+    def __init__(self, row: Dict[str, Any]):
+        self.service_id = row["id"]
+        self.fingerprint = schedule_fingerprint(row)
+        self.bookable = row.get("status") in BOOKABLE_STATUSES and row.get("daily_capacity") != 0
+        self.daily_capacity = row.get("daily_capacity")
+
+        self.weekday_mask = self._weekday_mask(row.get("operating_days"))
+        if row.get("blackout_weekends"):
+            self.weekday_mask &= ~WEEKEND_DAYS
+        self.blackout_holidays = bool(row.get("blackout_holidays"))
+        self.blackouts = DateBitmap(d for d in map(_parse_date, row.get("blackout_dates") or []) if d)
+        self.lead_days = self._lead_days(row.get("advance_booking"), row.get("advance_booking_other"))
+
+        self.hours = None
+        if row.get("operating_hours_from") and row.get("operating_hours_to"):
+            self.hours = {
+                "from": f"{row['operating_hours_from']} {row.get('operating_hours_from_period') or ''}".strip(),
+                "to": f"{row['operating_hours_to']} {row.get('operating_hours_to_period') or ''}".strip()
+            }
+        self.slots = row.get("service_time_slots") or []
+
+    @staticmethod
+    def _weekday_mask(operating_days: Optional[List[str]]) -> int:
+        """Weekday bits from labels like "Monday", "mon", "Weekdays"; no days means every day"""
+        if not operating_days:
+            return ALL_DAYS
+        mask = 0
+        for label in operating_days:
+            key = str(label).strip().lower()
+            if key in WEEKDAY_ALIASES:
+                mask |= WEEKDAY_ALIASES[key]
+            elif key[:3] in _DAY_PREFIXES:
+                mask |= 1 << _DAY_PREFIXES.index(key[:3])
+        return mask or ALL_DAYS
+
+    @staticmethod
+    def _lead_days(advance_booking: Optional[str], advance_booking_other: Optional[str]) -> int:
+        """Whole days of notice required, from free text such as "24 hours" or "2 weeks" """
+        for text in (advance_booking, advance_booking_other):
+            match = _LEAD_RE.search(text or "")
+            if match:
+                return math.ceil(int(match.group(1)) * _LEAD_UNIT_DAYS[match.group(2).lower()])
+        return 0
+
+    def open_bits(self, start: date, days: int, today: date) -> int:
+        """Bitmap of open days in [start, start + days)"""
+        if not self.bookable or days <= 0:
+            return 0
+        bits = _repeat_week(_rotate_week(self.weekday_mask, start.weekday()), days)
+        bits &= ~self.blackouts.window(start, days)
+        if self.blackout_holidays:
+            bits &= ~holiday_bitmap().window(start, days)
+
+        # Nothing before today + lead time
+        first_open = (today + timedelta(days=self.lead_days)).toordinal() - start.toordinal()
+        if first_open > 0:
+            bits &= ~((1 << min(first_open, days)) - 1)
+        return bits & ((1 << days) - 1)
+
+
+def bits_to_dates(bits: int, start: date) -> List[date]:
+    """Dates of the set bits (iterates set bits only)"""
+    dates = []
+    while bits:
+        low = bits & -bits
+        dates.append(start + timedelta(days=low.bit_length() - 1))
+        bits ^= low
+    return dates
+
+
+def business_today() -> date:
+    return datetime.now(ZoneInfo(settings.BUSINESS_TIMEZONE)).date()
+
+
+# service_id -> CompiledSchedule; dropped by AvailabilityService.invalidate when a schedule changes
+schedule_cache = TTLCache(
+    "service_schedules",
+    maxsize=settings.SCHEDULE_CACHE_SIZE,
+    ttl=settings.SCHEDULE_CACHE_TTL
+)
+
+
+class AvailabilityService:
+
+    @staticmethod
+    def invalidate(service_id: Optional[str] = None) -> None:
+        """Forget compiled schedules (one service, or all when no id is given)"""
+        if service_id:
+            schedule_cache.invalidate(service_id)
+        else:
+            schedule_cache.clear()
+
+    @staticmethod
+    def stats() -> Dict[str, Any]:
+        return schedule_cache.stats()
+
+    @staticmethod
+    async def get_schedules(service_ids: List[str]) -> Dict[str, CompiledSchedule]:
+        """Compiled schedules for the given services; misses are loaded in one query.
+        Ids that are not UUIDs are left out (PostgREST would reject the whole query)."""
+        schedules: Dict[str, CompiledSchedule] = {}
+        missing = []
+        for service_id in dict.fromkeys(sid for sid in service_ids if _is_uuid(sid)):
+            compiled = schedule_cache.get(service_id)
+            if compiled is None:
+                missing.append(service_id)
+            else:
+                schedules[service_id] = compiled
+
+        if missing:
+            generation = schedule_cache.generation()
+            client = SupabaseManager.get_async_admin_client()
+            res = await client.table("vendor_services").select(SCHEDULE_COLUMNS).in_("id", missing).execute()
+            for row in res.data or []:
+                compiled = CompiledSchedule(row)
+                schedule_cache.set(row["id"], compiled, generation=generation)
+                schedules[row["id"]] = compiled
+        return schedules
+
+    @staticmethod
+    def validate_window(start: date, end: date) -> int:
+        """Number of days in [start, end]; raises ValueError for bad windows"""
+        days = (end - start).days + 1
+        if days <= 0:
+            raise ValueError("end must not be before start")
+        if days > MAX_WINDOW_DAYS:
+            raise ValueError(f"Window is limited to {MAX_WINDOW_DAYS} days")
+        return days
+
+    @staticmethod
+    async def get_availability(service_id: str, start: date, end: date) -> Optional[Dict[str, Any]]:
+        """Open dates (with slots and capacity) for one service, or None unless it is publicly listed"""
+        days = AvailabilityService.validate_window(start, end)
+        if not _is_uuid(service_id) or not await service_catalog.listed([service_id]):
+            return None
+        schedules = await AvailabilityService.get_schedules([service_id])
+        compiled = schedules.get(service_id)
+        if compiled is None:
+            return None
+
+        open_dates = bits_to_dates(compiled.open_bits(start, days, business_today()), start)
+        return {
+            "service_id": service_id,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "schedule_version": compiled.fingerprint,
+            "operating_hours": compiled.hours,
+            "daily_capacity": compiled.daily_capacity,
+            "dates": [
+                {"date": d.isoformat(), "slots": compiled.slots, "capacity": compiled.daily_capacity}
+                for d in open_dates
+            ]
+        }
+
+    @staticmethod
+    async def get_calendar(service_ids: List[str], start: date, end: date) -> Dict[str, Any]:
+        """Open/closed matrix for many services over one window.
+
+        Each row is a string with one character per date ("1" open, "0" closed),
+        rendered straight from the service's window bitmap. Services that are
+        not publicly listed are reported in not_found.
+        """
+        days = AvailabilityService.validate_window(start, end)
+        started = time.perf_counter()
+        listed = await service_catalog.listed(service_ids)
+        schedules = await AvailabilityService.get_schedules([sid for sid in service_ids if sid in listed])
+        loaded = time.perf_counter()
+
+        today = business_today()
+        rows = {}
+        any_open = 0
+        for service_id, compiled in schedules.items():
+            bits = compiled.open_bits(start, days, today)
+            any_open |= bits
+            # Bit 0 is the first date, so reverse the binary rendering
+            rows[service_id] = format(bits, f"0{days}b")[::-1]
+        computed = time.perf_counter()
+
+        ordered = [sid for sid in dict.fromkeys(service_ids) if sid in rows]
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "dates": [(start + timedelta(days=i)).isoformat() for i in range(days)],
+            "services": ordered,
+            "matrix": [rows[sid] for sid in ordered],
+            "any_open": format(any_open, f"0{days}b")[::-1],
+            "not_found": [sid for sid in dict.fromkeys(service_ids) if sid not in rows],
+            "timing_ms": {
+                "load": round((loaded - started) * 1000, 3),
+                "compute": round((computed - loaded) * 1000, 3)
+            }
+        }
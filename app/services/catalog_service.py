@@ -0,0 +1,370 @@
+# catalog_service.py
+"""
+Public Service Catalog
+In-memory inverted index over bookable services, so catalog searches never
+query Supabase. The index is rebuilt on a schedule and patched incrementally
+when services or their vendors change.
+"""
+from collections import defaultdict
+from typing import Optional, List, Dict, Any, Set, Tuple
+import re
+import time
+import logging
+
+from app.config import settings
+from app.database.supabase_client import SupabaseManager
+from app.utils.cache import RefreshingCache
+from app.utils.pagination import apply_keyset, split_page
+
+
+logger = logging.getLogger(__name__)
+
+# A service is listed when it and its vendor are in one of these states (and the vendor is public)
+LISTED_STATUSES = ["approved", "active"]
+
+CATALOG_VENDOR_COLUMNS = "id, business_name, logo_url, vendor_type"
+CATALOG_SERVICE_COLUMNS = (
+    "id, vendor_id, status, service_name, service_category, service_category_other, "
+    "short_description, service_description, duration_value, duration_unit, "
+    "languages_offered, locations_covered, group_size_min, group_size_max, "
+    "currency, retail_price, image_urls, created_at"
+)
+# Added by migration v13; selected only once it exists (thumbnail_url stays None before)
+CATALOG_VARIANTS_COLUMN = "image_variants"
+
+# Keyword weights per field (a hit in the name ranks above one in the description)
+KEYWORD_FIELDS = {"service_name": 3, "short_description": 2, "service_description": 1}
+# Facet name -> service column; list columns contribute one value per element
+FACET_FIELDS = {
+    "category": "service_category",
+    "location": "locations_covered",
+    "language": "languages_offered",
+    "duration_unit": "duration_unit"
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+LOAD_PAGE_SIZE = 1000
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lower-cased alphanumeric tokens of two characters or more"""
+    if not text:
+        return []
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1]
+
+
+def _facet_values(value: Any) -> List[str]:
+    if value is None:
+        return []
+    values = value if isinstance(value, list) else [value]
+    return [str(v).strip().lower() for v in values if v is not None and str(v).strip()]
+
+
+class CatalogIndex:
+    """Documents plus keyword and facet postings for the listed services"""
+
+    def __init__(self, vendors: Dict[str, Dict[str, Any]]):
+        self.vendors = vendors
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.terms: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.facets: Dict[str, Dict[str, Set[str]]] = {name: defaultdict(set) for name in FACET_FIELDS}
+        # service id -> (terms, facet values) it was indexed under, for removal
+        self._postings: Dict[str, Tuple[List[str], Dict[str, List[str]]]] = {}
+
+    def is_listed(self, row: Dict[str, Any]) -> bool:
+        return row.get("status") in LISTED_STATUSES and row.get("vendor_id") in self.vendors
+
+    def upsert(self, row: Dict[str, Any]) -> None:
+        """Index a service row, or drop it if it is no longer listed"""
+        service_id = row["id"]
+        self.remove(service_id)
+        if not self.is_listed(row):
+            return
+
+        vendor = self.vendors[row["vendor_id"]]
+        price = row.get("retail_price")
+        images = row.get("image_urls") or []
+        self.docs[service_id] = {
+            "id": service_id,
+            "vendor_id": row["vendor_id"],
+            "vendor_name": vendor.get("business_name"),
+            "vendor_logo_url": vendor.get("logo_url"),
+            "service_name": row.get("service_name"),
+            "service_category": row.get("service_category"),
+            "service_category_other": row.get("service_category_other"),
+            "short_description": row.get("short_description"),
+            "duration_value": row.get("duration_value"),
+            "duration_unit": row.get("duration_unit"),
+            "languages_offered": row.get("languages_offered") or [],
+            "locations_covered": row.get("locations_covered") or [],
+            "group_size_min": row.get("group_size_min"),
+            "group_size_max": row.get("group_size_max"),
+            "currency": row.get("currency"),
+            "retail_price": float(price) if price is not None else None,
+            "image_url": images[0] if images else None,
+            "thumbnail_url": ((row.get("image_variants") or {}).get(images[0]) or {}).get("thumb") if images else None,
+            "created_at": row.get("created_at")
+        }
+
+        weights: Dict[str, int] = {}
+        for field, weight in KEYWORD_FIELDS.items():
+            for token in tokenize(row.get(field)):
+                weights[token] = weights.get(token, 0) + weight
+        for token, weight in weights.items():
+            self.terms[token][service_id] = weight
+
+        facet_values = {}
+        for name, column in FACET_FIELDS.items():
+            values = _facet_values(row.get(column))
+            for value in values:
+                self.facets[name][value].add(service_id)
+            facet_values[name] = values
+
+        self._postings[service_id] = (list(weights), facet_values)
+
+    def remove(self, service_id: str) -> None:
+        postings = self._postings.pop(service_id, None)
+        self.docs.pop(service_id, None)
+        if postings is None:
+            return
+        tokens, facet_values = postings
+        for token in tokens:
+            ids = self.terms.get(token)
+            if ids is not None:
+                ids.pop(service_id, None)
+                if not ids:
+                    del self.terms[token]
+        for name, values in facet_values.items():
+            for value in values:
+                ids = self.facets[name].get(value)
+                if ids is not None:
+                    ids.discard(service_id)
+                    if not ids:
+                        del self.facets[name][value]
+
+    def set_vendor(self, vendor_id: str, vendor: Optional[Dict[str, Any]], rows: List[Dict[str, Any]]) -> None:
+        """Replace a vendor (None = no longer listed) and all of its services"""
+        for service_id in [sid for sid, doc in self.docs.items() if doc["vendor_id"] == vendor_id]:
+            self.remove(service_id)
+        if vendor is None:
+            self.vendors.pop(vendor_id, None)
+            return
+        self.vendors[vendor_id] = vendor
+        for row in rows:
+            self.upsert(row)
+
+    def search(
+        self,
+        q: Optional[str] = None,
+        category: Optional[str] = None,
+        locations: Optional[List[str]] = None,
+        languages: Optional[List[str]] = None,
+        duration_unit: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        currency: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """All matching documents, best keyword score first (newest first without q)"""
+        candidates: Optional[Set[str]] = None
+
+        def narrow(ids: Set[str]) -> None:
+            nonlocal candidates
+            candidates = set(ids) if candidates is None else candidates & ids
+
+        # Facets: AND across facets, OR within a multi-valued facet
+        for name, wanted in (
+            ("category", [category] if category else None),
+            ("location", locations),
+            ("language", languages),
+            ("duration_unit", [duration_unit] if duration_unit else None)
+        ):
+            if wanted:
+                ids: Set[str] = set()
+                for value in _facet_values(wanted):
+                    ids |= self.facets[name].get(value, set())
+                narrow(ids)
+
+        # Keywords: every query token must match
+        scores: Dict[str, int] = {}
+        tokens = list(dict.fromkeys(tokenize(q)))
+        for token in tokens:
+            postings = self.terms.get(token, {})
+            narrow(set(postings))
+            for service_id, weight in postings.items():
+                scores[service_id] = scores.get(service_id, 0) + weight
+
+        ids = self.docs.keys() if candidates is None else candidates
+        currency = currency.upper() if currency else None
+        results = []
+        for service_id in ids:
+            doc = self.docs[service_id]
+            price = doc["retail_price"]
+            if min_price is not None and (price is None or price < min_price):
+                continue
+            if max_price is not None and (price is None or price > max_price):
+                continue
+            if currency and (doc["currency"] or "").upper() != currency:
+                continue
+            results.append(doc)
+
+        if tokens:
+            results.sort(key=lambda d: (-scores.get(d["id"], 0), d["service_name"] or ""))
+        else:
+            results.sort(key=lambda d: (d["created_at"] or "", d["id"]), reverse=True)
+        return results
+
+
+class ServiceCatalog:
+    """Owns the live CatalogIndex: scheduled full rebuilds plus incremental patches"""
+
+    def __init__(self):
+        self._cache = RefreshingCache("service_catalog", self._build, settings.SERVICE_CATALOG_REBUILD_SECONDS)
+        # Incremental changes applied while a rebuild may be in flight, replayed onto the new index
+        self._journal: List[Tuple[float, str, tuple]] = []
+        # Whether vendor_services.image_variants exists; probed again on every full rebuild
+        self._variants_column = True
+
+    # ==================== LOADING ====================
+
+    @staticmethod
+    async def _load_vendors(vendor_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        client = SupabaseManager.get_async_admin_client()
+        query = client.table("vendors").select(CATALOG_VENDOR_COLUMNS)\
+            .eq("is_public", True)\
+            .in_("status", LISTED_STATUSES)
+        if vendor_id:
+            query = query.eq("id", vendor_id)
+        res = await query.execute()
+        return {v["id"]: v for v in res.data or []}
+
+    async def _select_services(self, narrow):
+        """Run narrow(select query) over vendor_services with the catalog columns.
+
+        Without migration v13 the image_variants column is missing; it is then
+        left out of the select instead of failing every load.
+        """
+        client = SupabaseManager.get_async_admin_client()
+        if self._variants_column:
+            try:
+                columns = f"{CATALOG_SERVICE_COLUMNS}, {CATALOG_VARIANTS_COLUMN}"
+                return await narrow(client.table("vendor_services").select(columns)).execute()
+            except Exception as e:
+                if CATALOG_VARIANTS_COLUMN not in str(e):
+                    raise
+                logger.warning("vendor_services.image_variants missing - catalog loads without thumbnails. Migration missing?")
+                self._variants_column = False
+        return await narrow(client.table("vendor_services").select(CATALOG_SERVICE_COLUMNS)).execute()
+
+    async def _load_services(self, vendor_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Listed-status services, fetched in keyset pages"""
+        rows: List[Dict[str, Any]] = []
+        cursor = None
+        while True:
+            def narrow(query):
+                query = query.in_("status", LISTED_STATUSES)
+                if vendor_id:
+                    query = query.eq("vendor_id", vendor_id)
+                return apply_keyset(query, cursor).limit(LOAD_PAGE_SIZE + 1)
+
+            res = await self._select_services(narrow)
+            page, cursor = split_page(res.data or [], LOAD_PAGE_SIZE)
+            rows.extend(page)
+            if cursor is None:
+                return rows
+
+    async def _build(self) -> CatalogIndex:
+        started = time.monotonic()
+        self._variants_column = True
+        vendors = await self._load_vendors()
+        services = await self._load_services()
+
+        index = CatalogIndex(vendors)
+        for row in services:
+            index.upsert(row)
+
+        # Patches made during the load may be missing from what was fetched
+        self._journal = [entry for entry in self._journal if entry[0] >= started]
+        for _, op, args in self._journal:
+            getattr(index, op)(*args)
+
+        logger.info(
+            f"Service catalog built: {len(index.docs)} services from {len(vendors)} vendors "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+        return index
+
+    async def _apply(self, op: str, *args) -> None:
+        self._journal.append((time.monotonic(), op, args))
+        index, _ = await self._cache.get()
+        getattr(index, op)(*args)
+
+    # ==================== INCREMENTAL UPDATES ====================
+
+    async def refresh_service(self, service_id: str) -> None:
+        """Re-read one service after its status, content or price changed"""
+        try:
+            res = await self._select_services(lambda query: query.eq("id", service_id))
+            if res.data:
+                await self._apply("upsert", res.data[0])
+            else:
+                await self._apply("remove", service_id)
+        except Exception as e:
+            logger.error(f"Catalog refresh of service {service_id} failed: {str(e)}")
+
+    async def upsert_service(self, row: Dict[str, Any]) -> None:
+        """Index a full vendor_services row the caller already has"""
+        try:
+            await self._apply("upsert", row)
+        except Exception as e:
+            logger.error(f"Catalog update of service {row.get('id')} failed: {str(e)}")
+
+    async def remove_service(self, service_id: str) -> None:
+        try:
+            await self._apply("remove", service_id)
+        except Exception as e:
+            logger.error(f"Catalog removal of service {service_id} failed: {str(e)}")
+
+    async def refresh_vendor(self, vendor_id: str) -> None:
+        """Re-read a vendor and its services (visibility, status or profile changed)"""
+        try:
+            vendors = await self._load_vendors(vendor_id)
+            vendor = vendors.get(vendor_id)
+            rows = await self._load_services(vendor_id) if vendor else []
+            await self._apply("set_vendor", vendor_id, vendor, rows)
+        except Exception as e:
+            logger.error(f"Catalog refresh of vendor {vendor_id} failed: {str(e)}")
+
+    # ==================== QUERIES ====================
+
+    async def search(self, limit: int = 20, offset: int = 0, **filters) -> Dict[str, Any]:
+        index, age = await self._cache.get()
+        results = index.search(**filters)
+        return {
+            "services": results[offset:offset + limit],
+            "total": len(results),
+            "index_age": round(age, 1)
+        }
+
+    async def listed(self, service_ids: List[str]) -> Set[str]:
+        """The given services that are publicly listed (same rules as search)"""
+        index, _ = await self._cache.get()
+        return {service_id for service_id in service_ids if service_id in index.docs}
+
+    # ==================== LIFECYCLE ====================
+
+    def start(self) -> None:
+        self._cache.start()
+
+    async def stop(self) -> None:
+        await self._cache.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._cache.stats()
+        index = self._cache.peek()
+        stats["documents"] = len(index.docs) if index else 0
+        stats["terms"] = len(index.terms) if index else 0
+        return stats
+
+
+# Singleton instance
+service_catalog = ServiceCatalog()
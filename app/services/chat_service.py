@@ -7,7 +7,6 @@ from datetime import datetime
 from typing import Optional, List, Dict, Any
 from bson import ObjectId
 import logging
-import asyncio
 
 from app.database.mongo_config import (
     get_chat_messages_collection,
@@ -239,13 +238,12 @@ class ChatService:
             vendor_names = {}
             if vendor_ids:
                 try:
-                    from app.database.supabase_client import supabase_admin
-                    # Use asyncio.to_thread for the bulk query
-                    vendor_res = await asyncio.to_thread(
+                    supabase_admin = SupabaseManager.get_async_admin_client()
+                    vendor_res = await (
                         supabase_admin.table("vendors")
                         .select("id, business_name")
                         .in_("id", vendor_ids)
-                        .execute
+                        .execute()
                     )
                     if vendor_res.data:
                         vendor_names = {v["id"]: v["business_name"] for v in vendor_res.data}
@@ -0,0 +1,208 @@
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from typing import Optional, List, Dict, Any, Tuple
+from collections import defaultdict
+from app.config import settings
+from app.database.supabase_client import SupabaseManager
+from app.schemas.commission import CommissionRule, BulkCommissionRequest
+from app.utils.pagination import apply_keyset, split_page
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRICING_COLUMNS = "id, vendor_id, service_category, retail_price, commission, net_price, created_at"
+LOAD_PAGE_SIZE = 1000
+CENT = Decimal("0.01")
+
+
+def _money(value: Any) -> Optional[Decimal]:
+    if value is None:
+        return None
+    try:
+        return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _specificity(rule: CommissionRule) -> int:
+    return (
+        (4 if rule.vendor_id else 0)
+        + (2 if rule.category else 0)
+        + (1 if rule.min_price is not None or rule.max_price is not None else 0)
+    )
+
+
+class CommissionService:
+
+    @staticmethod
+    def _matches(rule: CommissionRule, service: Dict[str, Any], price: Decimal) -> bool:
+        if rule.vendor_id and service.get("vendor_id") != rule.vendor_id:
+            return False
+        if rule.category and (service.get("service_category") or "").lower() != rule.category.lower():
+            return False
+        if rule.min_price is not None and price < Decimal(str(rule.min_price)):
+            return False
+        if rule.max_price is not None and price > Decimal(str(rule.max_price)):
+            return False
+        return True
+
+    @staticmethod
+    async def _load_services(vendor_ids: Optional[List[str]], categories: Optional[List[str]]) -> List[Dict[str, Any]]:
+        """Pricing columns of the services in scope, in keyset pages.
+
+        Categories are compared case-insensitively, like rule categories in
+        _matches, so they are filtered here rather than in the query.
+        """
+        client = SupabaseManager.get_async_admin_client()
+        wanted = {category.lower() for category in categories} if categories else None
+        rows: List[Dict[str, Any]] = []
+        cursor = None
+        while True:
+            query = client.table("vendor_services").select(PRICING_COLUMNS)
+            if vendor_ids:
+                query = query.in_("vendor_id", vendor_ids)
+            res = await apply_keyset(query, cursor).limit(LOAD_PAGE_SIZE + 1).execute()
+            page, cursor = split_page(res.data or [], LOAD_PAGE_SIZE)
+            if wanted is not None:
+                page = [row for row in page if (row.get("service_category") or "").lower() in wanted]
+            rows.extend(page)
+            if cursor is None:
+                return rows
+
+    @staticmethod
+    def _scope(request: BulkCommissionRequest) -> Tuple[Optional[List[str]], Optional[List[str]]]:
+        """Narrow the load to what the rules can match when they all name a vendor (or category)"""
+        vendor_ids = request.vendor_ids
+        categories = request.categories
+        if not vendor_ids and all(rule.vendor_id for rule in request.rules):
+            vendor_ids = list(dict.fromkeys(rule.vendor_id for rule in request.rules))
+        if not categories and not vendor_ids and all(rule.category for rule in request.rules):
+            categories = list(dict.fromkeys(rule.category for rule in request.rules))
+        return vendor_ids, categories
+
+    @staticmethod
+    def split_price(retail_price: Any, commission_percent: Any) -> Tuple[Decimal, Decimal, Decimal]:
+        """(price, commission, net price) rounded half-up to the cent; a missing price counts as 0"""
+        price = _money(retail_price) or Decimal("0.00")
+        commission = (price * Decimal(str(commission_percent)) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        return price, commission, price - commission
+
+    @staticmethod
+    def compute_changes(rules: List[CommissionRule], services: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Resolve a rule per service and price it; pure, so dry runs and real runs share it"""
+        # Most specific first; sorted() is stable, so list order breaks ties
+        ordered = sorted(enumerate(rules), key=lambda item: -_specificity(item[1]))
+        percents = {index: Decimal(str(rule.commission_percent)) for index, rule in ordered}
+
+        changes = []
+        by_rule = defaultdict(lambda: {"matched": 0, "changed": 0})
+        totals = defaultdict(Decimal)
+        unmatched = 0
+
+        for service in services:
+            price = _money(service.get("retail_price"))
+            if price is None:
+                unmatched += 1
+                continue
+            rule_index = next(
+                (index for index, rule in ordered if CommissionService._matches(rule, service, price)), None
+            )
+            if rule_index is None:
+                unmatched += 1
+                continue
+
+            _, commission, net_price = CommissionService.split_price(price, percents[rule_index])
+            old_commission = _money(service.get("commission"))
+            old_net_price = _money(service.get("net_price"))
+
+            by_rule[rule_index]["matched"] += 1
+            totals["commission_before"] += old_commission or 0
+            totals["commission_after"] += commission
+            totals["net_price_before"] += old_net_price or 0
+            totals["net_price_after"] += net_price
+
+            if commission == old_commission and net_price == old_net_price:
+                continue
+            by_rule[rule_index]["changed"] += 1
+            changes.append({
+                "id": service["id"],
+                "vendor_id": service.get("vendor_id"),
+                "service_category": service.get("service_category"),
+                "retail_price": float(price),
+                "rule_index": rule_index,
+                "commission_percent": float(percents[rule_index]),
+                "commission": {"old": float(old_commission) if old_commission is not None else None, "new": float(commission)},
+                "net_price": {"old": float(old_net_price) if old_net_price is not None else None, "new": float(net_price)}
+            })
+
+        matched = sum(stats["matched"] for stats in by_rule.values())
+        return {
+            "scanned": len(services),
+            "matched": matched,
+            "changed": len(changes),
+            "unchanged": matched - len(changes),
+            "unmatched": unmatched,
+            "by_rule": [{"rule_index": index, **by_rule[index]} for index in range(len(rules))],
+            "totals": {key: float(value) for key, value in totals.items()},
+            "changes": changes
+        }
+
+    @staticmethod
+    async def _write_batch(batch: List[Dict[str, Any]]) -> int:
+        result = await SupabaseManager.execute_rpc("bulk_update_service_commission", {"updates": batch})
+        if result["success"]:
+            return result["data"] or 0
+
+        # RPC not installed: one UPDATE per distinct (commission, net_price) pair in the batch
+        logger.warning("bulk_update_service_commission RPC unavailable - falling back to grouped updates. Migration missing?")
+        client = SupabaseManager.get_async_admin_client()
+        groups: Dict[Tuple[float, float], List[str]] = defaultdict(list)
+        for row in batch:
+            groups[(row["commission"], row["net_price"])].append(row["id"])
+        responses = await asyncio.gather(*[
+            client.table("vendor_services")
+            .update({"commission": commission, "net_price": net_price})
+            .in_("id", ids)
+            .execute()
+            for (commission, net_price), ids in groups.items()
+        ])
+        return sum(len(res.data or []) for res in responses)
+
+    @staticmethod
+    async def apply_changes(changes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Write changes back in batches (a few batches in flight at once)"""
+        updates = [
+            {"id": c["id"], "commission": c["commission"]["new"], "net_price": c["net_price"]["new"]}
+            for c in changes
+        ]
+        size = settings.COMMISSION_BATCH_SIZE
+        batches = [updates[i:i + size] for i in range(0, len(updates), size)]
+        semaphore = asyncio.Semaphore(4)
+
+        async def run(batch):
+            async with semaphore:
+                return await CommissionService._write_batch(batch)
+
+        results = await asyncio.gather(*[run(batch) for batch in batches], return_exceptions=True)
+        failed = [i for i, r in enumerate(results) if isinstance(r, Exception)]
+        for i in failed:
+            logger.error(f"Commission batch {i} failed: {results[i]}")
+        return {
+            "batches": len(batches),
+            "failed_batches": failed,
+            "updated": sum(r for r in results if not isinstance(r, Exception))
+        }
+
+    @staticmethod
+    async def recalculate(request: BulkCommissionRequest) -> Dict[str, Any]:
+        """Reprice every service the rules match; with dry_run only report the diff"""
+        vendor_ids, categories = CommissionService._scope(request)
+        services = await CommissionService._load_services(vendor_ids, categories)
+        summary = CommissionService.compute_changes(request.rules, services)
+
+        changes = summary.pop("changes")
+        if not request.dry_run and changes:
+            summary["applied"] = await CommissionService.apply_changes(changes)
+        summary["dry_run"] = request.dry_run
+        summary["changes"] = changes[:request.max_changes_listed]
+        return summary
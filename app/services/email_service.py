@@ -105,11 +105,14 @@ class EmailService:
             result = await SupabaseManager.execute_query(
                 table="otp_verifications",
                 operation="select",
+                columns="id, expires_at",
                 filters={
                     "email": email,
                     "otp_code": otp_code,
                     "verified": False
-                }
+                },
+                order=[("created_at", True)],
+                limit=1
             )
 
             if not result.get("success") or not result.get("data") or len(result["data"]) == 0:
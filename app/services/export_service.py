@@ -0,0 +1,253 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app.database.supabase_client import SupabaseManager
+from app.utils.pagination import apply_keyset, split_page
+import csv
+import io
+import json
+import logging
+
+try:
+    # Only needed for format=parquet / format=arrow (listed in requirements.txt)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+EXPORT_PAGE_SIZE = 1000
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow")
+}
+COLUMNAR_FORMATS = {"parquet", "arrow"}
+
+VENDOR_EXPORT_COLUMNS = [
+    "id", "user_id", "business_name", "vendor_type", "status",
+    "contact_person", "email", "phone_number", "created_at"
+]
+SERVICE_EXPORT_COLUMNS = [
+    "id", "vendor_id", "service_name", "service_category", "status",
+    "duration_value", "duration_unit", "daily_capacity", "currency",
+    "retail_price", "commission", "net_price", "created_at"
+]
+
+# Typed columns for the NDJSON / Parquet / Arrow exports: (column, type)
+# Types: string, string[], int, bool, decimal (10,2), timestamp (UTC)
+VENDOR_EXPORT_FIELDS: List[Tuple[str, str]] = [
+    ("id", "string"), ("user_id", "string"), ("business_name", "string"),
+    ("vendor_type", "string"), ("status", "string"), ("is_public", "bool"),
+    ("contact_person", "string"), ("email", "string"), ("phone_number", "string"),
+    ("operating_areas", "string[]"), ("gallery_urls", "string[]"),
+    ("created_at", "timestamp"), ("updated_at", "timestamp")
+]
+SERVICE_EXPORT_FIELDS: List[Tuple[str, str]] = [
+    ("id", "string"), ("vendor_id", "string"), ("service_name", "string"),
+    ("service_category", "string"), ("status", "string"),
+    ("duration_value", "int"), ("duration_unit", "string"), ("daily_capacity", "int"),
+    ("languages_offered", "string[]"), ("locations_covered", "string[]"),
+    ("currency", "string"), ("retail_price", "decimal"), ("commission", "decimal"),
+    ("net_price", "decimal"), ("created_at", "timestamp"), ("updated_at", "timestamp")
+]
+
+
+def _coerce(value: Any, kind: str) -> Any:
+    """PostgREST JSON value -> Python value of the export type (None stays None)"""
+    if value is None:
+        return None
+    try:
+        if kind == "string[]":
+            return [str(v) for v in value] if isinstance(value, list) else [str(value)]
+        if kind == "int":
+            return int(value)
+        if kind == "bool":
+            return bool(value)
+        if kind == "decimal":
+            return Decimal(str(value)).quantize(Decimal("0.01"))
+        if kind == "timestamp":
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+    return str(value)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Unserializable export value: {value!r}")
+
+
+def _arrow_schema(fields: List[Tuple[str, str]]):
+    types = {
+        "string": pa.string(),
+        "string[]": pa.list_(pa.string()),
+        "int": pa.int64(),
+        "bool": pa.bool_(),
+        "decimal": pa.decimal128(10, 2),
+        "timestamp": pa.timestamp("us", tz="UTC")
+    }
+    return pa.schema([(name, types[kind]) for name, kind in fields])
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back in chunks"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ExportService:
+
+    @staticmethod
+    async def iter_pages(
+        table: str,
+        columns: List[str],
+        page_size: int = EXPORT_PAGE_SIZE
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield a table page by page (keyset on created_at, id), only the given columns.
+
+        Only one page is held at a time, so memory stays flat for any table size.
+        """
+        client = SupabaseManager.get_async_admin_client()
+        # The keyset columns must be selected to build the next cursor
+        selected = list(dict.fromkeys(columns + ["id", "created_at"]))
+        cursor: Optional[str] = None
+        while True:
+            query = client.table(table).select(", ".join(selected))
+            res = await apply_keyset(query, cursor).limit(page_size + 1).execute()
+            rows, cursor = split_page(res.data or [], page_size)
+            if rows:
+                yield rows
+            if cursor is None:
+                return
+
+    @staticmethod
+    async def stream_csv(table: str, columns: List[str]) -> AsyncIterator[str]:
+        """CSV text, one chunk per page; the header goes out with the first page"""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+
+        async for rows in ExportService.iter_pages(table, columns):
+            writer.writerows(rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+        # Empty table: still send the header
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    async def primed(stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """Pull the first chunk now, so a failing first query surfaces before the
+        response starts (as a normal error) instead of as a truncated download."""
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            # Nothing to send (e.g. NDJSON of an empty table)
+            async def empty():
+                return
+                yield
+
+            return empty()
+
+        async def chained():
+            yield first
+            try:
+                async for chunk in stream:
+                    yield chunk
+            except Exception as e:
+                logger.error(f"Export stream aborted: {str(e)}")
+                raise
+
+        return chained()
+
+    @staticmethod
+    async def stream_ndjson(table: str, fields: List[Tuple[str, str]]) -> AsyncIterator[str]:
+        """One typed JSON object per line, one chunk per page"""
+        columns = [name for name, _ in fields]
+        async for rows in ExportService.iter_pages(table, columns):
+            lines = [
+                json.dumps({name: _coerce(row.get(name), kind) for name, kind in fields}, default=_json_default)
+                for row in rows
+            ]
+            yield "\n".join(lines) + "\n"
+
+    @staticmethod
+    async def stream_columnar(table: str, fields: List[Tuple[str, str]], fmt: str) -> AsyncIterator[bytes]:
+        """Parquet (one row group per page) or an Arrow IPC stream (one record batch per page).
+
+        Each page is converted and flushed before the next is fetched, so the
+        export is never fully materialized.
+        """
+        if pa is None:
+            raise RuntimeError(f"format={fmt} requires pyarrow, which is not installed")
+
+        schema = _arrow_schema(fields)
+        columns = [name for name, _ in fields]
+        sink = _ChunkSink()
+        if fmt == "parquet":
+            writer = pq.ParquetWriter(sink, schema, compression="snappy")
+        else:
+            writer = pa.ipc.new_stream(sink, schema)
+
+        try:
+            async for rows in ExportService.iter_pages(table, columns):
+                batch = pa.RecordBatch.from_pydict(
+                    {name: [_coerce(row.get(name), kind) for row in rows] for name, kind in fields},
+                    schema=schema
+                )
+                if fmt == "parquet":
+                    writer.write_batch(batch, row_group_size=len(rows))
+                else:
+                    writer.write_batch(batch)
+                chunk = sink.drain()
+                if chunk:
+                    yield chunk
+        finally:
+            # Footer (Parquet) / end-of-stream marker (Arrow)
+            writer.close()
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def is_available(fmt: str) -> bool:
+        return fmt in EXPORT_FORMATS and (fmt not in COLUMNAR_FORMATS or pa is not None)
+
+    @staticmethod
+    def stream(table: str, fmt: str, csv_columns: List[str], fields: List[Tuple[str, str]]) -> AsyncIterator[Any]:
+        """Export stream for a format; CSV keeps its historical flat column set"""
+        if fmt == "csv":
+            return ExportService.stream_csv(table, csv_columns)
+        if fmt == "ndjson":
+            return ExportService.stream_ndjson(table, fields)
+        return ExportService.stream_columnar(table, fields, fmt)
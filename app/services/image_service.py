@@ -0,0 +1,166 @@
+"""
+Image Derivatives
+After a logo, cover, gallery or service image upload, renders resized WebP
+variants in a process pool (Pillow never runs on the event loop), stores them
+beside the original and records their URLs in the vendor's or service's
+image_variants column, keyed by the original URL.
+
+Runs as a background stage after the upload response; failures are logged
+and leave the original untouched. Without Pillow the stage is skipped.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+import asyncio
+import logging
+import multiprocessing
+
+from app.config import settings
+from app.database.supabase_client import SupabaseManager
+from app.services.catalog_service import service_catalog
+from app.services.storage_service import StorageService, VENDOR_FILES_BUCKET
+from app.services.upload_index_service import UploadIndex
+from app.utils.images import pillow_available, render_variants
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FILE_TYPES = {"logo", "cover_image", "gallery", "service_image"}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def variant_sizes() -> Dict[str, Optional[int]]:
+    """Variant name -> longest edge (None = original size); all variants are WebP"""
+    return {"thumb": settings.IMAGE_THUMB_SIZE, "medium": settings.IMAGE_MEDIUM_SIZE, "full": None}
+
+
+def variant_path(path: str, name: str) -> str:
+    """vendors/v/gallery/abc.jpg -> vendors/v/gallery/abc.thumb.webp"""
+    folder, _, filename = path.rpartition("/")
+    stem = filename.rsplit(".", 1)[0] if "." in filename else filename
+    return f"{folder}/{stem}.{name}.webp" if folder else f"{stem}.{name}.webp"
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor, _slots
+    if _executor is None:
+        # spawn: forking a process with a running event loop and threads is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        # Bounds the images being downloaded, rendered or uploaded (and so their bytes in memory)
+        _slots = asyncio.Semaphore(settings.IMAGE_PROCESS_WORKERS * 2)
+    return _executor
+
+
+class ImageService:
+
+    @staticmethod
+    def is_enabled(file_type: str) -> bool:
+        return settings.IMAGE_VARIANTS_ENABLED and pillow_available() and file_type in IMAGE_FILE_TYPES
+
+    @staticmethod
+    async def render(data: bytes) -> Dict[str, bytes]:
+        """WebP variants of an image, rendered in the process pool (call while holding a slot)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _get_executor(), render_variants, data, variant_sizes(), settings.IMAGE_WEBP_QUALITY
+        )
+
+    @staticmethod
+    async def _record(table: str, row_id: str, url: str, variants: Optional[Dict[str, str]]) -> bool:
+        """Set (None = remove) the variants of one image; False when migration v13 is missing"""
+        result = await SupabaseManager.execute_rpc(
+            "set_image_variants", {"p_table": table, "p_id": row_id, "p_url": url, "p_variants": variants}
+        )
+        if result["success"]:
+            return True
+        if "PGRST202" not in (result["error"] or ""):
+            raise RuntimeError(result["error"])
+        # The image_variants column comes with the same migration, so there is nothing to fall back to
+        logger.warning("set_image_variants RPC unavailable - image variants not recorded. Migration missing?")
+        return False
+
+    @staticmethod
+    async def _render_and_store(original_url: str, data: Optional[bytes], size: Optional[int]) -> Optional[Dict[str, str]]:
+        """Variant name -> public URL, stored beside the original"""
+        if (size if size is not None else len(data or b"")) > settings.IMAGE_MAX_BYTES:
+            logger.info(f"Image too large for variants: {original_url}")
+            return None
+        path = StorageService.path_from_public_url(original_url)
+        if path is None:
+            return None
+
+        bucket = SupabaseManager.get_async_admin_client().storage.from_(VENDOR_FILES_BUCKET)
+        _get_executor()
+        async with _slots:
+            if data is None:
+                data = await bucket.download(path)
+            variants = await ImageService.render(data)
+            del data
+
+            urls = {}
+            for name, content in variants.items():
+                target = variant_path(path, name)
+                # upsert: a retried render writes the same objects again
+                await bucket.upload(target, content, {"content-type": "image/webp", "upsert": "true"})
+                urls[name] = await StorageService.public_url(target)
+        return urls or None
+
+    @staticmethod
+    async def process(
+        file_type: str,
+        vendor_id: str,
+        service_id: Optional[str],
+        original_url: str,
+        data: Optional[bytes] = None,
+        size: Optional[int] = None,
+        content_hash: Optional[str] = None
+    ) -> Optional[Dict[str, str]]:
+        """Render, store and record the variants of an uploaded image; returns their URLs.
+
+        `data` is the original's bytes when the caller still has them;
+        otherwise the stored object is downloaded. With `content_hash`,
+        variants already rendered for the same content (a deduplicated
+        upload) are reused. Never raises.
+        """
+        try:
+            if not ImageService.is_enabled(file_type):
+                return None
+            indexed = await UploadIndex.lookup(vendor_id, content_hash) if content_hash else None
+            if indexed and indexed.get("variants"):
+                urls = indexed["variants"]
+            else:
+                urls = await ImageService._render_and_store(original_url, data, size)
+                if not urls:
+                    return None
+                if content_hash:
+                    await UploadIndex.set_variants(vendor_id, content_hash, urls)
+
+            if file_type == "service_image" and service_id:
+                if not await ImageService._record("vendor_services", service_id, original_url, urls):
+                    return None
+                await service_catalog.refresh_service(service_id)
+            elif not await ImageService._record("vendors", vendor_id, original_url, urls):
+                return None
+            logger.info(f"Image variants recorded for {original_url}: {', '.join(urls)}")
+            return urls
+        except Exception as e:
+            logger.error(f"Image variants failed for {original_url}: {str(e)}")
+            return None
+
+    @staticmethod
+    async def forget(table: str, row_id: str, url: str) -> None:
+        """Drop the variants entry of a removed image (best effort)"""
+        try:
+            await ImageService._record(table, row_id, url, None)
+        except Exception as e:
+            logger.error(f"Removing image variants of {url} failed: {str(e)}")
+
+    @staticmethod
+    def shutdown() -> None:
+        global _executor
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
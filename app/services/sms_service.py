@@ -73,16 +73,17 @@ class SmsService:
         try:
             # Fetch the latest unverified OTP for this phone number
             # We sort by created_at desc to get the most recent one
-            # Note: SupabaseManager.execute_query might need custom order handling if it supports it
-            # But usually we filter by phone and code and verified=false
             result = await SupabaseManager.execute_query(
                 table="otp_verifications",
                 operation="select",
+                columns="id, expires_at",
                 filters={
                     "phone_number": phone_number,
                     "otp_code": otp_code,
                     "verified": False
-                }
+                },
+                order=[("created_at", True)],
+                limit=1
             )
 
             if not result.get("success") or not result.get("data") or len(result["data"]) == 0:
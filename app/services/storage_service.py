@@ -0,0 +1,330 @@
+"""
+Vendor File Storage
+Uploads to the Supabase Storage "vendor-files" bucket in bounded chunks.
+
+Files of up to one chunk go through the regular upload API; larger ones use
+the TUS resumable endpoint, one UPLOAD_CHUNK_SIZE chunk per request, so a
+dropped connection only costs the chunk in flight. Chunk buffers come from a
+per-worker pool of UPLOAD_MAX_BUFFERS, which caps upload memory at
+UPLOAD_MAX_BUFFERS x UPLOAD_CHUNK_SIZE however many uploads run at once.
+
+Clients can also upload resumably themselves: an upload session is a signed
+token naming the TUS upload, and the offset always comes from Storage, so any
+worker can continue an interrupted upload. Or they upload straight to Storage
+through a signed upload URL, bypassing the API workers entirely.
+"""
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urljoin
+import asyncio
+import base64
+import hashlib
+import logging
+import tempfile
+
+import httpx
+from fastapi import UploadFile
+from jose import JWTError, jwt
+
+from app.config import settings
+from app.database.supabase_client import SupabaseManager
+
+logger = logging.getLogger(__name__)
+
+VENDOR_FILES_BUCKET = "vendor-files"
+TUS_VERSION = "1.0.0"
+HASH_READ_SIZE = 1024 * 1024
+UPLOAD_SESSION_TOKEN_TYPE = "upload_session"
+DIRECT_UPLOAD_TOKEN_TYPE = "direct_upload"
+
+# file_type values of vendor uploads (also the folder under vendors/{vendor_id}/)
+VENDOR_FILE_TYPES = {
+    "logo", "cover_image", "promo_video", "gallery", "service_image",
+    "reg_certificate", "nic_passport", "tourism_license"
+}
+
+# Content types a direct upload of each file_type may have
+_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
+_DOCUMENT_TYPES = _IMAGE_TYPES | {"application/pdf"}
+DIRECT_UPLOAD_CONTENT_TYPES = {
+    "logo": _IMAGE_TYPES,
+    "cover_image": _IMAGE_TYPES,
+    "gallery": _IMAGE_TYPES,
+    "service_image": _IMAGE_TYPES,
+    "promo_video": {"video/mp4", "video/quicktime", "video/webm"},
+    "reg_certificate": _DOCUMENT_TYPES,
+    "nic_passport": _DOCUMENT_TYPES,
+    "tourism_license": _DOCUMENT_TYPES
+}
+
+# Per-worker pool of chunk buffers (each holds at most UPLOAD_CHUNK_SIZE bytes)
+_chunk_buffers = asyncio.Semaphore(settings.UPLOAD_MAX_BUFFERS)
+
+
+class UploadExpiredError(Exception):
+    """The upload session (or its TUS upload) no longer exists"""
+
+
+class UploadOffsetError(Exception):
+    """A chunk was sent for an offset other than where the upload stands"""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Upload is at offset {offset}")
+        self.offset = offset
+
+
+class StorageService:
+
+    @staticmethod
+    def _headers(extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        return {
+            "apikey": settings.SUPABASE_KEY,
+            "Authorization": f"Bearer {settings.SUPABASE_KEY}",
+            "Tus-Resumable": TUS_VERSION,
+            **(extra or {})
+        }
+
+    @staticmethod
+    async def public_url(path: str) -> str:
+        bucket = SupabaseManager.get_async_admin_client().storage.from_(VENDOR_FILES_BUCKET)
+        return await bucket.get_public_url(path)
+
+    @staticmethod
+    def path_from_public_url(url: str) -> Optional[str]:
+        """Object path of a vendor-files public URL (None for any other URL)"""
+        marker = f"/storage/v1/object/public/{VENDOR_FILES_BUCKET}/"
+        if marker not in (url or ""):
+            return None
+        return url.split(marker, 1)[1].split("?", 1)[0] or None
+
+    # ==================== TUS PROTOCOL ====================
+
+    @staticmethod
+    async def create_resumable(path: str, size: int, content_type: Optional[str]) -> str:
+        """Start a TUS upload of `size` bytes; returns its upload URL"""
+        metadata = {
+            "bucketName": VENDOR_FILES_BUCKET,
+            "objectName": path,
+            "contentType": content_type or "application/octet-stream",
+            "cacheControl": "3600"
+        }
+        endpoint = f"{settings.SUPABASE_URL}/storage/v1/upload/resumable"
+        res = await SupabaseManager.get_http_client().post(endpoint, headers=StorageService._headers({
+            "Upload-Length": str(size),
+            "Upload-Metadata": ",".join(
+                f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in metadata.items()
+            )
+        }))
+        res.raise_for_status()
+        return urljoin(endpoint, res.headers["Location"])
+
+    @staticmethod
+    async def get_offset(upload_url: str) -> int:
+        res = await SupabaseManager.get_http_client().head(upload_url, headers=StorageService._headers())
+        if res.status_code in (404, 410):
+            raise UploadExpiredError("Upload not found or expired")
+        res.raise_for_status()
+        return int(res.headers["Upload-Offset"])
+
+    @staticmethod
+    async def append(upload_url: str, offset: int, data: bytes) -> int:
+        """PATCH one chunk at `offset`; returns the new offset"""
+        res = await SupabaseManager.get_http_client().patch(upload_url, content=data, headers=StorageService._headers({
+            "Upload-Offset": str(offset),
+            "Content-Type": "application/offset+octet-stream"
+        }))
+        if res.status_code in (404, 410):
+            raise UploadExpiredError("Upload not found or expired")
+        if res.status_code == 409:
+            raise UploadOffsetError(await StorageService.get_offset(upload_url))
+        res.raise_for_status()
+        return int(res.headers["Upload-Offset"])
+
+    @staticmethod
+    async def append_with_retry(upload_url: str, offset: int, data: bytes) -> int:
+        """append(), resuming from the offset Storage reports after a network or 5xx failure"""
+        end = offset + len(data)
+        for attempt in range(settings.UPLOAD_CHUNK_RETRIES + 1):
+            try:
+                return await StorageService.append(upload_url, offset, data)
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+                    raise
+                if attempt == settings.UPLOAD_CHUNK_RETRIES:
+                    raise
+                logger.warning(f"Upload chunk at {offset} failed ({str(e)}), resuming (attempt {attempt + 1})")
+                await asyncio.sleep(0.5 * 2 ** attempt)
+                stored = await StorageService.get_offset(upload_url)
+                if stored >= end:
+                    return stored
+                data = data[stored - offset:]
+                offset = stored
+        return offset
+
+    # ==================== UPLOADS ====================
+
+    @staticmethod
+    async def hash_file(file: UploadFile) -> Tuple[str, int]:
+        """SHA-256 hex digest and size of an upload, read in 1 MB pieces from its spool file"""
+        digest = hashlib.sha256()
+        size = 0
+        await file.seek(0)
+        while True:
+            piece = await file.read(HASH_READ_SIZE)
+            if not piece:
+                break
+            digest.update(piece)
+            size += len(piece)
+        await file.seek(0)
+        return digest.hexdigest(), size
+
+    @staticmethod
+    async def hash_object(path: str) -> Tuple[str, int]:
+        """SHA-256 hex digest and size of a stored object, streamed from Storage"""
+        url = f"{settings.SUPABASE_URL}/storage/v1/object/{VENDOR_FILES_BUCKET}/{path}"
+        digest = hashlib.sha256()
+        size = 0
+        async with SupabaseManager.get_http_client().stream("GET", url, headers=StorageService._headers()) as res:
+            res.raise_for_status()
+            async for piece in res.aiter_bytes(HASH_READ_SIZE):
+                digest.update(piece)
+                size += len(piece)
+        return digest.hexdigest(), size
+
+    @staticmethod
+    async def upload(file: UploadFile, path: str) -> None:
+        """Store an uploaded file, reading it one chunk at a time"""
+        size = file.size
+        if size is None:
+            file.file.seek(0, 2)
+            size = file.file.tell()
+        await file.seek(0)
+        content_type = file.content_type or "application/octet-stream"
+        chunk_size = settings.UPLOAD_CHUNK_SIZE
+
+        if size <= chunk_size:
+            async with _chunk_buffers:
+                content = await file.read()
+                bucket = SupabaseManager.get_async_admin_client().storage.from_(VENDOR_FILES_BUCKET)
+                await bucket.upload(path, content, {"content-type": content_type})
+            return
+
+        upload_url = await StorageService.create_resumable(path, size, content_type)
+        offset = 0
+        while offset < size:
+            async with _chunk_buffers:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    raise IOError(f"Upload ended at {offset} of {size} bytes")
+                offset = await StorageService.append_with_retry(upload_url, offset, chunk)
+        logger.info(f"Resumable upload finished: {path} ({size} bytes)")
+
+    @staticmethod
+    async def _send_spooled(upload_url: str, offset: int, spool) -> int:
+        """PATCH the spooled bytes at `offset` and empty the spool"""
+        async with _chunk_buffers:
+            spool.seek(0)
+            data = await asyncio.to_thread(spool.read)
+            spool.seek(0)
+            spool.truncate()
+            return await StorageService.append_with_retry(upload_url, offset, data)
+
+    @staticmethod
+    async def stream_to(upload_url: str, offset: int, size: int, body: AsyncIterator[bytes], digest=None) -> int:
+        """Forward a request body to a TUS upload, re-cut into UPLOAD_CHUNK_SIZE chunks.
+
+        Returns the new offset. The body is spooled to a temporary file as it
+        arrives and a chunk buffer is only taken to send a full chunk, so slow
+        clients do not hold buffers while their bytes trickle in. A trailing
+        piece shorter than a chunk that does not end the file is not sent; the
+        client resends it from the returned offset. `digest` (a hashlib
+        object) is fed every body byte received.
+        """
+        stored = await StorageService.get_offset(upload_url)
+        if offset != stored:
+            raise UploadOffsetError(stored)
+
+        chunk_size = settings.UPLOAD_CHUNK_SIZE
+        with tempfile.TemporaryFile() as spool:
+            spooled = 0
+            async for piece in body:
+                if offset + spooled + len(piece) > size:
+                    raise ValueError("Body exceeds the declared upload size")
+                if digest is not None:
+                    digest.update(piece)
+                while piece:
+                    part, piece = piece[:chunk_size - spooled], piece[chunk_size - spooled:]
+                    await asyncio.to_thread(spool.write, part)
+                    spooled += len(part)
+                    if spooled == chunk_size:
+                        offset = await StorageService._send_spooled(upload_url, offset, spool)
+                        spooled = 0
+            if spooled and offset + spooled == size:
+                offset = await StorageService._send_spooled(upload_url, offset, spool)
+        return offset
+
+    # ==================== DIRECT UPLOADS ====================
+
+    @staticmethod
+    async def create_signed_upload(path: str) -> Dict[str, str]:
+        """Signed URL the client PUTs the file to directly (Storage keeps it valid for 2 hours)"""
+        bucket = SupabaseManager.get_async_admin_client().storage.from_(VENDOR_FILES_BUCKET)
+        signed = await bucket.create_signed_upload_url(path)
+        return {"signed_url": signed["signed_url"], "token": signed["token"], "path": path}
+
+    @staticmethod
+    def direct_upload_limit(file_type: str) -> int:
+        return settings.DIRECT_UPLOAD_MAX_VIDEO_BYTES if file_type == "promo_video" else settings.DIRECT_UPLOAD_MAX_BYTES
+
+    @staticmethod
+    async def object_info(path: str) -> Optional[Dict[str, Any]]:
+        """Size and content type of a stored object ({size, content_type}, either may be
+        None), or None if nothing was uploaded there"""
+        bucket = SupabaseManager.get_async_admin_client().storage.from_(VENDOR_FILES_BUCKET)
+        if not await bucket.exists(path):
+            return None
+        try:
+            info = await bucket.info(path)
+        except Exception as e:
+            # Older Storage versions lack /object/info; the folder listing has the metadata too
+            logger.warning(f"Object info unavailable for {path}: {str(e)}")
+            folder, _, name = path.rpartition("/")
+            listed = await bucket.list(folder, {"search": name})
+            info = next((item for item in listed if item.get("name") == name), {})
+        metadata = info.get("metadata") or {}
+        return {
+            "size": info.get("size") or metadata.get("size"),
+            "content_type": info.get("content_type") or info.get("contentType") or metadata.get("mimetype")
+        }
+
+    @staticmethod
+    async def remove(path: str) -> None:
+        bucket = SupabaseManager.get_async_admin_client().storage.from_(VENDOR_FILES_BUCKET)
+        await bucket.remove([path])
+
+    # ==================== UPLOAD TICKETS ====================
+
+    @staticmethod
+    def create_session(
+        claims: Dict[str, Any],
+        token_type: str = UPLOAD_SESSION_TOKEN_TYPE,
+        lifetime: Optional[timedelta] = None
+    ) -> Dict[str, Any]:
+        """Signed upload id carrying where the file goes (and, for sessions, the TUS upload URL)"""
+        expires_at = datetime.utcnow() + (lifetime or timedelta(hours=settings.UPLOAD_SESSION_HOURS))
+        token = jwt.encode(
+            {**claims, "type": token_type, "exp": expires_at},
+            settings.SECRET_KEY,
+            algorithm=settings.ALGORITHM
+        )
+        return {"upload_id": token, "expires_at": expires_at.isoformat() + "Z"}
+
+    @staticmethod
+    def read_session(upload_id: str, token_type: str = UPLOAD_SESSION_TOKEN_TYPE) -> Dict[str, Any]:
+        try:
+            claims = jwt.decode(upload_id, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError:
+            raise UploadExpiredError("Invalid or expired upload id")
+        if claims.get("type") != token_type:
+            raise UploadExpiredError("Invalid or expired upload id")
+        return claims
@@ -0,0 +1,78 @@
+"""
+Upload Deduplication
+Content hash -> stored file index (MongoDB upload_index collection), scoped
+per vendor. An upload whose SHA-256 is already indexed is not stored again;
+the existing public URL is returned instead.
+
+Documents: {_id: "<vendor_id>:<sha256>", vendor_id, sha256, path, url, size,
+content_type, variants, created_at}. Stored files are never deleted, so an
+entry stays valid. Without MongoDB every upload is simply stored.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+import logging
+
+from app.database.mongo_config import get_upload_index_collection
+
+logger = logging.getLogger(__name__)
+
+
+def _key(vendor_id: str, sha256: str) -> str:
+    return f"{vendor_id}:{sha256}"
+
+
+class UploadIndex:
+
+    @staticmethod
+    async def lookup(vendor_id: str, sha256: str) -> Optional[Dict[str, Any]]:
+        """The stored file with this content, or None"""
+        try:
+            collection = await get_upload_index_collection()
+            if collection is None:
+                return None
+            return await collection.find_one({"_id": _key(vendor_id, sha256)})
+        except Exception as e:
+            logger.error(f"Upload index lookup failed: {str(e)}")
+            return None
+
+    @staticmethod
+    async def record(
+        vendor_id: str,
+        sha256: str,
+        path: str,
+        url: str,
+        size: int,
+        content_type: Optional[str]
+    ) -> None:
+        """Index a newly stored file (the first copy wins if two uploads race)"""
+        try:
+            collection = await get_upload_index_collection()
+            if collection is None:
+                return
+            await collection.update_one(
+                {"_id": _key(vendor_id, sha256)},
+                {"$setOnInsert": {
+                    "vendor_id": vendor_id,
+                    "sha256": sha256,
+                    "path": path,
+                    "url": url,
+                    "size": size,
+                    "content_type": content_type,
+                    "variants": None,
+                    "created_at": datetime.utcnow()
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Upload index write failed: {str(e)}")
+
+    @staticmethod
+    async def set_variants(vendor_id: str, sha256: str, variants: Dict[str, str]) -> None:
+        """Remember the image variants of a stored file, so duplicates reuse them"""
+        try:
+            collection = await get_upload_index_collection()
+            if collection is None:
+                return
+            await collection.update_one({"_id": _key(vendor_id, sha256)}, {"$set": {"variants": variants}})
+        except Exception as e:
+            logger.error(f"Upload index write failed: {str(e)}")
@@ -0,0 +1,353 @@
+"""
+Bulk Vendor Onboarding
+Imports a CSV or NDJSON upload of vendors (each with its services). Rows are
+read and processed in batches: auth accounts are created with bounded
+concurrency and the database rows of a whole batch are written in one
+register_vendors_batch RPC call (one transaction per vendor).
+
+Rows are keyed by email, so an import is resumed by simply uploading the same
+file again: vendors that already exist are reported as skipped and only the
+failed or missing rows are created.
+"""
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+import asyncio
+import csv
+import io
+import json
+import logging
+
+from app.config import settings
+from app.database.supabase_client import SupabaseManager
+from app.services.vendor_service import VendorService
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = {"csv", "ndjson"}
+# CSV cells holding lists, separated by ";"
+CSV_LIST_FIELDS = {"operatingAreas", "galleryUrls"}
+# CSV cell holding the vendor's services as a JSON array of ServiceSchema objects
+CSV_SERVICES_FIELD = "services"
+AUTH_LIST_PAGE_SIZE = 1000
+
+# Per-row outcomes
+CREATED, SKIPPED, INVALID, FAILED, VALID = "created", "skipped", "invalid", "failed", "valid"
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str], requested: Optional[str] = None) -> Optional[str]:
+    """csv / ndjson from an explicit format, the file extension or the content type"""
+    if requested:
+        requested = requested.lower()
+        return requested if requested in IMPORT_FORMATS else None
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in (content_type or ""):
+        return "ndjson"
+    if name.endswith(".csv") or "csv" in (content_type or ""):
+        return "csv"
+    return None
+
+
+def describe_error(error: Exception) -> str:
+    """One line per problem; pydantic ValidationErrors are flattened to "field: message" """
+    if hasattr(error, "errors"):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors()
+        )
+    return str(error)
+
+
+def _like_literal(value: str) -> str:
+    """LIKE pattern matching `value` literally"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _array_item(value: str) -> str:
+    """Quoted element of a PostgREST array value ({a,b})"""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _from_csv(record: Dict[Optional[str], Any]) -> Dict[str, Any]:
+    """CSV record -> VendorRegisterRequest payload (empty cells fall back to the model defaults)"""
+    if None in record:
+        raise ValueError("Row has more cells than the header")
+    row: Dict[str, Any] = {}
+    for key, value in record.items():
+        value = (value or "").strip()
+        if not value:
+            continue
+        if key in CSV_LIST_FIELDS:
+            row[key] = [v.strip() for v in value.split(";") if v.strip()]
+        elif key == CSV_SERVICES_FIELD:
+            try:
+                row[key] = json.loads(value)
+            except ValueError as e:
+                raise ValueError(f"services is not valid JSON: {e}")
+        else:
+            row[key] = value
+    return row
+
+
+def iter_rows(fileobj, fmt: str) -> Iterator[Tuple[int, Union[Dict[str, Any], Exception]]]:
+    """(row number, payload or parse error) per record, read incrementally from the upload.
+
+    Row numbers are 1-based record positions (the CSV header and blank NDJSON
+    lines are not counted). Raises UnicodeDecodeError / csv.Error for files
+    that cannot be read at all.
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == "csv":
+            for row_no, record in enumerate(csv.DictReader(text), start=1):
+                try:
+                    yield row_no, _from_csv(record)
+                except ValueError as e:
+                    yield row_no, e
+        else:
+            row_no = 0
+            for line in text:
+                if not line.strip():
+                    continue
+                row_no += 1
+                try:
+                    payload = json.loads(line)
+                except ValueError as e:
+                    yield row_no, ValueError(f"Invalid JSON: {e}")
+                    continue
+                yield row_no, payload if isinstance(payload, dict) else ValueError("Expected a JSON object")
+    finally:
+        # Leave the upload open for its owner
+        text.detach()
+
+
+class VendorImportService:
+
+    @staticmethod
+    async def _existing(emails: List[str]) -> Tuple[Dict[str, str], Dict[str, Dict[str, Any]]]:
+        """Vendors (email -> vendor id) and public users (email -> row) already registered.
+
+        Emails are matched case-insensitively: ILIKE narrows the query, the
+        exact comparison happens here.
+        """
+        client = SupabaseManager.get_async_admin_client()
+        wanted = {email.lower() for email in emails}
+        patterns = ",".join(_array_item(_like_literal(email)) for email in emails)
+        vendors, users = await asyncio.gather(
+            client.table("vendors").select("id, email").ilike_any_of("email", patterns).execute(),
+            client.table("users").select("id, email, role").ilike_any_of("email", patterns).execute()
+        )
+        return (
+            {v["email"].lower(): v["id"] for v in vendors.data or [] if (v.get("email") or "").lower() in wanted},
+            {u["email"].lower(): u for u in users.data or [] if (u.get("email") or "").lower() in wanted}
+        )
+
+    @staticmethod
+    async def _find_auth_user(email: str) -> Optional[Dict[str, Any]]:
+        """Auth account ({id, role}) registered under an email, if any"""
+        result = await SupabaseManager.execute_rpc("find_auth_user", {"p_email": email})
+        if result["success"]:
+            return result["data"][0] if result["data"] else None
+        if "PGRST202" not in (result["error"] or ""):
+            raise RuntimeError(result["error"])
+
+        # Function not installed: page through the accounts
+        logger.warning("find_auth_user RPC unavailable - falling back to listing auth users. Migration missing?")
+        admin = SupabaseManager.get_async_admin_client().auth.admin
+        page = 1
+        while True:
+            users = await admin.list_users(page=page, per_page=AUTH_LIST_PAGE_SIZE)
+            for user in users:
+                if (user.email or "").lower() == email.lower():
+                    return {"id": user.id, "role": (user.user_metadata or {}).get("role")}
+            if len(users) < AUTH_LIST_PAGE_SIZE:
+                return None
+            page += 1
+
+    @staticmethod
+    async def _create_auth_user(entry: Dict[str, Any], semaphore: asyncio.Semaphore) -> Tuple[str, bool]:
+        """Auth account for an entry; returns (user id, created).
+
+        A vendor account left without records by an interrupted import is
+        taken over (password and metadata reset from the row) instead of
+        failing as already registered on every re-run. An account that has a
+        vendors row is never touched.
+        """
+        async with semaphore:
+            client = SupabaseManager.get_async_admin_client()
+            admin = client.auth.admin
+            attributes = {
+                "email": entry["email"],
+                "password": entry["password"],
+                "email_confirm": True,
+                "user_metadata": {"role": "vendor", "name": entry["name"]}
+            }
+            try:
+                res = await admin.create_user(attributes)
+                return res.user.id, True
+            except Exception as e:
+                if "already" not in str(e).lower():
+                    raise
+                existing = await VendorImportService._find_auth_user(entry["email"])
+                if existing is None or existing.get("role") != "vendor":
+                    raise
+            # Only an orphaned account may be taken over
+            vendor = await client.table("vendors").select("id").eq("user_id", existing["id"]).limit(1).execute()
+            if vendor.data:
+                raise RuntimeError(f"Account is already registered to vendor {vendor.data[0]['id']}")
+            await admin.update_user_by_id(existing["id"], {
+                "password": entry["password"],
+                "user_metadata": attributes["user_metadata"]
+            })
+            logger.info(f"Import reuses auth account {existing['id']} of {entry['email']}")
+            return existing["id"], False
+
+    @staticmethod
+    async def _delete_auth_user(user_id: str) -> None:
+        """Rollback of a failed row; cascades to users -> vendors -> vendor_services"""
+        try:
+            await SupabaseManager.get_async_admin_client().auth.admin.delete_user(user_id)
+        except Exception as e:
+            logger.error(f"Import rollback failed for auth user {user_id}: {str(e)}")
+
+    @staticmethod
+    async def _write_records(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Database rows of a batch; one {vendor_id, error} per entry, in order"""
+        payload = [
+            {
+                "user": {"id": e["user_id"], "email": e["email"], "name": e["name"], "role": "vendor"},
+                "vendor": e["vendor"],
+                "services": e["services"]
+            }
+            for e in entries
+        ]
+        result = await SupabaseManager.execute_rpc("register_vendors_batch", {"p_entries": payload})
+        if result["success"]:
+            return result["data"]
+        if "PGRST202" not in (result["error"] or ""):
+            raise RuntimeError(result["error"])
+
+        # Function not installed: register the vendors one by one
+        logger.warning("register_vendors_batch RPC unavailable - falling back to per-vendor registration. Migration missing?")
+        semaphore = asyncio.Semaphore(settings.VENDOR_IMPORT_CONCURRENCY)
+
+        async def register(item):
+            async with semaphore:
+                try:
+                    vendor_id = await VendorService.create_vendor_records(item["user"], item["vendor"], item["services"])
+                    return {"vendor_id": vendor_id, "error": None}
+                except Exception as e:
+                    return {"vendor_id": None, "error": str(e)}
+
+        return await asyncio.gather(*[register(item) for item in payload])
+
+    @staticmethod
+    async def import_batch(entries: List[Dict[str, Any]], dry_run: bool = False) -> List[Dict[str, Any]]:
+        """Register a batch of validated entries; returns one result per entry.
+
+        Entries carry row, email, password, name, vendor (vendors row) and
+        services (vendor_services rows).
+        """
+        results: List[Dict[str, Any]] = []
+        existing_vendors, existing_users = await VendorImportService._existing(
+            list(dict.fromkeys(e["email"] for e in entries))
+        )
+
+        pending = []
+        seen: Dict[str, int] = {}
+        for entry in entries:
+            result = {"row": entry["row"], "email": entry["email"]}
+            key = entry["email"].lower()
+            user = existing_users.get(key)
+            if key in seen:
+                results.append({**result, "status": SKIPPED, "error": f"Duplicate of row {seen[key]}"})
+            elif key in existing_vendors:
+                results.append({**result, "status": SKIPPED, "vendor_id": existing_vendors[key], "error": "Vendor already exists"})
+            elif user and user.get("role") != "vendor":
+                results.append({**result, "status": FAILED, "error": f"Email is already registered with role {user.get('role')}"})
+            elif dry_run:
+                results.append({**result, "status": VALID})
+            else:
+                # An account left behind by an earlier failed attempt is reused
+                pending.append({**entry, "user_id": user["id"] if user else None, "result": result})
+            seen.setdefault(key, entry["row"])
+        if not pending:
+            return results
+
+        # 1. Auth accounts, a few at a time
+        semaphore = asyncio.Semaphore(settings.VENDOR_IMPORT_CONCURRENCY)
+        new = [e for e in pending if e["user_id"] is None]
+        created = await asyncio.gather(
+            *[VendorImportService._create_auth_user(e, semaphore) for e in new], return_exceptions=True
+        )
+        for entry, account in zip(new, created):
+            if isinstance(account, Exception):
+                results.append({**entry["result"], "status": FAILED, "error": f"Auth creation failed: {str(account)}"})
+            else:
+                entry["user_id"], entry["new_user"] = account
+        ready = [e for e in pending if e["user_id"] is not None]
+        if not ready:
+            return results
+
+        # 2. Database rows, one call for the batch
+        try:
+            outcomes = await VendorImportService._write_records(ready)
+        except Exception as e:
+            logger.error(f"Vendor import batch failed: {str(e)}")
+            outcomes = [{"vendor_id": None, "error": str(e)}] * len(ready)
+
+        rollbacks = []
+        for entry, outcome in zip(ready, outcomes):
+            if outcome.get("error"):
+                results.append({**entry["result"], "status": FAILED, "error": outcome["error"]})
+                if entry.get("new_user"):
+                    rollbacks.append(VendorImportService._delete_auth_user(entry["user_id"]))
+            else:
+                results.append({**entry["result"], "status": CREATED, "vendor_id": outcome["vendor_id"]})
+        if rollbacks:
+            await asyncio.gather(*rollbacks)
+        return results
+
+    @staticmethod
+    async def run(
+        fileobj,
+        fmt: str,
+        build_entry: Callable[[Dict[str, Any]], Dict[str, Any]],
+        start_row: int = 1,
+        dry_run: bool = False
+    ) -> Dict[str, Any]:
+        """Import an upload; `build_entry` validates a row payload (raising ValueError).
+
+        Rows before `start_row` are not read into batches, which lets an
+        interrupted import continue where its last report stopped.
+        """
+        results: List[Dict[str, Any]] = []
+        batch: List[Dict[str, Any]] = []
+        last_row = start_row - 1
+
+        for row_no, payload in iter_rows(fileobj, fmt):
+            if row_no < start_row:
+                continue
+            last_row = row_no
+            if isinstance(payload, Exception):
+                results.append({"row": row_no, "email": None, "status": INVALID, "error": describe_error(payload)})
+                continue
+            try:
+                entry = build_entry(payload)
+            except ValueError as e:
+                results.append({"row": row_no, "email": payload.get("email"), "status": INVALID, "error": describe_error(e)})
+                continue
+            batch.append({**entry, "row": row_no})
+            if len(batch) >= settings.VENDOR_IMPORT_BATCH_SIZE:
+                results.extend(await VendorImportService.import_batch(batch, dry_run))
+                batch = []
+        if batch:
+            results.extend(await VendorImportService.import_batch(batch, dry_run))
+
+        results.sort(key=lambda r: r["row"])
+        logger.info(f"Vendor import finished: rows {start_row}-{last_row}, {dict(Counter(r['status'] for r in results))}")
+        return {
+            "dry_run": dry_run,
+            "start_row": start_row,
+            "last_row": last_row,
+            "summary": dict(Counter(r["status"] for r in results)),
+            "results": results
+        }
@@ -2,10 +2,27 @@ from typing import List, Optional, Dict, Any
 from fastapi import HTTPException, status
 from app.database.supabase_client import SupabaseManager
 from app.schemas.vendor import VendorCreate, VendorUpdate, VendorStatus
+from app.utils.pagination import apply_keyset, split_page
+import asyncio
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
+# Columns returned by list views (view="summary")
+VENDOR_SUMMARY_COLUMNS = (
+    "id, user_id, business_name, vendor_type, status, contact_person, email, "
+    "phone_number, operating_areas, is_public, logo_url, created_at"
+)
+
+# Media URL array per table (see migration_v14_media_url_arrays.sql)
+MEDIA_URL_COLUMNS = {"vendors": "gallery_urls", "vendor_services": "image_urls"}
+
+# Aliases of the embedded vendor_services resources in the detail select
+DETAIL_SERVICES_ALIAS = "services"
+DETAIL_SERVICES_COUNT_ALIAS = "services_total"
+_COLUMN_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+
 class VendorService:
     
     @staticmethod
@@ -113,21 +130,25 @@ class VendorService:
         
         vendors = result["data"] or []
         
-        # Get user details for each vendor
-        for vendor in vendors:
+        # Get user details for all vendors in one query
+        user_ids = [vendor["user_id"] for vendor in vendors if vendor.get("user_id")]
+        if user_ids:
             user_result = await SupabaseManager.execute_query(
                 table="users",
                 operation="select",
-                filters={"id": vendor["user_id"]},
-                single=True
+                columns="id, email, name, role",
+                conditions=[("id", "in", user_ids)]
             )
+            users = {u["id"]: u for u in (user_result["data"] or [])} if user_result["success"] else {}
             
-            if user_result["success"] and user_result["data"]:
-                vendor["user"] = {
-                    "email": user_result["data"]["email"],
-                    "name": user_result["data"]["name"],
-                    "role": user_result["data"]["role"]
-                }
+            for vendor in vendors:
+                user = users.get(vendor.get("user_id"))
+                if user:
+                    vendor["user"] = {
+                        "email": user["email"],
+                        "name": user["name"],
+                        "role": user["role"]
+                    }
         
         return vendors
     
@@ -147,4 +168,227 @@ class VendorService:
                 detail="Failed to update vendor status"
             )
         
-        return result["data"][0] if result["data"] else {}
\ No newline at end of file
+        return result["data"][0] if result["data"] else {}
+
+    @staticmethod
+    def _apply_vendor_filters(query, filters: Dict[str, Any]):
+        """Server-side filters shared by the admin vendor list and its count"""
+        if filters.get("status"):
+            query = query.eq("status", filters["status"])
+        if filters.get("vendor_type"):
+            query = query.eq("vendor_type", filters["vendor_type"])
+        if filters.get("operating_areas"):
+            query = query.overlaps("operating_areas", filters["operating_areas"])
+        if filters.get("is_public") is not None:
+            query = query.eq("is_public", filters["is_public"])
+        if filters.get("created_from"):
+            query = query.gte("created_at", filters["created_from"])
+        if filters.get("created_to"):
+            query = query.lt("created_at", filters["created_to"])
+        return query
+
+    @staticmethod
+    async def list_vendors_page(
+        filters: Dict[str, Any],
+        limit: int,
+        cursor: Optional[str] = None,
+        columns: str = "*",
+        include_total: bool = False
+    ) -> Dict[str, Any]:
+        """One keyset page of vendors, newest first (created_at, id).
+
+        Raises ValueError for a malformed cursor.
+        """
+        client = SupabaseManager.get_async_admin_client()
+
+        query = VendorService._apply_vendor_filters(client.table("vendors").select(columns), filters)
+        query = apply_keyset(query, cursor).limit(limit + 1)
+
+        if include_total:
+            count_query = VendorService._apply_vendor_filters(
+                client.table("vendors").select("id", count="exact", head=True), filters
+            )
+            page_res, count_res = await asyncio.gather(query.execute(), count_query.execute())
+            total = count_res.count
+        else:
+            page_res = await query.execute()
+            total = None
+
+        rows, next_cursor = split_page(page_res.data or [], limit)
+        return {"vendors": rows, "next_cursor": next_cursor, "total": total}
+
+    @staticmethod
+    async def get_featured_vendors() -> List[Dict[str, Any]]:
+        """Public, approved/active vendors for the landing page.
+
+        Ordered deterministically so every worker renders the same snapshot
+        (and therefore the same ETag) for the same data.
+        """
+        client = SupabaseManager.get_async_admin_client()
+        res = await client.table("vendors")\
+            .select("id, business_name, logo_url, vendor_type, cover_image_url, operating_areas")\
+            .eq("is_public", True)\
+            .in_("status", ["approved", "active"])\
+            .order("created_at", desc=True)\
+            .order("id", desc=True)\
+            .execute()
+        return res.data or []
+
+    @staticmethod
+    def parse_fields(fields: Optional[str]) -> str:
+        """Validate a comma-separated column projection ("*" when empty).
+
+        Only plain column names are accepted, so callers cannot embed other tables.
+        Raises ValueError for anything else.
+        """
+        if not fields:
+            return "*"
+        columns = [c.strip() for c in fields.split(",") if c.strip()]
+        for column in columns:
+            if not _COLUMN_RE.match(column):
+                raise ValueError(f"Invalid field: {column}")
+        return ", ".join(dict.fromkeys(["id"] + columns))
+
+    @staticmethod
+    async def get_vendor_detail(
+        vendor_id: str,
+        fields: str = "*",
+        service_fields: str = "*",
+        services_limit: Optional[int] = None,
+        services_offset: int = 0
+    ) -> Optional[Dict[str, Any]]:
+        """Vendor row plus its services (optionally one page of them).
+
+        One embedded select when PostgREST can resolve the relationship,
+        otherwise the two queries run concurrently. Returns None if the vendor
+        does not exist.
+        """
+        client = SupabaseManager.get_async_admin_client()
+        paged = services_limit is not None
+        try:
+            select = f"{fields}, {DETAIL_SERVICES_ALIAS}:vendor_services({service_fields})"
+            if paged:
+                select += f", {DETAIL_SERVICES_COUNT_ALIAS}:vendor_services(count)"
+            query = client.table("vendors").select(select).eq("id", vendor_id)\
+                .order("created_at", desc=True, foreign_table=DETAIL_SERVICES_ALIAS)
+            if paged:
+                query = query.range(services_offset, services_offset + services_limit - 1, foreign_table=DETAIL_SERVICES_ALIAS)
+            res = await query.execute()
+            if not res.data:
+                return None
+            vendor = res.data[0]
+            services = vendor.pop(DETAIL_SERVICES_ALIAS, None) or []
+            counts = vendor.pop(DETAIL_SERVICES_COUNT_ALIAS, None)
+            total = counts[0]["count"] if counts else len(services)
+        except Exception as e:
+            logger.warning(f"Embedded vendor detail select failed, fetching concurrently: {str(e)}")
+            vendor_query = client.table("vendors").select(fields).eq("id", vendor_id)
+            services_query = client.table("vendor_services")\
+                .select(service_fields, count="exact" if paged else None)\
+                .eq("vendor_id", vendor_id)\
+                .order("created_at", desc=True)
+            if paged:
+                services_query = services_query.range(services_offset, services_offset + services_limit - 1)
+            vendor_res, services_res = await asyncio.gather(vendor_query.execute(), services_query.execute())
+            if not vendor_res.data:
+                return None
+            vendor = vendor_res.data[0]
+            services = services_res.data or []
+            total = services_res.count if paged else len(services)
+
+        detail = {"vendor": vendor, "services": services}
+        if paged:
+            detail["services_page"] = {
+                "limit": services_limit,
+                "offset": services_offset,
+                "total": total
+            }
+        return detail
+
+    @staticmethod
+    async def create_vendor_records(
+        user: Dict[str, Any],
+        vendor: Dict[str, Any],
+        services: List[Dict[str, Any]]
+    ) -> str:
+        """Insert the users, vendors and vendor_services rows of a new vendor; returns the vendor id.
+
+        Runs as one transaction through the register_vendor RPC
+        (database/migration_v11_register_vendor.sql, v12 for an existing users
+        row). Raises on failure; the caller only has to delete the auth user,
+        which cascades to every row.
+        """
+        result = await SupabaseManager.execute_rpc(
+            "register_vendor", {"p_user": user, "p_vendor": vendor, "p_services": services}
+        )
+        if result["success"]:
+            return result["data"]["vendor_id"]
+        if "PGRST202" not in (result["error"] or ""):
+            raise RuntimeError(result["error"])
+
+        # Function not installed: same inserts, one call each (not atomic)
+        logger.warning("register_vendor RPC unavailable - falling back to sequential inserts. Migration missing?")
+        client = SupabaseManager.get_async_admin_client()
+        await client.table("users").upsert(user, ignore_duplicates=True).execute()
+        res = await client.table("vendors").insert({**vendor, "user_id": user["id"]}).execute()
+        vendor_id = res.data[0]["id"]
+        if services:
+            await client.table("vendor_services").insert([{**s, "vendor_id": vendor_id} for s in services]).execute()
+        return vendor_id
+
+    @staticmethod
+    async def _update_media_urls(
+        fn: str,
+        table: str,
+        row_id: str,
+        urls: List[str],
+        vendor_id: Optional[str]
+    ) -> Optional[List[str]]:
+        result = await SupabaseManager.execute_rpc(
+            fn, {"p_table": table, "p_id": row_id, "p_urls": urls, "p_vendor_id": vendor_id}
+        )
+        if result["success"]:
+            return result["data"]
+        if "PGRST202" not in (result["error"] or ""):
+            raise RuntimeError(result["error"])
+
+        # Function not installed: read-modify-write (concurrent updates can lose entries)
+        logger.warning(f"{fn} RPC unavailable - falling back to read-modify-write. Migration missing?")
+        column = MEDIA_URL_COLUMNS[table]
+        client = SupabaseManager.get_async_admin_client()
+        query = client.table(table).select(column).eq("id", row_id)
+        if vendor_id:
+            query = query.eq("id" if table == "vendors" else "vendor_id", vendor_id)
+        res = await query.execute()
+        if not res.data:
+            return None
+        current = res.data[0].get(column) or []
+        if fn == "append_media_urls":
+            updated = current + [u for u in dict.fromkeys(urls) if u not in current]
+        else:
+            updated = [u for u in current if u not in urls]
+        if updated != current:
+            await client.table(table).update({column: updated}).eq("id", row_id).execute()
+        return updated
+
+    @staticmethod
+    async def append_media_urls(
+        table: str,
+        row_id: str,
+        urls: List[str],
+        vendor_id: Optional[str] = None
+    ) -> Optional[List[str]]:
+        """Append URLs (skipping ones already present) to vendors.gallery_urls or
+        vendor_services.image_urls in one statement; returns the new list, None if
+        the row does not exist (or is not the given vendor's)."""
+        return await VendorService._update_media_urls("append_media_urls", table, row_id, urls, vendor_id)
+
+    @staticmethod
+    async def remove_media_urls(
+        table: str,
+        row_id: str,
+        urls: List[str],
+        vendor_id: Optional[str] = None
+    ) -> Optional[List[str]]:
+        """Remove URLs from the media array in one statement; same result as append_media_urls"""
+        return await VendorService._update_media_urls("remove_media_urls", table, row_id, urls, vendor_id)
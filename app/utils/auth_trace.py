@@ -0,0 +1,180 @@
+"""
+Non-blocking auth tracing
+
+Records are handed to a queue on the event loop and written as JSON lines by
+a background listener thread, which batches file writes. Tracing is sampled
+per request (warnings and errors are always kept), gated by level, and can be
+switched off entirely with AUTH_TRACE_ENABLED=false (the production default).
+"""
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+
+from app.config import settings
+
+_trace_logger = logging.getLogger("auth_trace")
+_trace_logger.propagate = False
+_listener: Optional[QueueListener] = None
+_listener_lock = threading.Lock()
+
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per record, with the structured fields merged in"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "trace", {}))
+        return json.dumps(entry, default=str)
+
+
+class BatchingFileHandler(logging.Handler):
+    """Buffers formatted records and appends them to a file in batches.
+
+    Runs on the QueueListener thread, so file I/O never touches the event loop.
+    Warnings and above flush immediately; the listener flushes the rest when
+    its queue goes idle.
+    """
+
+    def __init__(self, filename: str, batch_size: int = 100, flush_interval: float = 2.0):
+        super().__init__()
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._buffer.append(self.format(record))
+            if (
+                record.levelno >= logging.WARNING
+                or len(self._buffer) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self._buffer:
+                with open(self.filename, "a", encoding="utf-8") as f:
+                    f.write("\n".join(self._buffer) + "\n")
+                self._buffer = []
+            self._last_flush = time.monotonic()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        self.flush()
+        super().close()
+
+
+class _FlushingQueueListener(QueueListener):
+    """Flushes its handlers whenever the queue has been idle for `idle_flush`
+    seconds, so batched records do not wait for the next one to be written"""
+
+    def __init__(self, record_queue: queue.Queue, *handlers: logging.Handler, idle_flush: float = 2.0):
+        super().__init__(record_queue, *handlers)
+        self.idle_flush = idle_flush
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        if not block:
+            return super().dequeue(block)
+        while True:
+            try:
+                return self.queue.get(timeout=self.idle_flush)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never blocks the caller: records are dropped when the queue is full"""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def start_auth_trace() -> None:
+    """Start the background writer (idempotent). No-op when tracing is disabled."""
+    global _listener
+
+    if not settings.AUTH_TRACE_ENABLED:
+        return
+
+    with _listener_lock:
+        if _listener is not None:
+            return
+
+        record_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=10000)
+        file_handler = BatchingFileHandler(
+            settings.AUTH_TRACE_FILE,
+            batch_size=settings.AUTH_TRACE_BATCH_SIZE,
+            flush_interval=settings.AUTH_TRACE_FLUSH_INTERVAL
+        )
+        file_handler.setFormatter(JsonLineFormatter())
+
+        _trace_logger.handlers = [_DroppingQueueHandler(record_queue)]
+        _trace_logger.setLevel(settings.AUTH_TRACE_LEVEL.upper())
+        _listener = _FlushingQueueListener(
+            record_queue, file_handler, idle_flush=settings.AUTH_TRACE_FLUSH_INTERVAL
+        )
+        _listener.start()
+
+
+def stop_auth_trace() -> None:
+    """Drain the queue and flush pending records (call on shutdown)"""
+    global _listener
+
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+            _trace_logger.handlers = []
+
+
+class AuthTrace:
+    """Per-request trace handle; all records share a trace id"""
+
+    def __init__(self, path: str):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.enabled = settings.AUTH_TRACE_ENABLED and _listener is not None
+        self.sampled = self.enabled and random.random() < settings.AUTH_TRACE_SAMPLE_RATE
+
+    def _log(self, level: int, event: str, fields: Dict[str, Any]) -> None:
+        if not self.enabled or not _trace_logger.isEnabledFor(level):
+            return
+        if level < logging.WARNING and not self.sampled:
+            return
+        _trace_logger.log(level, event, extra={"trace": {"trace_id": self.trace_id, "path": self.path, **fields}})
+
+    def debug(self, event: str, **fields: Any) -> None:
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields: Any) -> None:
+        self._log(logging.ERROR, event, fields)
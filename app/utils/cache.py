@@ -0,0 +1,199 @@
+"""
+Small in-process caches shared by the API layer
+"""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after `ttl` seconds.
+
+    Values are stored as-is; callers that hand out mutable values should
+    copy them on the way in and out.
+
+    To cache a value loaded from elsewhere without racing invalidations, read
+    generation() before the load and pass it to set(): the value is dropped if
+    its key was invalidated (or the cache cleared) while the load ran.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # key -> generation of its last invalidation (bounded like the entries;
+        # evicted ones raise _floor, which conservatively covers every key)
+        self._generation = 0
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._floor = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and self._invalidated.get(key, self._floor) > generation:
+                return
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self._generation += 1
+            self._invalidated[key] = self._generation
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.maxsize:
+                _, self._floor = self._invalidated.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+            self._invalidated.clear()
+            self._floor = self._generation
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class RefreshingCache:
+    """Stale-while-revalidate cache for a single expensive value.
+
+    A background task reloads the value every `refresh_interval` seconds.
+    Readers always get the last value immediately; if it is older than the
+    interval (or was invalidated) a reload is started in the background.
+    Concurrent reloads collapse into one in-flight task (single-flight).
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Awaitable[Any]], refresh_interval: float = 15.0):
+        self.name = name
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._value: Any = None
+        self._loaded_at: Optional[float] = None
+        self._stale = False
+        self._inflight: Optional[asyncio.Task] = None
+        self._scheduler: Optional[asyncio.Task] = None
+
+    async def get(self) -> Tuple[Any, float]:
+        """Return (value, age in seconds)"""
+        if self._loaded_at is None:
+            self.misses += 1
+            await self.refresh()
+        else:
+            self.hits += 1
+            if self._stale or self.age() >= self.refresh_interval:
+                self._start_refresh()
+        return self._value, self.age()
+
+    def peek(self) -> Any:
+        """Current value (None before the first load) without triggering a reload"""
+        return self._value
+
+    def age(self) -> float:
+        if self._loaded_at is None:
+            return 0.0
+        return time.monotonic() - self._loaded_at
+
+    def invalidate(self, reload: bool = False) -> None:
+        """Mark the value stale; the next read triggers a background reload.
+
+        With reload=True the background reload starts right away (call from
+        an event loop), so readers see fresh data without a stale hit first.
+        """
+        self._stale = True
+        if reload and self._loaded_at is not None:
+            self._start_refresh()
+
+    async def refresh(self) -> Any:
+        """Reload now, joining an in-flight reload if there is one"""
+        task = self._start_refresh()
+        await asyncio.shield(task)
+        return self._value
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._load())
+        return self._inflight
+
+    async def _load(self) -> None:
+        self._stale = False
+        try:
+            value = await self.loader()
+        except Exception as e:
+            logger.error(f"Refresh of '{self.name}' cache failed: {e}")
+            if self._loaded_at is None:
+                raise
+            return
+        self._value = value
+        self._loaded_at = time.monotonic()
+        self.refreshes += 1
+
+    async def _run_scheduler(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                pass  # logged in _load; keep the schedule going
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self) -> None:
+        """Start background refreshing (call from an event loop)"""
+        if self._scheduler is None or self._scheduler.done():
+            self._scheduler = asyncio.create_task(self._run_scheduler())
+
+    async def stop(self) -> None:
+        for task in (self._scheduler, self._inflight):
+            if task is not None and not task.done():
+                task.cancel()
+        self._scheduler = None
+        self._inflight = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "age": round(self.age(), 3),
+            "refresh_interval": self.refresh_interval,
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes
+        }
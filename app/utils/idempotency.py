@@ -0,0 +1,344 @@
+"""
+Idempotency-Key support for POST requests
+
+A client that retries a POST with the same Idempotency-Key header gets the
+stored response of the first attempt instead of running the request again.
+A duplicate that arrives while the first attempt is still running waits for
+it to finish (up to IDEMPOTENCY_WAIT_SECONDS) and then gets its response.
+
+Keys are scoped to the method, path and caller (Authorization header) and
+bound to a fingerprint of the request body: reusing a key with a different
+body is rejected with 422. For multipart uploads the fingerprint covers the
+body with its per-request boundary blanked out (form fields, file names and
+the leading file bytes) plus the declared length. Only responses
+below 500 are stored, so server errors can be retried. Records live
+in-process (TTL-bounded) or, with IDEMPOTENCY_BACKEND=mongo, in a MongoDB
+collection shared by all workers.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+
+from app.config import settings
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+MAX_KEY_LENGTH = 255
+
+# Outcomes of IdempotencyStore.begin()
+NEW, REPLAY, MISMATCH, BUSY = "new", "replay", "mismatch", "busy"
+
+
+class InMemoryIdempotencyStore:
+    """Per-worker store; concurrent duplicates wait on an asyncio.Event"""
+
+    def __init__(self):
+        self._records = TTLCache(
+            "idempotency",
+            maxsize=settings.IDEMPOTENCY_CACHE_SIZE,
+            ttl=settings.IDEMPOTENCY_TTL_SECONDS
+        )
+        self._inflight: Dict[str, Tuple[str, asyncio.Event]] = {}
+
+    async def begin(self, key: str, fingerprint: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            record = self._records.get(key)
+            if record is not None:
+                return (REPLAY, record) if record["fingerprint"] == fingerprint else (MISMATCH, None)
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                self._inflight[key] = (fingerprint, asyncio.Event())
+                return NEW, None
+            if inflight[0] != fingerprint:
+                return MISMATCH, None
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return BUSY, None
+            try:
+                await asyncio.wait_for(inflight[1].wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return BUSY, None
+
+    async def finish(self, key: str, record: Optional[Dict[str, Any]]) -> None:
+        """Store the response (None = not storable, the key is released) and wake waiters"""
+        if record is not None:
+            self._records.set(key, record)
+        inflight = self._inflight.pop(key, None)
+        if inflight is not None:
+            inflight[1].set()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._records.stats()
+        stats["in_flight"] = len(self._inflight)
+        return stats
+
+
+class MongoIdempotencyStore:
+    """Store shared by all workers; documents expire through a TTL index on expires_at.
+
+    Falls back to the in-process store whenever MongoDB is unavailable.
+    """
+
+    POLL_INTERVAL = 0.25
+
+    def __init__(self, fallback: InMemoryIdempotencyStore):
+        self._fallback = fallback
+        # key -> (owner token, task renewing the lock) for requests running in this worker
+        self._leases: Dict[str, Tuple[str, asyncio.Task]] = {}
+
+    async def _collection(self):
+        from app.database.mongo_config import get_idempotency_collection
+        try:
+            return await get_idempotency_collection()
+        except Exception as e:
+            logger.error(f"Idempotency store unavailable: {str(e)}")
+            return None
+
+    async def begin(self, key: str, fingerprint: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        from pymongo.errors import DuplicateKeyError
+
+        collection = await self._collection()
+        if collection is None:
+            return await self._fallback.begin(key, fingerprint)
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        lease = timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+        owner = uuid.uuid4().hex
+        while True:
+            now = datetime.utcnow()
+            try:
+                await collection.insert_one({
+                    "_id": key,
+                    "fingerprint": fingerprint,
+                    "state": "in_progress",
+                    "owner": owner,
+                    # Renewed while the request runs, so only a crashed worker's lock lapses
+                    "expires_at": now + lease
+                })
+                self._hold(collection, key, owner)
+                return NEW, None
+            except DuplicateKeyError:
+                pass
+
+            doc = await collection.find_one({"_id": key})
+            if doc is None:
+                continue  # expired between the insert and the read
+            if doc["fingerprint"] != fingerprint:
+                return MISMATCH, None
+            if doc["state"] == "done":
+                return REPLAY, {
+                    "fingerprint": doc["fingerprint"],
+                    "status": doc["status"],
+                    "headers": doc["headers"],
+                    "body": bytes(doc["body"])
+                }
+            if doc["expires_at"] < now:
+                # Stale lock: take it over if nobody else did
+                taken = await collection.find_one_and_update(
+                    {"_id": key, "state": "in_progress", "expires_at": doc["expires_at"]},
+                    {"$set": {"owner": owner, "expires_at": now + lease}}
+                )
+                if taken is not None:
+                    self._hold(collection, key, owner)
+                    return NEW, None
+            if time.monotonic() >= deadline:
+                return BUSY, None
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    def _hold(self, collection, key: str, owner: str) -> None:
+        """Keep renewing the lock's lease until finish() (or until another owner has it)"""
+        async def renew():
+            while True:
+                await asyncio.sleep(settings.IDEMPOTENCY_LOCK_SECONDS / 3)
+                try:
+                    result = await collection.update_one(
+                        {"_id": key, "state": "in_progress", "owner": owner},
+                        {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)}}
+                    )
+                    if result.matched_count == 0:
+                        return
+                except Exception as e:
+                    logger.error(f"Failed to renew idempotency lock for {key}: {str(e)}")
+
+        self._leases[key] = (owner, asyncio.create_task(renew()))
+
+    async def finish(self, key: str, record: Optional[Dict[str, Any]]) -> None:
+        lease = self._leases.pop(key, None)
+        if lease is not None:
+            lease[1].cancel()
+        collection = await self._collection()
+        if collection is None:
+            await self._fallback.finish(key, record)
+            return
+        try:
+            if record is None:
+                # Only release our own lock
+                owner_filter = {"owner": lease[0]} if lease is not None else {}
+                await collection.delete_one({"_id": key, "state": "in_progress", **owner_filter})
+            else:
+                await collection.update_one({"_id": key}, {"$set": {
+                    "state": "done",
+                    "status": record["status"],
+                    "headers": record["headers"],
+                    "body": record["body"],
+                    "expires_at": datetime.utcnow() + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS)
+                }})
+        except Exception as e:
+            logger.error(f"Failed to store idempotent response for {key}: {str(e)}")
+        # Local waiters (fallback path) are woken either way
+        await self._fallback.finish(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._fallback.stats()
+        stats["backend"] = "mongo"
+        return stats
+
+
+def create_store():
+    memory = InMemoryIdempotencyStore()
+    if settings.IDEMPOTENCY_BACKEND == "mongo":
+        return MongoIdempotencyStore(memory)
+    return memory
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware: replays stored responses for repeated Idempotency-Key POSTs.
+
+    Plain ASGI (not BaseHTTPMiddleware) so request bodies pass through
+    unbuffered beyond the fingerprint limit (uploads included).
+    """
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store or create_store()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        raw_key = headers.get(IDEMPOTENCY_HEADER)
+        if not raw_key:
+            await self.app(scope, receive, send)
+            return
+        if len(raw_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, {"detail": "Idempotency-Key is too long"})
+            return
+
+        caller = hashlib.sha256(headers.get(b"authorization", b"")).hexdigest()[:16]
+        key = f"{scope['method']}:{scope['path']}:{caller}:{raw_key.decode('latin-1')}"
+
+        # Fingerprint the body (up to a limit) while keeping the chunks for the app
+        digest = hashlib.sha256(scope["query_string"])
+        buffered, more_body = await _read_prefix(receive, settings.IDEMPOTENCY_FINGERPRINT_BYTES)
+        boundary = _multipart_boundary(headers.get(b"content-type", b""))
+        if boundary:
+            # The boundary changes on every retry; the length it adds does not
+            prefix = b"".join(message.get("body", b"") for message in buffered)
+            digest.update(prefix.replace(boundary, b"<boundary>"))
+            digest.update(b"<length>%s:%d" % (headers.get(b"content-length", b""), len(boundary)))
+        else:
+            for message in buffered:
+                digest.update(message.get("body", b""))
+        if more_body:
+            digest.update(b"<truncated>")
+        fingerprint = digest.hexdigest()
+
+        outcome, record = await self.store.begin(key, fingerprint)
+        if outcome == REPLAY:
+            await _send_record(send, record)
+            return
+        if outcome == MISMATCH:
+            await _send_json(send, 422, {"detail": "Idempotency-Key was already used with a different request"})
+            return
+        if outcome == BUSY:
+            await _send_json(send, 409, {"detail": "A request with this Idempotency-Key is still in progress"})
+            return
+
+        async def replay_receive():
+            if buffered:
+                return buffered.pop(0)
+            return await receive()
+
+        response: Dict[str, Any] = {"status": None, "headers": [], "chunks": [], "size": 0, "storable": True}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [[k.decode("latin-1"), v.decode("latin-1")] for k, v in message.get("headers", [])]
+            elif message["type"] == "http.response.body" and response["storable"]:
+                body = message.get("body", b"")
+                response["size"] += len(body)
+                if response["size"] > settings.IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                    response["storable"] = False
+                    response["chunks"] = []
+                else:
+                    response["chunks"].append(body)
+            await send(message)
+
+        stored = None
+        try:
+            await self.app(scope, replay_receive, capture_send)
+            if response["storable"] and response["status"] is not None and response["status"] < 500:
+                stored = {
+                    "fingerprint": fingerprint,
+                    "status": response["status"],
+                    "headers": response["headers"],
+                    "body": b"".join(response["chunks"])
+                }
+        finally:
+            await self.store.finish(key, stored)
+
+
+async def _read_prefix(receive, limit: int) -> Tuple[List[Dict[str, Any]], bool]:
+    """Receive body messages until `limit` bytes or the end; returns (messages, more_body)"""
+    messages = []
+    size = 0
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            return messages, False
+        size += len(message.get("body", b""))
+        if not message.get("more_body", False):
+            return messages, False
+        if size >= limit:
+            return messages, True
+
+
+def _multipart_boundary(content_type: bytes) -> Optional[bytes]:
+    if not content_type.startswith(b"multipart/"):
+        return None
+    for param in content_type.split(b";")[1:]:
+        name, _, value = param.strip().partition(b"=")
+        if name.lower() == b"boundary" and value:
+            return value.strip(b'"')
+    return None
+
+
+async def _send_record(send, record: Dict[str, Any]) -> None:
+    headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in record["headers"]]
+    headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": record["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": record["body"]})
+
+
+async def _send_json(send, status_code: int, payload: Dict[str, Any]) -> None:
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,45 @@
+"""
+Image derivatives (runs in worker processes)
+
+Kept free of app imports so the process pool's workers start quickly.
+Pillow is in requirements.txt; if it is missing anyway, no derivatives are produced.
+"""
+from typing import Dict, Optional
+import io
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+
+def pillow_available() -> bool:
+    return Image is not None
+
+
+def render_variants(data: bytes, sizes: Dict[str, Optional[int]], quality: int) -> Dict[str, bytes]:
+    """WebP encodings of an image, one per variant.
+
+    `sizes` maps a variant name to its longest edge in pixels (None keeps the
+    original size). Variants that would not be smaller than the original are
+    skipped. Raises for data Pillow cannot decode.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+
+        variants = {}
+        longest = max(image.size)
+        for name, edge in sizes.items():
+            if edge is not None and edge >= longest:
+                continue
+            resized = image.copy()
+            if edge is not None:
+                resized.thumbnail((edge, edge), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, format="WEBP", quality=quality, method=4)
+            variants[name] = buffer.getvalue()
+        return variants
@@ -0,0 +1,58 @@
+"""
+Keyset (cursor) pagination helpers for PostgREST queries
+"""
+from datetime import datetime
+from typing import Any, Optional, Tuple
+import base64
+import json
+import uuid
+
+
+def encode_cursor(sort_value: Any, row_id: Any) -> str:
+    """Opaque cursor pointing just after the given (sort value, id) row"""
+    raw = json.dumps([sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors.
+
+    The values end up inside a PostgREST filter, so only an ISO timestamp
+    and a UUID are accepted.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        datetime.fromisoformat(sort_value)
+        uuid.UUID(row_id)
+        return sort_value, row_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def apply_keyset(query, cursor: Optional[str], sort_column: str = "created_at", id_column: str = "id", desc: bool = True):
+    """Order by (sort_column, id_column) and continue after `cursor`.
+
+    Rows are ordered by the pair so ties on sort_column stay stable across pages.
+    """
+    query = query.order(sort_column, desc=desc).order(id_column, desc=desc)
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        op = "lt" if desc else "gt"
+        query = query.or_(
+            f'{sort_column}.{op}."{sort_value}",'
+            f'and({sort_column}.eq."{sort_value}",{id_column}.{op}."{row_id}")'
+        )
+    return query
+
+
+def split_page(rows: list, page_size: int, sort_column: str = "created_at", id_column: str = "id") -> Tuple[list, Optional[str]]:
+    """Trim a page fetched with limit(page_size + 1) and build the next cursor.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(last.get(sort_column), last.get(id_column))
@@ -1,9 +1,13 @@
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
 from passlib.context import CryptContext
 from app.config import settings
+import asyncio
+import httpx
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -59,4 +63,96 @@ def create_tokens(user_id: str, role: str) -> Dict[str, str]:
         "access_token": access_token,
         "refresh_token": refresh_token,
         "token_type": "bearer"
-    }
\ No newline at end of file
+    }
+
+# ==================== SUPABASE ACCESS TOKENS ====================
+
+# Verification keys are constructed once and reused; JWKS keys are refetched
+# after SUPABASE_JWKS_CACHE_SECONDS or when an unknown kid shows up, but at
+# most once per SUPABASE_JWKS_MIN_REFRESH_SECONDS. A kid missing from a fresh
+# key set is rejected without asking GoTrue.
+SUPABASE_JWT_ALGORITHMS = ["HS256", "RS256", "ES256"]
+_supabase_key_cache: Dict[str, Key] = {}
+_supabase_jwks_fetched_at: float = 0.0
+_supabase_jwks_attempted_at: Optional[float] = None
+_supabase_jwks_lock = asyncio.Lock()
+
+
+async def _refresh_supabase_jwks() -> None:
+    """Fetch the project's signing keys from GoTrue into the key cache"""
+    global _supabase_jwks_fetched_at, _supabase_jwks_attempted_at
+
+    _supabase_jwks_attempted_at = time.monotonic()
+    url = f"{settings.SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json"
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, headers={"apikey": settings.SUPABASE_KEY}, timeout=5.0)
+        response.raise_for_status()
+
+    for key_data in response.json().get("keys", []):
+        kid = key_data.get("kid")
+        if kid:
+            _supabase_key_cache[kid] = jwk.construct(key_data, key_data.get("alg"))
+    _supabase_jwks_fetched_at = time.monotonic()
+
+
+async def _get_supabase_key(header: Dict[str, Any]) -> Optional[Key]:
+    """Resolve the verification key for a Supabase token header"""
+    alg = header.get("alg")
+
+    if alg == "HS256":
+        if not settings.SUPABASE_JWT_SECRET:
+            return None
+        if "HS256" not in _supabase_key_cache:
+            _supabase_key_cache["HS256"] = jwk.construct(settings.SUPABASE_JWT_SECRET, "HS256")
+        return _supabase_key_cache["HS256"]
+
+    kid = header.get("kid")
+    if not kid:
+        return None
+
+    expired = time.monotonic() - _supabase_jwks_fetched_at > settings.SUPABASE_JWKS_CACHE_SECONDS
+    if kid not in _supabase_key_cache or expired:
+        async with _supabase_jwks_lock:
+            # Concurrent requests wait for one fetch instead of each starting their own
+            if (
+                _supabase_jwks_attempted_at is None
+                or time.monotonic() - _supabase_jwks_attempted_at >= settings.SUPABASE_JWKS_MIN_REFRESH_SECONDS
+            ):
+                try:
+                    await _refresh_supabase_jwks()
+                except Exception as e:
+                    logger.warning(f"Could not fetch Supabase JWKS: {e}")
+
+    key = _supabase_key_cache.get(kid)
+    fresh = _supabase_jwks_fetched_at > 0 and time.monotonic() - _supabase_jwks_fetched_at <= settings.SUPABASE_JWKS_CACHE_SECONDS
+    if key is None and fresh:
+        raise JWTError(f"Unknown signing key: {kid}")
+    return key
+
+
+async def verify_supabase_token(token: str) -> Optional[Dict[str, Any]]:
+    """Verify a Supabase access token locally (signature, expiry, audience).
+
+    Returns the claims, or None when no verification key is available and
+    the caller has to fall back to GoTrue. Raises JWTError for bad tokens.
+    """
+    header = jwt.get_unverified_header(token)
+    if header.get("alg") not in SUPABASE_JWT_ALGORITHMS:
+        raise JWTError(f"Unsupported token algorithm: {header.get('alg')}")
+
+    key = await _get_supabase_key(header)
+    if key is None:
+        return None
+
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[header.get("alg")],
+        audience=settings.SUPABASE_JWT_AUDIENCE,
+        options={"require_exp": True, "require_sub": True}
+    )
+
+
+def token_expires_soon(claims: Dict[str, Any]) -> bool:
+    """Whether a verified token is close enough to expiry to re-check with GoTrue"""
+    return claims["exp"] - time.time() <= settings.SUPABASE_JWT_REMOTE_CHECK_WINDOW
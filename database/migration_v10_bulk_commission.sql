@@ -0,0 +1,30 @@
+-- Migration V10: Batched commission write-back
+-- Applies a batch of {id, commission, net_price} records in one UPDATE.
+-- Called from CommissionService.apply_changes() via supabase.rpc("bulk_update_service_commission").
+-- (A plain PostgREST upsert cannot be used: partial rows fail the NOT NULL checks before ON CONFLICT.)
+
+CREATE OR REPLACE FUNCTION public.bulk_update_service_commission(updates JSONB)
+RETURNS INTEGER
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    WITH changes AS (
+        SELECT *
+        FROM jsonb_to_recordset(updates) AS c(id UUID, commission NUMERIC, net_price NUMERIC)
+    ),
+    updated AS (
+        UPDATE public.vendor_services s
+        SET commission = changes.commission,
+            net_price = changes.net_price,
+            updated_at = NOW()
+        FROM changes
+        WHERE s.id = changes.id
+        RETURNING 1
+    )
+    SELECT COUNT(*)::INTEGER FROM updated;
+$$;
+
+-- Only the backend (service role) may call it
+REVOKE ALL ON FUNCTION public.bulk_update_service_commission(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.bulk_update_service_commission(JSONB) TO service_role;
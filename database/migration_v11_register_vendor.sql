@@ -0,0 +1,63 @@
+-- Migration V11: Transactional vendor registration
+-- Inserts the public.users row, the vendors row and all vendor_services rows
+-- in one transaction, so a failed registration never leaves a half-created vendor.
+-- Called from VendorService.create_vendor_records() via supabase.rpc("register_vendor");
+-- only the GoTrue (auth.users) account is created outside, before this call.
+--
+-- Only the keys present in the JSON payloads are inserted, so column defaults
+-- (id, status, created_at, ...) still apply to everything else.
+
+CREATE OR REPLACE FUNCTION public.register_vendor(p_user JSONB, p_vendor JSONB, p_services JSONB DEFAULT '[]'::jsonb)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_user_id UUID := (p_user ->> 'id')::UUID;
+    v_vendor_id UUID;
+    v_columns TEXT;
+    v_services JSONB;
+    v_service_count INTEGER := 0;
+BEGIN
+    -- 1. Public user
+    INSERT INTO public.users (id, email, name, role)
+    VALUES (v_user_id, p_user ->> 'email', p_user ->> 'name', COALESCE(p_user ->> 'role', 'vendor'));
+
+    -- 2. Vendor
+    p_vendor := p_vendor || jsonb_build_object('user_id', v_user_id);
+    SELECT string_agg(quote_ident(c.column_name), ', ')
+    INTO v_columns
+    FROM information_schema.columns c
+    WHERE c.table_schema = 'public' AND c.table_name = 'vendors' AND p_vendor ? c.column_name;
+
+    EXECUTE format(
+        'INSERT INTO public.vendors (%1$s) SELECT %1$s FROM jsonb_populate_record(NULL::public.vendors, $1) RETURNING id',
+        v_columns
+    ) INTO v_vendor_id USING p_vendor;
+
+    -- 3. Services (columns taken from the first record; all records share the same keys)
+    IF p_services IS NOT NULL AND jsonb_array_length(p_services) > 0 THEN
+        SELECT jsonb_agg(s || jsonb_build_object('vendor_id', v_vendor_id))
+        INTO v_services
+        FROM jsonb_array_elements(p_services) s;
+
+        SELECT string_agg(quote_ident(c.column_name), ', ')
+        INTO v_columns
+        FROM information_schema.columns c
+        WHERE c.table_schema = 'public' AND c.table_name = 'vendor_services' AND (v_services -> 0) ? c.column_name;
+
+        EXECUTE format(
+            'INSERT INTO public.vendor_services (%1$s) SELECT %1$s FROM jsonb_populate_recordset(NULL::public.vendor_services, $1)',
+            v_columns
+        ) USING v_services;
+        GET DIAGNOSTICS v_service_count = ROW_COUNT;
+    END IF;
+
+    RETURN jsonb_build_object('user_id', v_user_id, 'vendor_id', v_vendor_id, 'services', v_service_count);
+END;
+$$;
+
+-- Only the backend (service role) may call it
+REVOKE ALL ON FUNCTION public.register_vendor(JSONB, JSONB, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.register_vendor(JSONB, JSONB, JSONB) TO service_role;
@@ -0,0 +1,93 @@
+-- Migration V12: Bulk vendor onboarding
+-- register_vendors_batch() registers many vendors in one round trip. Each entry
+-- runs register_vendor() in its own subtransaction, so a bad row only rolls
+-- back itself and is reported with its error while the rest of the batch commits.
+-- Called from VendorImportService via supabase.rpc("register_vendors_batch").
+--
+-- register_vendor() is redefined to tolerate an existing public.users row, so an
+-- import re-run can finish vendors whose account survived an earlier failure.
+
+CREATE OR REPLACE FUNCTION public.register_vendor(p_user JSONB, p_vendor JSONB, p_services JSONB DEFAULT '[]'::jsonb)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_user_id UUID := (p_user ->> 'id')::UUID;
+    v_vendor_id UUID;
+    v_columns TEXT;
+    v_services JSONB;
+    v_service_count INTEGER := 0;
+BEGIN
+    -- 1. Public user (kept if an earlier, failed attempt already created it)
+    INSERT INTO public.users (id, email, name, role)
+    VALUES (v_user_id, p_user ->> 'email', p_user ->> 'name', COALESCE(p_user ->> 'role', 'vendor'))
+    ON CONFLICT (id) DO NOTHING;
+
+    -- 2. Vendor
+    p_vendor := p_vendor || jsonb_build_object('user_id', v_user_id);
+    SELECT string_agg(quote_ident(c.column_name), ', ')
+    INTO v_columns
+    FROM information_schema.columns c
+    WHERE c.table_schema = 'public' AND c.table_name = 'vendors' AND p_vendor ? c.column_name;
+
+    EXECUTE format(
+        'INSERT INTO public.vendors (%1$s) SELECT %1$s FROM jsonb_populate_record(NULL::public.vendors, $1) RETURNING id',
+        v_columns
+    ) INTO v_vendor_id USING p_vendor;
+
+    -- 3. Services (columns taken from the first record; all records share the same keys)
+    IF p_services IS NOT NULL AND jsonb_array_length(p_services) > 0 THEN
+        SELECT jsonb_agg(s || jsonb_build_object('vendor_id', v_vendor_id))
+        INTO v_services
+        FROM jsonb_array_elements(p_services) s;
+
+        SELECT string_agg(quote_ident(c.column_name), ', ')
+        INTO v_columns
+        FROM information_schema.columns c
+        WHERE c.table_schema = 'public' AND c.table_name = 'vendor_services' AND (v_services -> 0) ? c.column_name;
+
+        EXECUTE format(
+            'INSERT INTO public.vendor_services (%1$s) SELECT %1$s FROM jsonb_populate_recordset(NULL::public.vendor_services, $1)',
+            v_columns
+        ) USING v_services;
+        GET DIAGNOSTICS v_service_count = ROW_COUNT;
+    END IF;
+
+    RETURN jsonb_build_object('user_id', v_user_id, 'vendor_id', v_vendor_id, 'services', v_service_count);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.register_vendors_batch(p_entries JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_entry JSONB;
+    v_result JSONB;
+    v_results JSONB := '[]'::jsonb;
+BEGIN
+    FOR v_entry IN SELECT * FROM jsonb_array_elements(p_entries) LOOP
+        BEGIN
+            v_result := public.register_vendor(
+                v_entry -> 'user', v_entry -> 'vendor', COALESCE(v_entry -> 'services', '[]'::jsonb)
+            );
+            v_results := v_results || jsonb_build_array(v_result || jsonb_build_object('error', NULL));
+        EXCEPTION WHEN OTHERS THEN
+            v_results := v_results || jsonb_build_array(jsonb_build_object(
+                'user_id', v_entry -> 'user' ->> 'id', 'vendor_id', NULL, 'services', 0, 'error', SQLERRM
+            ));
+        END;
+    END LOOP;
+    RETURN v_results;
+END;
+$$;
+
+-- Only the backend (service role) may call them
+REVOKE ALL ON FUNCTION public.register_vendor(JSONB, JSONB, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.register_vendor(JSONB, JSONB, JSONB) TO service_role;
+REVOKE ALL ON FUNCTION public.register_vendors_batch(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.register_vendors_batch(JSONB) TO service_role;
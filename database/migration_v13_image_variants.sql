@@ -0,0 +1,40 @@
+-- Migration V13: Image derivatives
+-- Thumbnail / WebP variants of uploaded images, keyed by the original file URL:
+--   {"<original url>": {"thumb": "<url>", "medium": "<url>", "full": "<url>"}}  (all WebP)
+-- Written by ImageService after each logo, cover, gallery or service image upload.
+
+ALTER TABLE public.vendors ADD COLUMN IF NOT EXISTS image_variants JSONB NOT NULL DEFAULT '{}'::jsonb;
+ALTER TABLE public.vendor_services ADD COLUMN IF NOT EXISTS image_variants JSONB NOT NULL DEFAULT '{}'::jsonb;
+
+-- Sets (or, with p_variants NULL, removes) the variants of one image in a single
+-- UPDATE, so concurrent uploads to the same vendor or service do not overwrite each other.
+CREATE OR REPLACE FUNCTION public.set_image_variants(p_table TEXT, p_id UUID, p_url TEXT, p_variants JSONB)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    IF p_table NOT IN ('vendors', 'vendor_services') THEN
+        RAISE EXCEPTION 'Unsupported table: %', p_table;
+    END IF;
+
+    IF p_variants IS NULL THEN
+        EXECUTE format('UPDATE public.%I SET image_variants = image_variants - $1 WHERE id = $2', p_table)
+        USING p_url, p_id;
+    ELSE
+        EXECUTE format(
+            'UPDATE public.%I SET image_variants = image_variants || jsonb_build_object($1, $3::jsonb) WHERE id = $2',
+            p_table
+        ) USING p_url, p_id, p_variants;
+    END IF;
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count > 0;
+END;
+$$;
+
+-- Only the backend (service role) may call it
+REVOKE ALL ON FUNCTION public.set_image_variants(TEXT, UUID, TEXT, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.set_image_variants(TEXT, UUID, TEXT, JSONB) TO service_role;
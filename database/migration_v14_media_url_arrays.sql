@@ -0,0 +1,82 @@
+-- Migration V14: Atomic media URL array updates
+-- Append to / remove from vendors.gallery_urls or vendor_services.image_urls in a
+-- single UPDATE, so concurrent uploads and deletions never lose each other's entries.
+-- Both take several URLs at once. Called from VendorService.append_media_urls() /
+-- remove_media_urls() via supabase.rpc(...).
+--
+-- p_vendor_id (optional) restricts the update to rows of that vendor.
+-- Returns the new array, or NULL when no row matched.
+
+CREATE OR REPLACE FUNCTION public.append_media_urls(p_table TEXT, p_id UUID, p_urls TEXT[], p_vendor_id UUID DEFAULT NULL)
+RETURNS TEXT[]
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_column TEXT;
+    v_owner TEXT;
+    v_result TEXT[];
+BEGIN
+    IF p_table = 'vendors' THEN
+        v_column := 'gallery_urls';
+        v_owner := 'id';
+    ELSIF p_table = 'vendor_services' THEN
+        v_column := 'image_urls';
+        v_owner := 'vendor_id';
+    ELSE
+        RAISE EXCEPTION 'Unsupported table: %', p_table;
+    END IF;
+
+    -- New URLs go to the end in the given order; ones already present are skipped
+    EXECUTE format(
+        'UPDATE public.%1$I SET %2$I = COALESCE(%2$I, ARRAY[]::TEXT[]) || ARRAY('
+        '    SELECT u FROM unnest($1) WITH ORDINALITY AS t(u, i)'
+        '    WHERE u IS NOT NULL AND NOT (u = ANY(COALESCE(%2$I, ARRAY[]::TEXT[])))'
+        '    GROUP BY u ORDER BY min(i)'
+        '), updated_at = NOW() '
+        'WHERE id = $2 AND ($3::UUID IS NULL OR %3$I = $3) RETURNING %2$I',
+        p_table, v_column, v_owner
+    ) INTO v_result USING p_urls, p_id, p_vendor_id;
+    RETURN v_result;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.remove_media_urls(p_table TEXT, p_id UUID, p_urls TEXT[], p_vendor_id UUID DEFAULT NULL)
+RETURNS TEXT[]
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_column TEXT;
+    v_owner TEXT;
+    v_result TEXT[];
+BEGIN
+    IF p_table = 'vendors' THEN
+        v_column := 'gallery_urls';
+        v_owner := 'id';
+    ELSIF p_table = 'vendor_services' THEN
+        v_column := 'image_urls';
+        v_owner := 'vendor_id';
+    ELSE
+        RAISE EXCEPTION 'Unsupported table: %', p_table;
+    END IF;
+
+    EXECUTE format(
+        'UPDATE public.%1$I SET %2$I = ARRAY('
+        '    SELECT u FROM unnest(COALESCE(%2$I, ARRAY[]::TEXT[])) WITH ORDINALITY AS t(u, i)'
+        '    WHERE NOT (u = ANY($1)) ORDER BY i'
+        '), updated_at = NOW() '
+        'WHERE id = $2 AND ($3::UUID IS NULL OR %3$I = $3) RETURNING %2$I',
+        p_table, v_column, v_owner
+    ) INTO v_result USING p_urls, p_id, p_vendor_id;
+    RETURN v_result;
+END;
+$$;
+
+-- Only the backend (service role) may call them
+REVOKE ALL ON FUNCTION public.append_media_urls(TEXT, UUID, TEXT[], UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.append_media_urls(TEXT, UUID, TEXT[], UUID) TO service_role;
+REVOKE ALL ON FUNCTION public.remove_media_urls(TEXT, UUID, TEXT[], UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.remove_media_urls(TEXT, UUID, TEXT[], UUID) TO service_role;
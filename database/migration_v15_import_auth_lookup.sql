@@ -0,0 +1,23 @@
+-- Migration V15: Auth account lookup for vendor imports
+-- find_auth_user() returns the GoTrue account registered under an email (id and
+-- metadata role). An import re-run uses it to pick up an account whose vendor
+-- records were never written (a crash between account creation and
+-- register_vendors_batch, or a rollback delete that failed).
+-- Called from VendorImportService via supabase.rpc("find_auth_user").
+
+CREATE OR REPLACE FUNCTION public.find_auth_user(p_email TEXT)
+RETURNS TABLE (id UUID, role TEXT)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    SELECT u.id, u.raw_user_meta_data ->> 'role'
+    FROM auth.users u
+    WHERE lower(u.email) = lower(p_email)
+    LIMIT 1;
+$$;
+
+-- Only the backend (service role) may call it
+REVOKE ALL ON FUNCTION public.find_auth_user(TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.find_auth_user(TEXT) TO service_role;
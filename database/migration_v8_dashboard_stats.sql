@@ -0,0 +1,34 @@
+-- Migration V8: Single-round-trip admin dashboard statistics
+-- Returns vendor totals per status and user totals per role in one call.
+-- Called from AdminService.get_dashboard_stats() via supabase.rpc("get_dashboard_stats").
+
+CREATE OR REPLACE FUNCTION public.get_dashboard_stats()
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    SELECT jsonb_build_object(
+        'vendors_by_status', COALESCE((
+            SELECT jsonb_object_agg(status, total)
+            FROM (
+                SELECT COALESCE(status, 'unknown') AS status, COUNT(*) AS total
+                FROM public.vendors
+                GROUP BY 1
+            ) v
+        ), '{}'::jsonb),
+        'users_by_role', COALESCE((
+            SELECT jsonb_object_agg(role, total)
+            FROM (
+                SELECT COALESCE(role, 'user') AS role, COUNT(*) AS total
+                FROM public.users
+                GROUP BY 1
+            ) u
+        ), '{}'::jsonb)
+    );
+$$;
+
+-- Only the backend (service role) may call it
+REVOKE ALL ON FUNCTION public.get_dashboard_stats() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_dashboard_stats() TO service_role;
@@ -0,0 +1,6 @@
+-- Migration V9: Indexes for keyset pagination and filters on /api/admin/vendors
+-- Pages are ordered by (created_at DESC, id DESC)
+CREATE INDEX IF NOT EXISTS idx_vendors_created_at_id ON public.vendors (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_vendors_status_created_at ON public.vendors (status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_vendors_vendor_type ON public.vendors (vendor_type);
+CREATE INDEX IF NOT EXISTS idx_vendors_operating_areas ON public.vendors USING GIN (operating_areas);
@@ -0,0 +1,82 @@
+"""
+Bulk commission engine tests (CommissionService.compute_changes)
+No server needed: python tests/test_commission.py (or pytest)
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.schemas.commission import CommissionRule
+from app.services.commission_service import CommissionService
+
+RULES = [
+    CommissionRule(commission_percent=10),                                   # 0: everything
+    CommissionRule(commission_percent=20, category="Hair"),                  # 1: category
+    CommissionRule(commission_percent=30, vendor_id="V1"),                   # 2: vendor
+    CommissionRule(commission_percent=5, min_price=100),                     # 3: price band
+    CommissionRule(commission_percent=25, vendor_id="V1", category="hair"),  # 4: vendor + category
+]
+
+
+def service(service_id, vendor_id, category, price, commission=None, net_price=None):
+    return {
+        "id": service_id,
+        "vendor_id": vendor_id,
+        "service_category": category,
+        "retail_price": price,
+        "commission": commission,
+        "net_price": net_price,
+    }
+
+
+def test_most_specific_rule_wins():
+    services = [
+        service("s1", "V2", "Nails", 50),    # only the catch-all matches
+        service("s2", "V2", "HAIR", 50),     # category beats catch-all (case-insensitive)
+        service("s3", "V1", "Nails", 50),    # vendor beats category and price band
+        service("s4", "V1", "Hair", 150),    # vendor + category beats everything
+        service("s5", "V2", "Nails", 150),   # price band beats catch-all
+    ]
+    result = CommissionService.compute_changes(RULES, services)
+    assert {c["id"]: c["rule_index"] for c in result["changes"]} == {"s1": 0, "s2": 1, "s3": 2, "s4": 4, "s5": 3}
+
+    # Equal specificity: the rule listed first wins
+    tied = [CommissionRule(commission_percent=7, category="hair"), CommissionRule(commission_percent=9, category="Hair")]
+    result = CommissionService.compute_changes(tied, [service("s1", "V1", "Hair", 10)])
+    assert result["changes"][0]["rule_index"] == 0
+
+
+def test_rounding_and_totals():
+    services = [
+        service("s1", "V2", "Nails", 19.99),                                   # 10%: 1.999 -> 2.00
+        service("s2", "V2", "Hair", 10.05, commission=2.01, net_price=8.04),   # 20% of 10.05: already priced
+        service("s3", "V2", "Nails", None),                                    # no price
+    ]
+    result = CommissionService.compute_changes(RULES, services)
+
+    assert (result["scanned"], result["matched"], result["changed"], result["unchanged"], result["unmatched"]) == (3, 2, 1, 1, 1)
+    change = result["changes"][0]
+    assert change["commission"] == {"old": None, "new": 2.0}
+    assert change["net_price"] == {"old": None, "new": 17.99}
+
+    assert result["by_rule"][0] == {"rule_index": 0, "matched": 1, "changed": 1}
+    assert result["by_rule"][1] == {"rule_index": 1, "matched": 1, "changed": 0}
+    assert len(result["by_rule"]) == len(RULES)
+    assert result["totals"] == {
+        "commission_before": 2.01,
+        "commission_after": 4.01,
+        "net_price_before": 8.04,
+        "net_price_after": 26.03,
+    }
+
+
+def test_split_price_rounds_half_up():
+    assert [str(v) for v in CommissionService.split_price(10.05, 10)] == ["10.05", "1.01", "9.04"]
+    assert [str(v) for v in CommissionService.split_price(None, 10)] == ["0.00", "0.00", "0.00"]
+
+
+if __name__ == "__main__":
+    for test in (test_most_specific_rule_wins, test_rounding_and_totals, test_split_price_rounds_half_up):
+        test()
+        print(f"✓ {test.__name__}")
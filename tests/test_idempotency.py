@@ -0,0 +1,136 @@
+"""
+Idempotency-Key middleware tests (app/utils/idempotency.py)
+No server needed: python tests/test_idempotency.py (or pytest)
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.idempotency import IdempotencyMiddleware, InMemoryIdempotencyStore
+
+
+class StubApp:
+    """Echoes the request body and counts how often it actually ran"""
+
+    def __init__(self, delay: float = 0):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        await asyncio.sleep(self.delay)
+        payload = json.dumps({"call": self.calls, "size": len(body)}).encode()
+        await send({"type": "http.response.start", "status": 201, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": payload})
+
+
+async def post(app, body: bytes, key: str = "key-1", content_type: bytes = b"application/json"):
+    """Run one POST through the middleware; returns (status, headers, body)"""
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/bookings",
+        "query_string": b"",
+        "headers": [
+            (b"idempotency-key", key.encode()),
+            (b"authorization", b"Bearer token"),
+            (b"content-type", content_type),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    }
+    messages = [{"type": "http.request", "body": body[:10], "more_body": True},
+                {"type": "http.request", "body": body[10:], "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def multipart(boundary: bytes) -> bytes:
+    return (
+        b"--" + boundary + b"\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="a.png"\r\n\r\n'
+        b"image bytes\r\n"
+        b"--" + boundary + b"--\r\n"
+    )
+
+
+def test_replays_stored_response():
+    async def run():
+        stub = StubApp()
+        app = IdempotencyMiddleware(stub, InMemoryIdempotencyStore())
+        first = await post(app, b'{"service": "s1"}')
+        second = await post(app, b'{"service": "s1"}')
+        assert stub.calls == 1
+        assert first[0] == second[0] == 201 and first[2] == second[2]
+        assert second[1].get(b"idempotent-replayed") == b"true"
+        assert b"idempotent-replayed" not in first[1]
+
+        # Another key runs the request again
+        await post(app, b'{"service": "s1"}', key="key-2")
+        assert stub.calls == 2
+    asyncio.run(run())
+
+
+def test_rejects_key_reuse_with_another_body():
+    async def run():
+        stub = StubApp()
+        app = IdempotencyMiddleware(stub, InMemoryIdempotencyStore())
+        await post(app, b'{"service": "s1"}')
+        status, _, body = await post(app, b'{"service": "s2"}')
+        assert status == 422 and b"different request" in body
+        assert stub.calls == 1
+    asyncio.run(run())
+
+
+def test_duplicate_waits_for_running_request():
+    async def run():
+        stub = StubApp(delay=0.2)
+        app = IdempotencyMiddleware(stub, InMemoryIdempotencyStore())
+        first, second = await asyncio.gather(
+            post(app, b'{"service": "s1"}'),
+            post(app, b'{"service": "s1"}'),
+        )
+        assert stub.calls == 1
+        assert first[2] == second[2]
+        assert [first[1].get(b"idempotent-replayed"), second[1].get(b"idempotent-replayed")].count(b"true") == 1
+    asyncio.run(run())
+
+
+def test_multipart_retry_with_new_boundary():
+    async def run():
+        stub = StubApp()
+        app = IdempotencyMiddleware(stub, InMemoryIdempotencyStore())
+        first = await post(app, multipart(b"aaaa1111"), content_type=b"multipart/form-data; boundary=aaaa1111")
+        retry = await post(app, multipart(b"bbbb2222"), content_type=b'multipart/form-data; boundary="bbbb2222"')
+        assert stub.calls == 1
+        assert retry[1].get(b"idempotent-replayed") == b"true" and retry[2] == first[2]
+
+        # Same key, different file: still a mismatch
+        other = multipart(b"cccc3333").replace(b"image bytes", b"other bytes")
+        status, _, _ = await post(app, other, content_type=b"multipart/form-data; boundary=cccc3333")
+        assert status == 422
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for test in (test_replays_stored_response, test_rejects_key_reuse_with_another_body,
+                 test_duplicate_waits_for_running_request, test_multipart_retry_with_new_boundary):
+        test()
+        print(f"✓ {test.__name__}")
@@ -0,0 +1,50 @@
+"""
+Keyset cursor tests (app/utils/pagination.py)
+No server needed: python tests/test_pagination.py (or pytest)
+"""
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.pagination import encode_cursor, decode_cursor, split_page
+
+ROW_ID = str(uuid.uuid4())
+CREATED_AT = "2024-05-01T10:00:00.123456+00:00"
+
+
+def test_round_trip():
+    assert decode_cursor(encode_cursor(CREATED_AT, ROW_ID)) == (CREATED_AT, ROW_ID)
+
+
+def test_rejects_tampered_cursors():
+    bad_cursors = [
+        encode_cursor('2024-05-01",id.gt.0', ROW_ID),       # quote / filter injection
+        encode_cursor("2024-05-01T10:00:00+00:00", "a,b"),  # id that is not a UUID
+        encode_cursor(None, ROW_ID),                        # null sort value
+        encode_cursor(CREATED_AT, None),
+        "not base64 !!",
+    ]
+    for cursor in bad_cursors:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            continue
+        raise AssertionError(f"Accepted bad cursor {cursor!r}")
+
+
+def test_split_page():
+    rows = [{"id": str(uuid.uuid4()), "created_at": CREATED_AT} for _ in range(3)]
+    page, cursor = split_page(rows, 2)
+    assert page == rows[:2]
+    assert decode_cursor(cursor) == (CREATED_AT, rows[1]["id"])
+
+    page, cursor = split_page(rows, 3)
+    assert page == rows and cursor is None
+
+
+if __name__ == "__main__":
+    for test in (test_round_trip, test_rejects_tampered_cursors, test_split_page):
+        test()
+        print(f"✓ {test.__name__}")